@@ -0,0 +1,155 @@
+"""This module contains utilities to handle ranges of addresses"""
+
+# Ranges are expressed as tuples of (start, end), with the end address excluded
+
+def parse_range(text: str) -> tuple[int, int]:
+    """Parses a range in the START:END format, with the end excluded.
+    Addresses can be decimal, or hexadecimal with a 0x prefix.
+
+    Args:
+        text (str): Text to parse
+
+    Raises:
+        ValueError: If the text is not a valid range
+
+    Returns:
+        tuple[int, int]: The parsed range
+    """
+    start_str, sep, end_str = text.partition(':')
+
+    if not sep:
+        raise ValueError(f'Range "{text}" is not in START:END format')
+
+    start: int = int(start_str, 0)
+    end: int = int(end_str, 0)
+
+    if start < 0 or end <= start:
+        raise ValueError(f'Range "{text}" is empty or negative')
+
+    return (start, end)
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Sorts a list of ranges and merges the ones that overlap or touch
+
+    Args:
+        ranges (list[tuple[int, int]]): Ranges to merge
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping ranges
+    """
+    merged: list[tuple[int, int]] = []
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+def intersect_ranges(ranges_a: list[tuple[int, int]], ranges_b: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Calculates the intersection of two lists of ranges
+
+    Args:
+        ranges_a (list[tuple[int, int]]): First list of ranges
+        ranges_b (list[tuple[int, int]]): Second list of ranges
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping ranges covered by both lists
+    """
+    merged_a: list[tuple[int, int]] = merge_ranges(ranges_a)
+    merged_b: list[tuple[int, int]] = merge_ranges(ranges_b)
+    result: list[tuple[int, int]] = []
+    idx_a: int = 0
+    idx_b: int = 0
+
+    while idx_a < len(merged_a) and idx_b < len(merged_b):
+        start: int = max(merged_a[idx_a][0], merged_b[idx_b][0])
+        end: int = min(merged_a[idx_a][1], merged_b[idx_b][1])
+
+        if start < end:
+            result.append((start, end))
+
+        if merged_a[idx_a][1] < merged_b[idx_b][1]:
+            idx_a += 1
+        else:
+            idx_b += 1
+
+    return result
+
+def ranges_size(ranges: list[tuple[int, int]]) -> int:
+    """Returns the number of addresses covered by a list of non-overlapping ranges"""
+    return sum(end - start for start, end in ranges)
+
+def diff_ranges(plane_a: bytes, plane_b: bytes, entry_width: int, chunk_entries: int = 1024) -> list[tuple[int, int]]:
+    """Finds the runs of addresses whose entries differ between two planes of the same size
+
+    Args:
+        plane_a (bytes): First plane
+        plane_b (bytes): Second plane
+        entry_width (int): Size in bytes of every entry
+        chunk_entries (int, optional): Number of entries compared in one go before looking at single entries. Defaults to 1024.
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping ranges of addresses that differ
+    """
+    if len(plane_a) != len(plane_b):
+        raise ValueError(f'Cannot compare planes of size {len(plane_a)} and {len(plane_b)}')
+
+    view_a: memoryview = memoryview(plane_a)
+    view_b: memoryview = memoryview(plane_b)
+    chunk_size: int = chunk_entries * entry_width
+    ranges: list[tuple[int, int]] = []
+
+    for chunk_start in range(0, len(plane_a), chunk_size):
+        chunk_end: int = min(len(plane_a), chunk_start + chunk_size)
+
+        # Most of the chunks are expected to be identical, and comparing them as a whole is cheap
+        if view_a[chunk_start:chunk_end] == view_b[chunk_start:chunk_end]:
+            continue
+
+        for offset in range(chunk_start, chunk_end, entry_width):
+            if view_a[offset:offset + entry_width] != view_b[offset:offset + entry_width]:
+                address: int = offset // entry_width
+                if ranges and ranges[-1][1] == address:
+                    ranges[-1] = (ranges[-1][0], address + 1)
+                else:
+                    ranges.append((address, address + 1))
+
+    return ranges
+
+def aligned_blocks(start: int, end: int, max_bits: int, min_bits: int = 0) -> list[tuple[int, int]]:
+    """Splits a range into the smallest list of blocks whose size is a power of two, and that are aligned to their size.
+    Blocks of this kind can be read with a single bulk transfer, walking only the lower address lines.
+
+    Args:
+        start (int): First address of the range
+        end (int): End of the range, excluded
+        max_bits (int): Blocks will contain at most 1 << max_bits addresses
+        min_bits (int, optional): Blocks will contain at least 1 << min_bits addresses, so the range
+                                  might be extended at the edges. Defaults to 0.
+
+    Returns:
+        list[tuple[int, int]]: List of (base address, block bits) tuples covering the range
+    """
+    min_bits = min(min_bits, max_bits)
+    min_size: int = 1 << min_bits
+
+    # Extend the range so it is aligned to the minimum block size
+    address: int = start & ~(min_size - 1)
+    end = -(end // -min_size) * min_size
+
+    blocks: list[tuple[int, int]] = []
+    while address < end:
+        # The largest block allowed by the alignment of the current address
+        bits: int = (address & -address).bit_length() - 1 if address else max_bits
+        bits = min(bits, max_bits)
+
+        # Shrink it until it fits in the range
+        while address + (1 << bits) > end:
+            bits -= 1
+
+        blocks.append((address, bits))
+        address += 1 << bits
+
+    return blocks
@@ -0,0 +1,128 @@
+"""This module contains a cache of parsed IC definitions, together with the pin mappings computed for them"""
+
+import os
+import pickle
+import hashlib
+import logging
+import tempfile
+import importlib.metadata
+
+from typing import Any, final
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+from dpdumperlib.ic.ic_definition import ICDefinition
+from dpdumperlib.ic.ic_loader import ICLoader
+
+from dpdumper import __version__
+from dpdumper.pin_mapping import ICPinMaps
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump this when the content of the cache entries changes
+_CACHE_FORMAT: int = 1
+
+def _library_version() -> str:
+    try:
+        return importlib.metadata.version('dpdumperlib')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
+
+def default_cache_dir() -> str:
+    """Returns the directory of the cache: $DPDUMPER_CACHE_DIR if set, otherwise a dpdumper directory in the user cache"""
+    if cache_dir := os.environ.get('DPDUMPER_CACHE_DIR'):
+        return cache_dir
+
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'dpdumper')
+
+@final
+class DefinitionCache:
+    """
+    This class keeps the parsed form of IC definitions on disk, keyed by the SHA1SUM of the definition file,
+    so the TOML is parsed and validated only the first time a file is seen. The pin mappings for every command class
+    the definition was used with are stored in the same entry. Entries written by different versions of dpdumper
+    or dpdumperlib are ignored and replaced.
+    """
+
+    _cache_dir: str
+    _versions: tuple[int, str, str]
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        """Prepares the cache
+
+        Args:
+            cache_dir (str | None, optional): Directory that holds the entries. Defaults to default_cache_dir().
+        """
+        self._cache_dir = cache_dir or default_cache_dir()
+        self._versions = (_CACHE_FORMAT, __version__, _library_version())
+
+    @staticmethod
+    def _class_key(cmd_class: type[HardwareBoardCommands]) -> str:
+        return f'{cmd_class.__module__}.{cmd_class.__qualname__}'
+
+    def _entry_path(self, file_hash: str) -> str:
+        return os.path.join(self._cache_dir, f'{file_hash}.pickle')
+
+    def _load_entry(self, file_hash: str) -> dict[str, Any] | None:
+        try:
+            with open(self._entry_path(file_hash), 'rb') as f:
+                entry: dict[str, Any] = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            _LOGGER.debug(f'Ignoring unreadable cache entry for {file_hash}: {ex}')
+            return None
+
+        if entry.get('versions') != self._versions:
+            _LOGGER.debug(f'Cache entry for {file_hash} was written by a different version, ignoring it')
+            return None
+
+        return entry
+
+    def _store_entry(self, file_hash: str, entry: dict[str, Any]) -> None:
+        # Write to a temporary file and move it in place, so concurrent readers never see half an entry
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(file_hash))
+        except Exception as ex:
+            _LOGGER.warning(f'Unable to store the cache entry for {file_hash}: {ex}')
+
+    def load(self, path: str, cmd_class: type[HardwareBoardCommands] | None = None) -> ICDefinition:
+        """Loads an IC definition, parsing the file only if it is not in the cache
+
+        Args:
+            path (str): Path of the definition file
+            cmd_class (type[HardwareBoardCommands] | None, optional): If passed, the pin mappings for this command class
+                                                                      are loaded from the cache, or computed and stored. Defaults to None.
+
+        Returns:
+            ICDefinition: The definition
+        """
+        with open(path, 'rb') as f:
+            file_hash: str = hashlib.sha1(f.read()).hexdigest()
+
+        entry: dict[str, Any] | None = self._load_entry(file_hash)
+        modified: bool = False
+
+        if entry is None:
+            _LOGGER.debug(f'Definition {path} is not in the cache, parsing it')
+            entry = {'versions': self._versions, 'definition': ICLoader.extract_definition_from_file(path), 'pin_maps': {}}
+            modified = True
+
+        ic: ICDefinition = entry['definition']
+
+        if cmd_class is not None:
+            class_key: str = self._class_key(cmd_class)
+
+            if (maps := entry['pin_maps'].get(class_key)) is not None:
+                ICPinMaps.register(cmd_class, ic, maps)
+            else:
+                entry['pin_maps'][class_key] = ICPinMaps.for_ic(cmd_class, ic)
+                modified = True
+
+        if modified:
+            self._store_entry(file_hash, entry)
+
+        return ic
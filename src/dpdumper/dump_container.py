@@ -0,0 +1,362 @@
+"""This module contains code to store a dump in a single indexed container file, and to read it back lazily"""
+
+import os
+import json
+import mmap
+import zlib
+import bisect
+import struct
+import hashlib
+
+from typing import Any, BinaryIO, Generator, final
+
+from dpdumperlib.ic.ic_definition import ICDefinition, ICType
+
+from dpdumper.dumper_utilities import BoardInfo, DumperUtilities
+from dpdumper.ic_dump import ICDump
+
+# The container starts with a magic and format version, then holds the blocks of data and Hi-Z planes
+# one after the other, followed by the zlib-compressed JSON index and a fixed size footer that points to it.
+_MAGIC: bytes = b'DPDUMP'
+_FORMAT_VERSION: int = 1
+_HEADER: struct.Struct = struct.Struct('>6sH')
+_FOOTER_MAGIC: bytes = b'DPDINDEX'
+_FOOTER: struct.Struct = struct.Struct('>QQ8s')
+
+COMPRESSION_NONE: str = 'none'
+COMPRESSION_ZLIB: str = 'zlib'
+
+@final
+class DumpContainerWriter:
+    """
+    This class writes a dump into a container, one block of addresses at a time.
+    Every block is stored (and optionally compressed) on its own, with the SHA1SUM of its
+    uncompressed planes, so it can be decoded and checked without touching the rest of the file.
+    Blocks must be fed in addressing order.
+    """
+
+    DEFAULT_BLOCK_BITS: int = 14
+
+    _f: BinaryIO
+    _path: str
+    _ic: ICDefinition
+    _board_info: BoardInfo | None
+    _has_hiz: bool
+    _compress: bool
+    _block_entries: int
+    _blocks: list[list[Any]]
+    _sha1: Any
+    _next_address: int
+    _metadata: dict[str, Any]
+
+    def __init__(self, path: str, ic: ICDefinition, has_hiz: bool, board_info: BoardInfo | None = None, compress: bool = True, block_bits: int = DEFAULT_BLOCK_BITS, metadata: dict[str, Any] | None = None) -> None:
+        """Creates the container
+
+        Args:
+            path (str): Path of the container file
+            ic (ICDefinition): Definition of the IC that was read
+            has_hiz (bool): True if the dump carries a Hi-Z plane
+            board_info (BoardInfo | None, optional): Board that performed the read. Defaults to None.
+            compress (bool, optional): True to compress every block with zlib. Defaults to True.
+            block_bits (int, optional): Blocks contain at most 1 << block_bits addresses. Defaults to DEFAULT_BLOCK_BITS.
+            metadata (dict[str, Any] | None, optional): Additional information on the read, must be serializable to JSON. Defaults to None.
+        """
+        self._path = path
+        self._ic = ic
+        self._board_info = board_info
+        self._has_hiz = has_hiz
+        self._compress = compress
+        self._block_entries = 1 << block_bits
+        self._blocks = []
+        self._sha1 = hashlib.sha1()
+        self._next_address = 0
+        self._metadata = metadata or {}
+
+        self._f = open(path, 'wb')
+        self._f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION))
+
+    def __enter__(self) -> 'DumpContainerWriter':
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        # A container without its index is useless, leave nothing behind if the dump failed
+        if exc_type is not None:
+            self._f.close()
+            os.remove(self._path)
+        else:
+            self.close()
+
+    def _store(self, plane: bytes) -> tuple[int, int]:
+        offset: int = self._f.tell()
+        self._f.write(zlib.compress(plane) if self._compress else plane)
+        return (offset, self._f.tell() - offset)
+
+    def write_block(self, base_address: int, dump: ICDump) -> None:
+        """Appends a block of addresses to the container
+
+        Args:
+            base_address (int): Address of the first entry in the block
+            dump (ICDump): Data of the block
+        """
+        if base_address != self._next_address:
+            raise ValueError(f'Expected a block starting at address {self._next_address:X}, got one at {base_address:X}')
+
+        if dump.has_hiz != self._has_hiz:
+            raise ValueError(f'Container expects blocks {"with" if self._has_hiz else "without"} a Hi-Z plane')
+
+        chunk_size: int = self._block_entries * dump.entry_width
+        for offset in range(0, len(dump.data), chunk_size):
+            data_plane: bytes = dump.data[offset:offset + chunk_size]
+            data_offset, data_length = self._store(data_plane)
+            z_offset, z_length, z_sha1 = (0, 0, None)
+
+            if dump.z_mask is not None:
+                z_plane: bytes = dump.z_mask[offset:offset + chunk_size]
+                z_offset, z_length = self._store(z_plane)
+                z_sha1 = hashlib.sha1(z_plane).hexdigest()
+
+            self._blocks.append([base_address + offset // dump.entry_width, len(data_plane) // dump.entry_width,
+                                 data_offset, data_length, hashlib.sha1(data_plane).hexdigest(),
+                                 z_offset, z_length, z_sha1])
+            self._sha1.update(data_plane)
+
+        self._next_address = base_address + len(dump)
+
+    def hexdigest(self) -> str:
+        """Returns the SHA1SUM of the data plane written so far"""
+        return self._sha1.hexdigest()
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+
+        expected: int = 1 << len(self._ic.address)
+        if self._next_address != expected:
+            self._f.close()
+            raise IOError(f'Container {self._path} holds {self._next_address} addresses, but the IC has {expected}')
+
+        index: dict[str, Any] = {
+            'version': _FORMAT_VERSION,
+            'definition': DumperUtilities.definition_fields(self._ic),
+            'definition_hash': DumperUtilities.definition_hash(self._ic),
+            'adapter_notes': self._ic.adapter_notes,
+            'board': {'model': self._board_info.model, 'fw_version': self._board_info.fw_version} if self._board_info else None,
+            'has_hiz': self._has_hiz,
+            'compression': COMPRESSION_ZLIB if self._compress else COMPRESSION_NONE,
+            'sha1': self._sha1.hexdigest(),
+            'metadata': self._metadata,
+            'blocks': self._blocks
+        }
+
+        index_offset: int = self._f.tell()
+        index_data: bytes = zlib.compress(json.dumps(index).encode())
+        self._f.write(index_data)
+        self._f.write(_FOOTER.pack(index_offset, len(index_data), _FOOTER_MAGIC))
+        self._f.close()
+
+def write_dump_container(path: str, ic: ICDefinition, dump: ICDump, board_info: BoardInfo | None = None, compress: bool = True, metadata: dict[str, Any] | None = None) -> str:
+    """Writes a whole dump into a container
+
+    Args:
+        path (str): Path of the container file
+        ic (ICDefinition): Definition of the IC that was read
+        dump (ICDump): Data read from the IC
+        board_info (BoardInfo | None, optional): Board that performed the read. Defaults to None.
+        compress (bool, optional): True to compress every block with zlib. Defaults to True.
+        metadata (dict[str, Any] | None, optional): Additional information on the read, must be serializable to JSON. Defaults to None.
+
+    Returns:
+        str: SHA1SUM of the data plane
+    """
+    with DumpContainerWriter(path, ic, dump.has_hiz, board_info, compress, metadata=metadata) as writer:
+        writer.write_block(0, dump)
+        return writer.hexdigest()
+
+@final
+class DumpContainerReader:
+    """
+    This class gives random access to the content of a container. The file is memory mapped,
+    and only the blocks that cover the requested addresses are decoded.
+    """
+
+    _f: BinaryIO
+    _mm: mmap.mmap
+    _index: dict[str, Any]
+    _bases: list[int]
+    _entry_width: int
+
+    def __init__(self, path: str) -> None:
+        """Opens a container
+
+        Args:
+            path (str): Path of the container file
+
+        Raises:
+            ValueError: If the file is not a valid container
+        """
+        self._f = open(path, 'rb')
+
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            if len(self._mm) < _HEADER.size + _FOOTER.size:
+                raise ValueError(f'{path} is too short to be a dump container')
+
+            magic, version = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC:
+                raise ValueError(f'{path} is not a dump container')
+            if version != _FORMAT_VERSION:
+                raise ValueError(f'Container {path} has unsupported format version {version}')
+
+            index_offset, index_length, footer_magic = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+            if footer_magic != _FOOTER_MAGIC:
+                raise ValueError(f'Container {path} is truncated, the index is missing')
+
+            self._index = json.loads(zlib.decompress(self._mm[index_offset:index_offset + index_length]))
+        except:
+            self.close()
+            raise
+
+        self._bases = [block[0] for block in self._index['blocks']]
+        self._entry_width = -(len(self._index['definition']['data']) // -8)
+
+    def __enter__(self) -> 'DumpContainerReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return 1 << len(self._index['definition']['address'])
+
+    def close(self) -> None:
+        if getattr(self, '_mm', None) is not None and not self._mm.closed:
+            self._mm.close()
+        self._f.close()
+
+    @property
+    def definition(self) -> ICDefinition:
+        """Definition of the IC that was read"""
+        fields: dict[str, Any] = self._index['definition']
+        return ICDefinition(name=fields['name'],
+                            ic_type=ICType(fields['type']),
+                            hw_model=fields['hw_model'],
+                            address=fields['address'],
+                            data=fields['data'],
+                            act_h_enable=fields['act_h_enable'],
+                            act_l_enable=fields['act_l_enable'],
+                            act_h_write=fields['act_h_write'],
+                            act_l_write=fields['act_l_write'],
+                            adapter_hi_pins=fields['adapter_hi_pins'],
+                            adapter_notes=self._index['adapter_notes'])
+
+    @property
+    def definition_hash(self) -> str:
+        return self._index['definition_hash']
+
+    @property
+    def board_info(self) -> BoardInfo | None:
+        """Board that performed the read, if known"""
+        board: dict[str, Any] | None = self._index['board']
+        return BoardInfo(board['model'], board['fw_version']) if board else None
+
+    @property
+    def metadata(self) -> dict[str, Any]:
+        """Additional information stored with the read, like the results of a probe"""
+        # Containers written before metadata was introduced have no such key
+        return self._index.get('metadata', {})
+
+    @property
+    def data_width_bits(self) -> int:
+        return len(self._index['definition']['data'])
+
+    @property
+    def has_hiz(self) -> bool:
+        return self._index['has_hiz']
+
+    @property
+    def sha1(self) -> str:
+        """SHA1SUM of the whole data plane"""
+        return self._index['sha1']
+
+    def _plane(self, offset: int, length: int) -> bytes:
+        stored: bytes = self._mm[offset:offset + length]
+        if self._index['compression'] != COMPRESSION_ZLIB:
+            return stored
+
+        try:
+            return zlib.decompress(stored)
+        except zlib.error as ex:
+            raise IOError(f'Block at offset {offset} cannot be decompressed: {ex}') from ex
+
+    def _decode_block(self, idx: int) -> tuple[int, ICDump]:
+        base, _, data_offset, data_length, _, z_offset, z_length, _ = self._index['blocks'][idx]
+        z_plane: bytes | None = self._plane(z_offset, z_length) if self.has_hiz else None
+        return (base, ICDump(self._plane(data_offset, data_length), self.data_width_bits, z_plane))
+
+    def blocks(self, verify: bool = False) -> Generator[tuple[int, ICDump], None, None]:
+        """Decodes the blocks one at a time, in addressing order
+
+        Args:
+            verify (bool, optional): True to check every block against its SHA1SUM. Defaults to False.
+
+        Raises:
+            IOError: If verification is enabled and a block is corrupted
+
+        Yields:
+            Generator[tuple[int, ICDump], None, None]: Tuples of base address and data for every block
+        """
+        for idx, (_, _, _, _, data_sha1, _, _, z_sha1) in enumerate(self._index['blocks']):
+            base, block = self._decode_block(idx)
+
+            if verify and (hashlib.sha1(block.data).hexdigest() != data_sha1 or (block.z_mask is not None and hashlib.sha1(block.z_mask).hexdigest() != z_sha1)):
+                raise IOError(f'Block at address {base:X} is corrupted')
+
+            yield (base, block)
+
+    def read_range(self, start: int, end: int) -> ICDump:
+        """Reads a range of addresses, decoding only the blocks that cover it
+
+        Args:
+            start (int): First address of the range
+            end (int): End of the range, excluded
+
+        Returns:
+            ICDump: Data of the range
+        """
+        if start < 0 or end > len(self) or end < start:
+            raise ValueError(f'Range {start:X}:{end:X} is outside of the dump')
+
+        data_parts: list[bytes] = []
+        z_parts: list[bytes] = []
+        idx: int = max(0, bisect.bisect_right(self._bases, start) - 1)
+
+        while idx < len(self._bases) and self._bases[idx] < end:
+            base, block = self._decode_block(idx)
+            lo: int = (max(start, base) - base) * self._entry_width
+            hi: int = (min(end, base + len(block)) - base) * self._entry_width
+            data_parts.append(block.data[lo:hi])
+            if block.z_mask is not None:
+                z_parts.append(block.z_mask[lo:hi])
+            idx += 1
+
+        return ICDump(b''.join(data_parts), self.data_width_bits, b''.join(z_parts) if self.has_hiz else None)
+
+    def verify(self) -> list[int]:
+        """Checks every block against its SHA1SUM
+
+        Returns:
+            list[int]: Base addresses of the blocks that are corrupted
+        """
+        corrupted: list[int] = []
+
+        for base, _, data_offset, data_length, data_sha1, z_offset, z_length, z_sha1 in self._index['blocks']:
+            try:
+                if hashlib.sha1(self._plane(data_offset, data_length)).hexdigest() != data_sha1:
+                    corrupted.append(base)
+                elif z_sha1 is not None and hashlib.sha1(self._plane(z_offset, z_length)).hexdigest() != z_sha1:
+                    corrupted.append(base)
+            except IOError:
+                corrupted.append(base)
+
+        return corrupted
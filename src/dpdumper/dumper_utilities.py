@@ -1,14 +1,25 @@
 """This module contains miscellaneous utilities for the dumper"""
 
-from typing import Iterable, Tuple, TypeVar, final
+from __future__ import annotations
 
-from serial.tools.list_ports import comports
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Tuple, TypeVar, final
+import hashlib
+import json
+
+# Only needed for the annotations, this module is imported at startup and must stay light
+if TYPE_CHECKING:
+    from dpdumperlib.ic.ic_definition import ICDefinition
 
 T = TypeVar('T')
 def grouped_iterator(iterable: Iterable[T], n: int) -> Iterable[Tuple[T, ...]]:
     return zip(*[iter(iterable)]*n)
 
 
+@final
+class BoardInfo(NamedTuple):
+    model: int
+    fw_version: str
+
 @final
 class DumperUtilities:
     """
@@ -18,6 +29,7 @@ class DumperUtilities:
     @staticmethod
     def print_serial_ports() -> None:
         """Print a list of available serial ports."""
+        from serial.tools.list_ports import comports
 
         port_list = comports()
 
@@ -26,4 +38,39 @@ class DumperUtilities:
         else:
             print('Available serial ports:')
             for port in port_list:
-                print(f'\t{port.device} - {port.description}')      
\ No newline at end of file
+                print(f'\t{port.device} - {port.description}')
+
+    @staticmethod
+    def definition_fields(ic: ICDefinition) -> dict:
+        """Extracts the fields of an IC definition that describe the IC and its wiring
+
+        Args:
+            ic (ICDefinition): The definition
+
+        Returns:
+            dict: The fields of the definition, in a form that can be serialized to JSON
+        """
+        return {
+            'name': ic.name,
+            'type': ic.ic_type.value,
+            'hw_model': ic.hw_model,
+            'address': ic.address,
+            'data': ic.data,
+            'act_h_enable': ic.act_h_enable,
+            'act_l_enable': ic.act_l_enable,
+            'act_h_write': ic.act_h_write,
+            'act_l_write': ic.act_l_write,
+            'adapter_hi_pins': ic.adapter_hi_pins
+        }
+
+    @staticmethod
+    def definition_hash(ic: ICDefinition) -> str:
+        """Calculates a hash that identifies the content of an IC definition
+
+        Args:
+            ic (ICDefinition): The definition to hash
+
+        Returns:
+            str: SHA1SUM of the relevant fields of the definition
+        """
+        return hashlib.sha1(json.dumps(DumperUtilities.definition_fields(ic), sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,383 @@
+"""This module contains code to run jobs concurrently on several boards"""
+
+import io
+import os
+import sys
+import time
+import queue
+import logging
+import threading
+import tomllib
+import traceback
+
+from typing import Any, NamedTuple, TextIO, final
+
+import serial
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+from dpdumperlib.ic.ic_definition import ICDefinition
+
+import dpdumper.frontend as Frontend
+import dpdumper.progress as Progress
+import dpdumper.run_stats as RunStats
+from dpdumper.dumper_utilities import BoardInfo
+from dpdumper.address_ranges import parse_range
+from dpdumper.hiz_sampling import HIZ_STRIDE
+
+_LOGGER = logging.getLogger(__name__)
+
+# Options of a job that hold paths, resolved against the directory of the jobs file
+PATH_OPTIONS: tuple[str, ...] = ('outfile', 'outfile_binary', 'outfile_binary_z', 'container', 'infile', 'index')
+
+@final
+class FleetJob(NamedTuple):
+    number: int
+    command: str
+    definition: str
+    options: dict[str, Any]
+    port: str | None = None
+
+@final
+class FleetResult(NamedTuple):
+    job: FleetJob
+    port: str
+    ok: bool
+    seconds: float
+    transferred: int
+    error: str | None = None
+
+@final
+class _ThreadOutputRouter(io.TextIOBase):
+    """
+    Replacement for stdout while the workers are running.
+    Lines printed by a worker thread are prefixed with the port of its board, while the lines that
+    are redrawn in place and the progress of the transfers are kept as the current status of the board,
+    and printed all together on a single line by the monitor.
+    """
+
+    _out: TextIO
+    _lock: threading.Lock
+    _prefixes: dict[int, str]
+    _partial: dict[int, str]
+    status: dict[str, str]
+
+    def __init__(self, out: TextIO) -> None:
+        self._out = out
+        self._lock = threading.Lock()
+        self._prefixes = {}
+        self._partial = {}
+        self.status = {}
+
+    def register(self, port: str) -> None:
+        with self._lock:
+            self._prefixes[threading.get_ident()] = port
+            self.status[port] = 'idle'
+
+    def set_status(self, port: str, status: str) -> None:
+        with self._lock:
+            self.status[port] = status
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        ident: int = threading.get_ident()
+
+        with self._lock:
+            if (port := self._prefixes.get(ident)) is None:
+                return self._out.write(s)
+
+            text: str = self._partial.get(ident, '') + s
+            *lines, rest = text.split('\n')
+
+            for line in lines:
+                # Only the last redraw of a line is relevant
+                line = line.split('\r')[-1].strip()
+                if line:
+                    self._out.write(f'\r[{port}] {line}'.ljust(80) + '\n')
+
+            if '\r' in rest:
+                status: str = rest.rstrip('\r').split('\r')[-1].strip()
+                if status:
+                    self.status[port] = status
+                rest = ''
+
+            self._partial[ident] = rest
+            self._out.flush()
+
+        return len(s)
+
+    def print_status(self) -> None:
+        with self._lock:
+            line: str = ' | '.join(f'[{port}] {status[:30]}' for port, status in self.status.items())
+            self._out.write('\r' + line[:79].ljust(79))
+            self._out.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._out.flush()
+
+@final
+class _StatusRenderer(Progress.ProgressRenderer):
+    """Shows the progress of the transfers of a worker as the status of its board"""
+
+    _router: _ThreadOutputRouter
+    _port: str
+
+    def __init__(self, router: _ThreadOutputRouter, port: str) -> None:
+        self._router = router
+        self._port = port
+
+    def update(self, state: Progress.ProgressState) -> None:
+        self._router.set_status(self._port, state.describe())
+
+    def finish(self, state: Progress.ProgressState) -> None:
+        self.update(state)
+
+def parse_job(idx: int, job: dict[str, Any], base_dir: str) -> FleetJob:
+    """Validates a read or write job, and resolves the paths it contains
+
+    Args:
+        idx (int): Index of the job
+        job (dict[str, Any]): Command, definition and options of the job
+        base_dir (str): Directory that relative paths refer to
+
+    Raises:
+        ValueError: If the job is not valid
+
+    Returns:
+        FleetJob: The parsed job
+    """
+    def resolve(path: str | None) -> str | None:
+        return os.path.join(base_dir, path) if path else None
+
+    command: str = job.get('command', '')
+    if command not in (Frontend.Subcommands.READ.value, Frontend.Subcommands.WRITE.value):
+        raise ValueError(f'Job {idx} has unsupported command "{command}"')
+
+    if 'definition' not in job:
+        raise ValueError(f'Job {idx} does not specify a definition')
+
+    options: dict[str, Any] = dict(job)
+    for key in PATH_OPTIONS:
+        if key in options:
+            options[key] = resolve(options[key])
+
+    if command == Frontend.Subcommands.READ.value and not (options.get('outfile') or options.get('outfile_binary') or options.get('container')):
+        raise ValueError(f'Read job {idx} does not specify an output file')
+    if command == Frontend.Subcommands.WRITE.value and not options.get('infile'):
+        raise ValueError(f'Write job {idx} does not specify an input file')
+
+    return FleetJob(idx, command, resolve(job['definition']), options, job.get('port')) # type: ignore
+
+def load_jobs(jobs_file: str) -> tuple[list[str], list[FleetJob]]:
+    """Loads the list of jobs from a TOML file
+
+    Args:
+        jobs_file (str): Path to the jobs file
+
+    Returns:
+        tuple[list[str], list[FleetJob]]: Serial ports listed in the file, and the jobs
+    """
+    with open(jobs_file, 'rb') as f:
+        content: dict[str, Any] = tomllib.load(f)
+
+    # Paths in the jobs file are relative to the file itself
+    base_dir: str = os.path.dirname(os.path.abspath(jobs_file))
+    jobs: list[FleetJob] = [parse_job(idx, job, base_dir) for idx, job in enumerate(content.get('jobs', []))]
+
+    return (list(content.get('ports', [])), jobs)
+
+def run_job(job: FleetJob, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], board_info: BoardInfo, close_port: bool = True) -> int:
+    """Runs a read or write job on a connected board, skipping the adapter notes
+
+    Args:
+        job (FleetJob): Job to run
+        ser (serial.Serial): Serial port connected to the board
+        cmd_class (type[HardwareBoardCommands]): Command class for the board
+        board_info (BoardInfo): Information on the connected board
+        close_port (bool, optional): False to keep the serial port open once a read is done. Defaults to True.
+
+    Returns:
+        int: Number of bytes actually read from or written to the IC, including extra passes, diff reads and verification
+    """
+    ic_definition: ICDefinition = Frontend.load_definition(job.definition, board_info, cmd_class)
+    opts: dict[str, Any] = job.options
+    data_width: int = -(len(ic_definition.data) // -8)
+
+    ranges: list[tuple[int, int]] | None = [parse_range(r) for r in opts['ranges']] if opts.get('ranges') else None
+
+    # Jobs run unattended, adapter notes are skipped. Every job collects its own statistics, to count what was actually transferred
+    with RunStats.collect() as stats:
+        if job.command == Frontend.Subcommands.READ.value:
+            Frontend.read_command(ser, cmd_class, ic_definition, opts.get('outfile'),
+                                  opts.get('outfile_binary'),
+                                  opts.get('outfile_binary_z'),
+                                  opts.get('check_hiz', False),
+                                  opts.get('hiz_high', False),
+                                  True,
+                                  opts.get('reverse_byte_order', False),
+                                  opts.get('stream', False),
+                                  board_info,
+                                  outfc=opts.get('container'),
+                                  compress=not opts.get('no_compression', False),
+                                  passes=opts.get('passes', 1),
+                                  probe=opts.get('probe', False),
+                                  close_port=close_port,
+                                  ranges=ranges,
+                                  fill=opts.get('fill', 0xFF),
+                                  rom_index=opts.get('index'),
+                                  index_store=opts.get('index_store', False),
+                                  preflight=opts.get('preflight', 'off'),
+                                  hiz_stride=HIZ_STRIDE if opts.get('adaptive_hiz') is True else opts.get('adaptive_hiz') or None)
+        else:
+            Frontend.write_command(ser, cmd_class, ic_definition, opts['infile'],
+                                   opts.get('start_skip', 0),
+                                   opts.get('end_skip', 0),
+                                   True,
+                                   opts.get('reverse_byte_order', False),
+                                   not opts.get('no_pipeline', False),
+                                   ranges,
+                                   opts.get('diff', False),
+                                   opts.get('verify', False),
+                                   opts.get('verify_retries', 0))
+
+    read_bytes: int = stats.to_dict()['phases'].get('cxfer_read', {}).get('bytes', 0)
+    return read_bytes + stats.counters.get('entries_written', 0) * data_width
+
+def _worker(port: str, baudrate: int, own_jobs: 'queue.Queue[FleetJob]', shared_jobs: 'queue.Queue[FleetJob]', results: list[FleetResult], router: _ThreadOutputRouter) -> None:
+    router.register(port)
+
+    with Progress.reporting(_StatusRenderer(router, port)):
+        _run_jobs(port, baudrate, own_jobs, shared_jobs, results)
+
+    router.set_status(port, 'done')
+
+def _run_jobs(port: str, baudrate: int, own_jobs: 'queue.Queue[FleetJob]', shared_jobs: 'queue.Queue[FleetJob]', results: list[FleetResult]) -> None:
+    while True:
+        job: FleetJob
+        try:
+            job = own_jobs.get_nowait()
+        except queue.Empty:
+            try:
+                job = shared_jobs.get_nowait()
+            except queue.Empty:
+                break
+
+        start_time: float = time.time()
+        connection: tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None = None
+        try:
+            connection = Frontend.connect_board(port, baudrate)
+        except Exception:
+            _LOGGER.debug(traceback.format_exc())
+
+        if connection is None:
+            # The board is gone: the job goes back to the other boards, only the jobs pinned to this one fail
+            if job.port is None:
+                shared_jobs.put(job)
+            else:
+                results.append(FleetResult(job, port, False, time.time() - start_time, 0, f'Unable to connect to the board on {port}'))
+
+            for pinned in _drain(own_jobs):
+                results.append(FleetResult(pinned, port, False, 0, 0, f'Unable to connect to the board on {port}'))
+
+            print('Unable to connect to the board, retiring it')
+            break
+
+        print(f'Starting job {job.number} ({job.command} {os.path.basename(job.definition)})')
+        ser: serial.Serial | None = None
+
+        try:
+            ser, cmd_class, board_info = connection
+            transferred: int = run_job(job, ser, cmd_class, board_info)
+            results.append(FleetResult(job, port, True, time.time() - start_time, transferred))
+            print(f'Job {job.number} completed')
+        except Exception as ex:
+            _LOGGER.debug(traceback.format_exc())
+            results.append(FleetResult(job, port, False, time.time() - start_time, 0, str(ex)))
+            print(f'Job {job.number} FAILED: {ex}')
+        finally:
+            if ser and not ser.closed:
+                ser.close()
+
+def _drain(jobs: 'queue.Queue[FleetJob]') -> list[FleetJob]:
+    drained: list[FleetJob] = []
+    while True:
+        try:
+            drained.append(jobs.get_nowait())
+        except queue.Empty:
+            return drained
+
+def fleet_command(ports: list[str] | None, jobs_file: str, baudrate: int) -> int:
+    """Runs a list of jobs on several boards, one worker thread per board.
+    Jobs that specify a port run only on that board, the others are taken by whichever board is free.
+    A failure on one job or board does not stop the others.
+
+    Args:
+        ports (list[str] | None): Serial ports of the boards. If None, the ports listed in the jobs file are used.
+        jobs_file (str): Path to the TOML file with the jobs
+        baudrate (int): Speed at which the serial ports are opened
+
+    Returns:
+        int: 1 if all the jobs completed, -1 otherwise
+    """
+    file_ports, jobs = load_jobs(jobs_file)
+    ports = ports if ports else file_ports
+
+    if not ports:
+        raise ValueError('No serial ports were specified for the fleet')
+
+    own_jobs: dict[str, queue.Queue[FleetJob]] = {port: queue.Queue() for port in ports}
+    shared_jobs: queue.Queue[FleetJob] = queue.Queue()
+    results: list[FleetResult] = []
+
+    for job in jobs:
+        if job.port is None:
+            shared_jobs.put(job)
+        elif job.port in own_jobs:
+            own_jobs[job.port].put(job)
+        else:
+            results.append(FleetResult(job, job.port, False, 0, 0, f'Port {job.port} is not part of the fleet'))
+
+    print(f'Running {len(jobs)} jobs on {len(ports)} boards.')
+
+    router: _ThreadOutputRouter = _ThreadOutputRouter(sys.stdout)
+    workers: list[threading.Thread] = [threading.Thread(target=_worker, args=(port, baudrate, own_jobs[port], shared_jobs, results, router), name=f'fleet-{port}', daemon=True) for port in ports]
+
+    start_time: float = time.time()
+    original_stdout: TextIO = sys.stdout
+    sys.stdout = router
+    try:
+        for worker in workers:
+            worker.start()
+
+        while any(worker.is_alive() for worker in workers):
+            router.print_status()
+            for worker in workers:
+                worker.join(timeout=0.5 / len(workers))
+    finally:
+        sys.stdout = original_stdout
+
+    # Jobs given back by boards that went away after all the others had finished
+    for job in _drain(shared_jobs):
+        results.append(FleetResult(job, '-', False, 0, 0, 'No board was available to run the job'))
+
+    elapsed: float = time.time() - start_time
+    print('\r'.ljust(80))
+    _print_summary(results, elapsed)
+
+    return 1 if all(result.ok for result in results) else -1
+
+def _print_summary(results: list[FleetResult], elapsed: float) -> None:
+    print('Job\tPort\tCommand\tResult\tTime\tThroughput')
+
+    for result in sorted(results, key=lambda r: r.job.number):
+        throughput: str = f'{result.transferred / result.seconds / 1024:.1f}KB/s' if result.ok and result.seconds > 0 else '-'
+        outcome: str = 'OK' if result.ok else f'FAILED ({result.error})'
+        print(f'{result.job.number}\t{result.port}\t{result.job.command}\t{outcome}\t{result.seconds:.1f}s\t{throughput}')
+
+    total_transferred: int = sum(result.transferred for result in results)
+    failed: int = sum(1 for result in results if not result.ok)
+    aggregated: float = total_transferred / elapsed / 1024 if elapsed > 0 else 0
+
+    print(f'{len(results) - failed} jobs completed, {failed} failed, in {elapsed:.1f} seconds. Aggregated throughput {aggregated:.1f}KB/s')
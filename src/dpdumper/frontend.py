@@ -1,29 +1,41 @@
 """Frontend module"""
 
+from __future__ import annotations
+
 import argparse
 import traceback
 import logging
 import time
 import math
-
-import serial
+import contextlib
+import os
 
 from enum import Enum
+from typing import TYPE_CHECKING, Any
 
-from dupicolib.hardware_board_commands import HardwareBoardCommands
-from dupicolib.board_command_class_factory import BoardCommandClassFactory
-from dupicolib.board_utilities import BoardUtilities
-from dupicolib.board_fw_version import FwVersionTools, FWVersionDict
+from dpdumper import __name__, __version__
+from dpdumper.dumper_utilities import DumperUtilities, BoardInfo
+from dpdumper.address_ranges import parse_range, merge_ranges, intersect_ranges
+from dpdumper.preflight import PREFLIGHT_MODES
+from dpdumper.hiz_sampling import HIZ_STRIDE
 
-from dpdumperlib.ic.ic_loader import ICLoader
-from dpdumperlib.ic.ic_definition import ICDefinition
-import dpdumperlib.io.file_utils as FileUtils
+import dpdumper.run_stats as RunStats
+import dpdumper.progress as Progress
+import dpdumper.output_workers as OutputWorkers
 
-from dpdumper import __name__, __version__
-from dpdumper.dumper_utilities import DumperUtilities
-from dpdumper.hl_board_utilities import HLBoardUtilities, DataElement
+# pyserial, dupicolib, dpdumperlib and the modules built on them are slow to import, and not every command needs them.
+# They are imported by the functions that use them, so listing the ports or exporting a container starts quickly.
+if TYPE_CHECKING:
+    import serial
 
-import dpdumper.outfile_utilities as OutFileUtilities
+    from dupicolib.hardware_board_commands import HardwareBoardCommands
+    from dupicolib.board_fw_version import FWVersionDict
+    from dpdumperlib.ic.ic_definition import ICDefinition
+
+    from dpdumper.ic_dump import ICDump
+    from dpdumper.read_checkpoint import ReadCheckpoint
+    from dpdumper.ic_probe import ProbeResult
+    from dpdumper.rom_index import RomFingerprint, RomMatch
 
 MIN_SUPPORTED_MODEL: int = 3
 
@@ -33,6 +45,12 @@ class Subcommands(Enum):
     TEST = 'test'
     WRITE = 'write'
     READ = 'read'
+    FLEET = 'fleet'
+    BENCH_LINK = 'bench-link'
+    EXPORT = 'export'
+    INDEX = 'index'
+    SERVE = 'serve'
+    SUBMIT = 'submit'
 
 def _build_argsparser() -> argparse.ArgumentParser:
     parser: argparse.ArgumentParser = argparse.ArgumentParser(
@@ -43,7 +61,6 @@ def _build_argsparser() -> argparse.ArgumentParser:
     parser.add_argument('-v', '--verbose', action='count', default=0)
     parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
     parser.add_argument('-p', '--port',
-                        required=True,
                         type=str,
                         nargs='?',
                         metavar="serial port",
@@ -54,6 +71,31 @@ def _build_argsparser() -> argparse.ArgumentParser:
                         metavar="Baud rate",
                         default=115200,
                         help='Speed at which to the serial port is opened')
+    parser.add_argument('--auto-baud',
+                        action='store_true',
+                        dest='auto_baud',
+                        default=False,
+                        help='Measure the link at several speeds before running the command, and use the fastest reliable one. Only for the commands that take an IC definition, whose pins are used for the transfers')
+    parser.add_argument('--stats',
+                        type=str,
+                        nargs='?',
+                        const='-',
+                        metavar='stats file',
+                        help='Print a breakdown of where the time went, and append it as a line of JSON to the file (or print it, if no file is given)')
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        dest='no_cache',
+                        default=False,
+                        help='Always parse the IC definition, without using or updating the definition cache')
+    parser.add_argument('--progress',
+                        type=str,
+                        choices=Progress.RENDERERS,
+                        default='bar',
+                        help='How the progress of the transfers is shown: a progress bar, nothing, or lines of JSON on the standard error. Defaults to bar')
+    parser.add_argument('--workers',
+                        type=int,
+                        metavar='workers',
+                        help='Number of processes that build the table output of large dumps. Defaults to one per CPU, 1 builds it in the main process')
     
     subparsers = parser.add_subparsers(help='supported subcommands', dest='subcommand')
     subparsers.add_parser(Subcommands.TEST.value, help='Execute the selftest routine of the dupico board')
@@ -66,8 +108,7 @@ def _build_argsparser() -> argparse.ArgumentParser:
     parser_read.add_argument('-o', '--outfile',
                              type=str,
                              metavar='output file',
-                             help='Output file that will contain the data read from the IC in ASCII human-readable format',
-                             required=True)
+                             help='Output file that will contain the data read from the IC in ASCII human-readable format')
     parser_read.add_argument('-ob', '--outfile_binary',
                              type=str,
                              metavar='binary output file',
@@ -76,10 +117,46 @@ def _build_argsparser() -> argparse.ArgumentParser:
                              type=str,
                              metavar='binary output file for the Hi-Z mask',
                              help='Binary output file that will contain the Hi-Z mask for every data entry')
+    parser_read.add_argument('-c', '--container',
+                             type=str,
+                             metavar='container file',
+                             help='Output container that will hold data, Hi-Z mask, IC definition and board information in a single indexed file')
+    parser_read.add_argument('--no_compression',
+                             action='store_true',
+                             default=False,
+                             help='If set, the blocks in the container are stored without compression')
+    parser_read.add_argument('--passes',
+                             type=int,
+                             default=1,
+                             metavar='passes',
+                             help='Read the IC this many times in the same session and vote every bit, reporting the unstable ones')
+    parser_read.add_argument('--probe',
+                             action='store_true',
+                             default=False,
+                             help='Detect upper address lines ignored by the IC and read only the unique region, mirroring it over the rest. Blank regions are reported too')
+    parser_read.add_argument('-r', '--range',
+                             type=parse_range,
+                             action='append',
+                             dest='ranges',
+                             metavar='START:END',
+                             help='Range of addresses to read, with END excluded. Can be repeated. Defaults to the whole IC')
+    parser_read.add_argument('--fill',
+                             type=lambda value: int(value, 0),
+                             default=0xFF,
+                             metavar='value',
+                             help='Value of the addresses outside the requested ranges in the binary output and in the container. Defaults to 0xFF')
     parser_read.add_argument('--check_hiz',
                              action='store_true',
                              default=False,
                              help='Check if data pins are Hi-Z or not. Slows down the read.')    
+    parser_read.add_argument('--adaptive_hiz',
+                             type=int,
+                             nargs='?',
+                             const=HIZ_STRIDE,
+                             default=None,
+                             dest='hiz_stride',
+                             metavar='stride',
+                             help=f'Check for Hi-Z pins reading again only the blocks where a data line never goes high or the value never changes, plus one block every stride (defaults to {HIZ_STRIDE}). Falls back to a full second pass if the samples find Hi-Z bits. Implies --check_hiz')
     parser_read.add_argument('--hiz_high',
                              action='store_true',
                              default=False,
@@ -92,6 +169,31 @@ def _build_argsparser() -> argparse.ArgumentParser:
                              action='store_true',
                              default=False,
                              help='If set, the output binary file will be written in Little Endian format')
+    parser_read.add_argument('--stream',
+                             action='store_true',
+                             default=False,
+                             help='If set, read the IC in blocks and write the outputs while the read is in progress, keeping memory usage constant')
+    parser_read.add_argument('--checkpoint',
+                             action='store_true',
+                             default=False,
+                             help='If set, read the IC in blocks and save every completed block to a sidecar file next to the output, so the read can be resumed')
+    parser_read.add_argument('--resume',
+                             action='store_true',
+                             default=False,
+                             help='Resume an interrupted read from its sidecar file, reading only the missing blocks. Implies --checkpoint')
+    parser_read.add_argument('--index',
+                             type=str,
+                             metavar='index file',
+                             help='ROM index to look up the binary output in, reporting the known image it matches or the closest ones')
+    parser_read.add_argument('--index_store',
+                             action='store_true',
+                             default=False,
+                             help='If set, a dump that is not in the ROM index is added to it, storing only the blocks the index does not hold yet')
+    parser_read.add_argument('--preflight',
+                             type=str,
+                             choices=PREFLIGHT_MODES,
+                             default='off',
+                             help='Sample a few blocks before the read to detect an empty socket, a floating bus or a blank IC. warn only reports it, check aborts the read when the bus looks not driven. Defaults to off')
 
     parser_write = subparsers.add_parser(Subcommands.WRITE.value, help='Write the content of a file into a supported (and writable) IC')
     parser_write.add_argument('-d', '--definition',
@@ -113,6 +215,25 @@ def _build_argsparser() -> argparse.ArgumentParser:
                               default=0,
                               metavar='ending entries to skip',
                               help='Number of entries to skip at end of the write')
+    parser_write.add_argument('-r', '--range',
+                              type=parse_range,
+                              action='append',
+                              dest='ranges',
+                              metavar='START:END',
+                              help='Range of addresses to write, with END excluded. Can be repeated. Defaults to the whole IC')
+    parser_write.add_argument('--diff',
+                              action='store_true',
+                              default=False,
+                              help='If set, read the IC first and write only the entries that differ from the input file')
+    parser_write.add_argument('--verify',
+                              action='store_true',
+                              default=False,
+                              help='If set, read back the written entries and report the ones that do not match the input file')
+    parser_write.add_argument('--verify_retries',
+                              type=int,
+                              default=0,
+                              metavar='retries',
+                              help='Number of times the entries that fail verification are written again. Implies --verify')
     parser_write.add_argument('--skip_note',
                              action='store_true',
                              default=False,
@@ -121,8 +242,137 @@ def _build_argsparser() -> argparse.ArgumentParser:
                              action='store_true',
                              default=False,
                              help='If set, the input file will be read in Little Endian format')
+    parser_write.add_argument('--no_pipeline',
+                             action='store_true',
+                             default=False,
+                             help='If set, wait for the response to every command before sending the next one')
 
 
+    parser_fleet = subparsers.add_parser(Subcommands.FLEET.value, help='Run a list of read and write jobs concurrently on several boards')
+    parser_fleet.add_argument('-j', '--jobs',
+                              type=str,
+                              metavar='jobs file',
+                              help='Path to the TOML file containing the list of jobs to run',
+                              required=True)
+    parser_fleet.add_argument('--ports',
+                              type=str,
+                              nargs='+',
+                              metavar='serial port',
+                              help='Serial ports of the boards to use, one worker is started for every board. Defaults to the ports listed in the jobs file')
+
+    parser_bench = subparsers.add_parser(Subcommands.BENCH_LINK.value, help='Measure the throughput and error rate of bulk transfers at several speeds')
+    parser_bench.add_argument('--baudrates',
+                              type=int,
+                              nargs='+',
+                              metavar='Baud rate',
+                              help='Speeds to try. Defaults to a list of common speeds from 115200 to 3000000')
+    parser_bench.add_argument('--size_bits',
+                              type=int,
+                              default=14,
+                              metavar='address bits',
+                              help='Every transfer walks this many address lines, for 2^bits entries')
+    parser_bench.add_argument('--repeats',
+                              type=int,
+                              default=3,
+                              metavar='transfers',
+                              help='Number of transfers for every speed')
+    parser_bench.add_argument('-d', '--definition',
+                              metavar='definition file',
+                              help='If passed, the transfers use the pins of this IC. The IC is never powered')
+
+    parser_export = subparsers.add_parser(Subcommands.EXPORT.value, help='Produce the table and binary outputs from a dump container')
+    parser_export.add_argument('-i', '--infile',
+                               type=str,
+                               metavar='container file',
+                               help='Container produced by a read',
+                               required=True)
+    parser_export.add_argument('-o', '--outfile',
+                               type=str,
+                               metavar='output file',
+                               help='Output file that will contain the data in ASCII human-readable format')
+    parser_export.add_argument('-ob', '--outfile_binary',
+                               type=str,
+                               metavar='binary output file',
+                               help='Binary output file that will contain the data')
+    parser_export.add_argument('-obz', '--outfile_binary_z',
+                               type=str,
+                               metavar='binary output file for the Hi-Z mask',
+                               help='Binary output file that will contain the Hi-Z mask for every data entry')
+    parser_export.add_argument('--hiz_high',
+                               action='store_true',
+                               default=False,
+                               help='The binary output will be saved with hi-z bits set to 1')
+    parser_export.add_argument('-rb', '--reverse_byte_order',
+                               action='store_true',
+                               default=False,
+                               help='If set, the output binary file will be written in Little Endian format')
+
+    parser_index = subparsers.add_parser(Subcommands.INDEX.value, help='Build a ROM index from existing dumps, and look up or extract images')
+    parser_index.add_argument('-x', '--index',
+                              type=str,
+                              metavar='index file',
+                              help='Path to the ROM index, created if it does not exist',
+                              required=True)
+    parser_index.add_argument('-a', '--add',
+                              type=str,
+                              action='append',
+                              metavar='path',
+                              help='Binary image, dump container or directory of dumps to add to the index. Can be repeated')
+    parser_index.add_argument('--glob',
+                              type=str,
+                              default='*',
+                              metavar='pattern',
+                              help='Only the files matching this pattern are added from directories. Defaults to *')
+    parser_index.add_argument('--store',
+                              action='store_true',
+                              default=False,
+                              help='If set, the blocks of the added images are stored in the index too, each distinct block only once')
+    parser_index.add_argument('-l', '--lookup',
+                              type=str,
+                              action='append',
+                              metavar='file',
+                              help='Binary image or dump container to look up in the index. Can be repeated')
+    parser_index.add_argument('-e', '--extract',
+                              type=str,
+                              metavar='SHA1SUM',
+                              help='Rebuild the image with this SHA1SUM from the blocks stored in the index')
+    parser_index.add_argument('-o', '--outfile',
+                              type=str,
+                              metavar='output file',
+                              help='Output file for the extracted image')
+
+    parser_serve = subparsers.add_parser(Subcommands.SERVE.value, help='Keep the board connected and run the jobs submitted over a local socket')
+    parser_serve.add_argument('-s', '--socket',
+                              type=str,
+                              metavar='socket path',
+                              help='Path of the Unix socket to listen on. Defaults to dpdumper.sock in the temporary directory')
+    parser_serve.add_argument('--tcp_port',
+                              type=int,
+                              metavar='port',
+                              help='Listen on this TCP port of the loopback interface instead of a Unix socket. Any local user can connect to it, so only jobs whose files are inside the current directory are accepted')
+
+    parser_submit = subparsers.add_parser(Subcommands.SUBMIT.value, help='Submit jobs to a running server and relay their output')
+    parser_submit.add_argument('-j', '--jobs',
+                               type=str,
+                               metavar='jobs file',
+                               help='Path to the TOML file containing the list of jobs to run, in the same format used by the fleet command')
+    parser_submit.add_argument('-s', '--socket',
+                               type=str,
+                               metavar='socket path',
+                               help='Path of the Unix socket of the server. Defaults to dpdumper.sock in the temporary directory')
+    parser_submit.add_argument('--tcp_port',
+                               type=int,
+                               metavar='port',
+                               help='Connect to this TCP port of the loopback interface instead of a Unix socket')
+    parser_submit.add_argument('--status',
+                               action='store_true',
+                               default=False,
+                               help='Print the state of the server')
+    parser_submit.add_argument('--shutdown',
+                               action='store_true',
+                               default=False,
+                               help='Stop the server, once the submitted jobs are done')
+
     return parser
 
 def print_note(note: str, delay: int = 5) -> None:
@@ -135,9 +385,7 @@ def print_note(note: str, delay: int = 5) -> None:
         time.sleep(1)
     print(' ' * 80, end='\r')
 
-def test_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands]) -> None:
-    delay: int = 5
-
+def test_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], delay: int = 5) -> bool | None:
     print('Make sure the ZIF socket is empty before starting the test!')
 
     for i in range(delay, 0, -1):
@@ -152,65 +400,500 @@ def test_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands]) ->
     else:
         print(f'Test result is {"OK" if test_result else "BAD"}!')
 
-def read_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, outf: str, outfb: str | None = None, outfbz: str | None = None, check_hiz: bool = False, hiz_high: bool = False, skip_note: bool = False, reverse_byte_order: bool = False) -> None:
-    _LOGGER.debug(f'Read command with definition {ic_definition.name}, output table {outf}, output binary {outfb}, output Hi-Z binary {outfbz}, check Hi-Z {check_hiz}, treat Hi-Z as high {hiz_high}')
+    return test_result
+
+def read_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, outf: str | None, outfb: str | None = None, outfbz: str | None = None, check_hiz: bool = False, hiz_high: bool = False, skip_note: bool = False, reverse_byte_order: bool = False, stream: bool = False, board_info: BoardInfo | None = None, checkpoint: bool = False, resume: bool = False, outfc: str | None = None, compress: bool = True, passes: int = 1, probe: bool = False, close_port: bool = True, ranges: list[tuple[int, int]] | None = None, fill: int = 0xFF, rom_index: str | None = None, index_store: bool = False, preflight: str = 'off', hiz_stride: int | None = None) -> None:
+    from dpdumper.hl_board_utilities import HLBoardUtilities
+    from dpdumper.read_checkpoint import ReadCheckpoint
+    from dpdumper.ic_dump import fill_gaps
+    import dpdumper.outfile_utilities as OutFileUtilities
+    import dpdumper.dump_container as DumpContainer
+
+    _LOGGER.debug(f'Read command with definition {ic_definition.name}, output table {outf}, output binary {outfb}, output Hi-Z binary {outfbz}, output container {outfc}, check Hi-Z {check_hiz}, treat Hi-Z as high {hiz_high}, streaming {stream}, checkpoint {checkpoint}, resume {resume}, passes {passes}, probe {probe}, ranges {ranges}, fill {fill:X}, ROM index {rom_index}, store in the index {index_store}, pre-flight {preflight}, Hi-Z stride {hiz_stride}')
+
+    if not (outf or outfb or outfc):
+        raise ValueError('No output was requested for the read')
+
+    if hiz_stride is not None:
+        if hiz_stride < 1:
+            raise ValueError(f'Stride of the adaptive Hi-Z check must be at least 1, got {hiz_stride}')
+        check_hiz = True
 
     if outfbz and not check_hiz:
         _LOGGER.warning(f'Output for Hi-Z binary {outfbz} was requested, but check for Hi-Z was disabled, we are not going to write the file!')
         outfbz = None
 
+    checkpoint = checkpoint or resume
+    if checkpoint and board_info is None:
+        raise ValueError('Checkpointing a read requires information on the board')
+
+    if checkpoint and stream:
+        _LOGGER.warning('Both streaming and checkpointing were requested, outputs will be written only once the read is complete.')
+        stream = False
+
+    if passes < 1:
+        raise ValueError(f'Number of passes must be at least 1, got {passes}')
+
+    if passes > 1 and (stream or checkpoint):
+        _LOGGER.warning('Multiple passes were requested, the IC will be read as a whole and streaming or checkpointing will not be used.')
+        stream = checkpoint = False
+
+    if probe and passes > 1:
+        raise ValueError('Probing the IC and reading it in multiple passes cannot be combined')
+
+    if probe and (stream or checkpoint):
+        _LOGGER.warning('Probing was requested, the IC will be read as a whole and streaming or checkpointing will not be used.')
+        stream = checkpoint = False
+
+    if ranges and (passes > 1 or probe):
+        raise ValueError('Reading ranges of addresses cannot be combined with multiple passes or probing')
+
+    if ranges and (stream or checkpoint):
+        _LOGGER.warning('Ranges of addresses were requested, streaming or checkpointing will not be used.')
+        stream = checkpoint = False
+
+    if hiz_stride is not None and (stream or checkpoint or ranges or probe or passes > 1):
+        _LOGGER.warning('The adaptive Hi-Z check works only when reading the IC as a whole, a full second pass will be used.')
+        hiz_stride = None
+
     print(f'Reading {ic_definition.name}')
     if not skip_note and ic_definition.adapter_notes and bool(ic_definition.adapter_notes.strip()):
         print_note(ic_definition.adapter_notes)
 
+    if stream:
+        _read_command_stream(ser, cmd_class, ic_definition, outf, outfb, outfbz, check_hiz, hiz_high, reverse_byte_order, outfc, board_info, compress, close_port, rom_index, index_store, preflight)
+        return
+
+    read_checkpoint: ReadCheckpoint | None = None
+    ic_data: ICDump | None = None
+    unstable: list[tuple[int, int, int]] | None = None
+    probe_result: ProbeResult | None = None
+    range_dumps: list[tuple[int, ICDump]] | None = None
+
     start_time: float = time.time()
-    ic_data: list[DataElement] | None = HLBoardUtilities.read_ic(ser, cmd_class, ic_definition, check_hiz)
+    if ranges:
+        range_dumps = HLBoardUtilities.read_ic_ranges(ser, cmd_class, ic_definition, ranges, check_hiz, preflight)
+        ic_data = fill_gaps(range_dumps, 1 << len(ic_definition.address), len(ic_definition.data), fill)
+    elif probe:
+        ic_data, probe_result = HLBoardUtilities.read_ic_probed(ser, cmd_class, ic_definition, check_hiz, preflight)
+    elif passes > 1:
+        ic_data, unstable = HLBoardUtilities.read_ic_consensus(ser, cmd_class, ic_definition, passes, check_hiz, preflight)
+    elif checkpoint:
+        # The checkpoint files are placed next to the first requested output
+        read_checkpoint = ReadCheckpoint(outf or outfc or outfb, ic_definition, board_info, check_hiz, HLBoardUtilities.STREAM_BLOCK_BITS, resume) # type: ignore
+        ic_data = _read_command_checkpoint(ser, cmd_class, ic_definition, check_hiz, read_checkpoint, preflight)
+    else:
+        ic_data = HLBoardUtilities.read_ic(ser, cmd_class, ic_definition, check_hiz, preflight, hiz_stride)
     end_time: float = time.time()
 
     if ic_data is None:
-        _LOGGER.critical(f'Unable to read data from {ic_definition.name}')
-        return
+        raise IOError(f'Unable to read data from {ic_definition.name}')
 
     # No point in keeping the connection open. Close it early, as the dupico will power down the IC when connection closes.
-    ser.close()
+    if close_port:
+        ser.close()
 
     print(f'Reading took {math.ceil(end_time - start_time)} seconds.')
 
-    OutFileUtilities.build_output_table_file(outf, ic_definition, ic_data)
+    if outf:
+        with RunStats.phase('table_write'):
+            # With ranges, the table lists only the addresses that were actually read
+            if range_dumps is not None:
+                OutFileUtilities.build_output_table_file_from_blocks(outf, ic_definition, range_dumps, allow_gaps=True)
+            else:
+                OutFileUtilities.build_output_table_file(outf, ic_definition, ic_data)
+
+    if outfc:
+        metadata: dict[str, Any] = {}
+        if probe_result:
+            metadata['probe'] = probe_result.to_dict()
+        if range_dumps is not None:
+            metadata['ranges'] = [[start, start + len(dump)] for start, dump in range_dumps]
+            metadata['fill'] = fill
+
+        with RunStats.phase('container_write'):
+            DumpContainer.write_dump_container(outfc, ic_definition, ic_data, board_info, compress, metadata or None)
+
     data_array, hiz_array, sha1sum = OutFileUtilities.build_binary_array(ic_definition, ic_data, hiz_high, reverse_byte_order)
 
     print(f'Data has SHA1SUM {sha1sum}')
+    if range_dumps is not None:
+        print(f'Addresses outside the {len(range_dumps)} requested ranges are filled with {fill:X}.')
+
+    with RunStats.phase('binary_write'):
+        if outfb:
+            OutFileUtilities.build_output_binary_file(outfb, data_array)
+
+        if outfbz:
+            OutFileUtilities.build_output_binary_file(outfbz, hiz_array)
+
+    # Outputs are safely on disk, the checkpoint is not needed anymore
+    if read_checkpoint:
+        read_checkpoint.remove()
+
+    if rom_index:
+        import dpdumper.rom_index as RomIndex
+
+        _check_rom_index(rom_index, *RomIndex.fingerprint(data_array, index_store), outf, outfb, outfc, index_store)
 
-    if outfb:
-        OutFileUtilities.build_output_binary_file(outfb, data_array)
+    if unstable is not None:
+        _print_unstable_report(ic_definition, passes, unstable)
 
-    if outfbz:
-        OutFileUtilities.build_output_binary_file(outfbz, hiz_array)
+    if probe_result is not None:
+        _print_probe_report(ic_definition, probe_result)
 
     return
 
-def write_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, inf: str, begin_skip: int = 0, end_skip: int = 0, skip_note: bool = False, reverse_byte_order: bool = False) -> None:
-    _LOGGER.debug(f'Write command with definition {ic_definition.name} and input file {inf}')
+def _read_command_checkpoint(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, check_hiz: bool, read_checkpoint: ReadCheckpoint, preflight: str = 'off') -> ICDump:
+    from dpdumper.hl_board_utilities import HLBoardUtilities
+
+    missing_blocks: list[int] = read_checkpoint.missing_blocks()
+
+    if missing_blocks:
+        print(f'Reading {len(missing_blocks)} blocks of {1 << read_checkpoint.block_bits} addresses, progress is saved in {read_checkpoint.sidecar_path}')
+
+        try:
+            for base_address, block in HLBoardUtilities.read_ic_blocks(ser, cmd_class, ic_definition, check_hiz, read_checkpoint.block_bits, missing_blocks, preflight):
+                read_checkpoint.store_block(base_address, block)
+        except Exception:
+            print(f'\nRead was interrupted, use --resume to continue it from {read_checkpoint.sidecar_path}')
+            raise
+    else:
+        print('All blocks were already read, using the data in the checkpoint.')
+
+    return read_checkpoint.load_dump()
+
+def _read_command_stream(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, outf: str | None, outfb: str | None, outfbz: str | None, check_hiz: bool, hiz_high: bool, reverse_byte_order: bool, outfc: str | None = None, board_info: BoardInfo | None = None, compress: bool = True, close_port: bool = True, rom_index: str | None = None, index_store: bool = False, preflight: str = 'off') -> None:
+    from dpdumper.hl_board_utilities import HLBoardUtilities
+    import dpdumper.outfile_utilities as OutFileUtilities
+    import dpdumper.dump_container as DumpContainer
+    import dpdumper.rom_index as RomIndex
+
+    start_time: float = time.time()
+    # Blocks are hashed for the ROM index as they are written, so the lookup does not need the whole dump
+    fingerprinter: RomIndex.Fingerprinter | None = RomIndex.Fingerprinter(index_store) if rom_index else None
+
+    with contextlib.ExitStack() as stack:
+        writer: OutFileUtilities.DumpStreamWriter = stack.enter_context(OutFileUtilities.DumpStreamWriter(ic_definition, outf, outfb, outfbz, hiz_high, reverse_byte_order, fingerprinter.update if fingerprinter else None))
+        container: DumpContainer.DumpContainerWriter | None = stack.enter_context(DumpContainer.DumpContainerWriter(outfc, ic_definition, check_hiz, board_info, compress)) if outfc else None
+
+        for base_address, block in HLBoardUtilities.read_ic_blocks(ser, cmd_class, ic_definition, check_hiz, preflight=preflight):
+            with RunStats.phase('stream_write'):
+                writer.write_block(base_address, block)
+                if container:
+                    container.write_block(base_address, block)
+
+        sha1sum: str = writer.hexdigest()
+
+    end_time: float = time.time()
+
+    if close_port:
+        ser.close()
+
+    print(f'Reading took {math.ceil(end_time - start_time)} seconds.')
+    print(f'Data has SHA1SUM {sha1sum}')
+
+    if rom_index and fingerprinter:
+        _check_rom_index(rom_index, fingerprinter.fingerprint(), fingerprinter.blocks, outf, outfb, outfc, index_store)
+
+def _check_rom_index(index_path: str, rom: RomFingerprint, blocks: list[bytes], outf: str | None, outfb: str | None, outfc: str | None, store: bool) -> None:
+    from dpdumper.rom_index import RomIndex
+
+    with RunStats.phase('rom_index'):
+        with RomIndex(index_path) as index:
+            matches: list[RomMatch] = index.lookup(rom)
+            known: bool = bool(matches) and matches[0].exact
+            # The dump is named after its outputs, only the binary output holds the image as it is in the index
+            added: bool = store and not known and index.add(os.path.basename(outfb or outfc or outf), os.path.abspath(outfb) if outfb else None, rom, blocks) # type: ignore
+
+    _print_rom_matches(matches)
+
+    if added:
+        print(f'Dump was added to the ROM index {index_path}.')
+
+def _print_rom_matches(matches: list[RomMatch]) -> None:
+    if matches and matches[0].exact:
+        print(f'Dump matches {matches[0].name}{f" ({matches[0].path})" if matches[0].path else ""} in the ROM index.')
+        return
+
+    if not matches:
+        print('Dump is not in the ROM index, and shares no blocks with the known images.')
+        return
+
+    print('Dump is not in the ROM index, the closest known images are:')
+    for match in matches:
+        print(f'\t{match.name}: matches except {match.differing_blocks} of {match.total_blocks} blocks')
+
+def index_command(index_path: str, add_paths: list[str] | None = None, pattern: str = '*', store: bool = False, lookups: list[str] | None = None, extract: str | None = None, outf: str | None = None) -> None:
+    import dpdumper.rom_index as RomIndex
+
+    _LOGGER.debug(f'Index command with index {index_path}, adding {add_paths} matching {pattern}, store {store}, looking up {lookups}, extracting {extract} to {outf}')
+
+    with RomIndex.RomIndex(index_path) as index:
+        for path in add_paths or []:
+            if os.path.isdir(path):
+                added, skipped = index.add_directory(path, pattern, store)
+            else:
+                added, skipped = (1, 0) if index.add_file(path, store) else (0, 1)
+
+            print(f'Added {added} images from {path}, {skipped} were already in the index.')
+
+        print(f'Index {index_path} holds {len(index)} images.')
+
+        for path in lookups or []:
+            rom, _ = RomIndex.fingerprint(RomIndex.read_image(path))
+
+            start_time: float = time.perf_counter()
+            matches: list[RomMatch] = index.lookup(rom)
+            print(f'{os.path.basename(path)}, SHA1SUM {rom.sha1}, CRC32 {rom.crc32:08X}, looked up in {(time.perf_counter() - start_time) * 1000:.1f}ms:')
+            _print_rom_matches(matches)
+
+        if extract:
+            with open(outf, 'wb') as f: # type: ignore
+                f.write(index.extract(extract))
+            print(f'Image {extract} was extracted to {outf}.')
+
+def export_command(inf: str, outf: str | None = None, outfb: str | None = None, outfbz: str | None = None, hiz_high: bool = False, reverse_byte_order: bool = False) -> None:
+    import dpdumper.outfile_utilities as OutFileUtilities
+    import dpdumper.dump_container as DumpContainer
+
+    _LOGGER.debug(f'Export command from container {inf}, output table {outf}, output binary {outfb}, output Hi-Z binary {outfbz}, treat Hi-Z as high {hiz_high}')
+
+    with DumpContainer.DumpContainerReader(inf) as reader:
+        ic_definition: ICDefinition = reader.definition
+        board_info: BoardInfo | None = reader.board_info
+
+        print(f'Container holds a dump of {ic_definition.name}, {len(reader)} addresses{", with Hi-Z mask" if reader.has_hiz else ""}.')
+        if board_info:
+            print(f'Read with board model {board_info.model}, firmware {board_info.fw_version}')
+
+        if outfbz and not reader.has_hiz:
+            _LOGGER.warning(f'Output for Hi-Z binary {outfbz} was requested, but the container has no Hi-Z mask, we are not going to write the file!')
+            outfbz = None
+
+        # Blocks are decoded and checked one at a time, the whole dump is never in memory
+        with OutFileUtilities.DumpStreamWriter(ic_definition, outf, outfb, outfbz, hiz_high, reverse_byte_order) as writer:
+            for base_address, block in reader.blocks(verify=True):
+                with RunStats.phase('stream_write'):
+                    writer.write_block(base_address, block)
+
+            sha1sum: str = writer.hexdigest()
+
+    print(f'Data has SHA1SUM {sha1sum}')
+
+def write_command(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic_definition: ICDefinition, inf: str, begin_skip: int = 0, end_skip: int = 0, skip_note: bool = False, reverse_byte_order: bool = False, pipelined: bool = True, ranges: list[tuple[int, int]] | None = None, diff: bool = False, verify: bool = False, verify_retries: int = 0) -> None:
+    from dpdumper.hl_board_utilities import HLBoardUtilities
+    from dpdumper.write_input import WriteInput
+
+    _LOGGER.debug(f'Write command with definition {ic_definition.name} and input file {inf}, ranges {ranges}, diff {diff}, verify {verify} with {verify_retries} retries')
 
     print(f'Writing {ic_definition.name}')
+
+    addr_combs: int = 1 << len(ic_definition.address)
+    write_ranges: list[tuple[int, int]] = merge_ranges(ranges) if ranges else [(0, addr_combs)]
     
     if begin_skip or end_skip:
         print(f'Skipping {begin_skip} entries at the start, and {end_skip} at the end.')
 
-    if not skip_note and ic_definition.adapter_notes and bool(ic_definition.adapter_notes.strip()):
-        print_note(ic_definition.adapter_notes)
+        if addr_combs - (begin_skip + end_skip) <= 0:
+            raise ValueError(f'Skipping {begin_skip} entries at the beginning and {end_skip} entries at the end results in a 0 or negative number of addresses')
+
+        write_ranges = intersect_ranges(write_ranges, [(begin_skip, addr_combs - end_skip)])
+
+    # Everything is checked before the adapter notes, so a wrong file or range does not cost their delays
+    if any(end > addr_combs for _, end in write_ranges):
+        raise ValueError(f'Requested ranges {write_ranges} go past the {addr_combs} addresses supported by the IC')
+
+    if not write_ranges:
+        raise ValueError('Requested ranges do not contain any address to write')
 
     bytes_per_entry: int = -(len(ic_definition.data) // -8)
-    data_list: list[int] = FileUtils.load_file_data(inf, bytes_per_entry, reverse_byte_order)
-    
-    start_time: float = time.time()
-    HLBoardUtilities.write_ic(ser, cmd_class, ic_definition, data_list, begin_skip, end_skip)
-    end_time: float = time.time()
+    with RunStats.phase('input_load'):
+        write_input: WriteInput = WriteInput(inf, bytes_per_entry, reverse_byte_order, addr_combs)
+
+    with write_input:
+        if not skip_note and ic_definition.adapter_notes and bool(ic_definition.adapter_notes.strip()):
+            print_note(ic_definition.adapter_notes)
+
+        verify = verify or verify_retries > 0
+
+        start_time: float = time.time()
+        mismatches: list[tuple[int, int, int]] | None = HLBoardUtilities.write_ic(ser, cmd_class, ic_definition, write_input.entries, write_ranges, pipelined, diff, verify, verify_retries)
+        end_time: float = time.time()
 
     print(f'Writing took {math.ceil(end_time - start_time)} seconds.')
 
+    if mismatches is not None:
+        _print_verify_report(ic_definition, mismatches)
+
+def _print_address_runs(ic_definition: ICDefinition, runs: list[tuple[int, int, int]], max_lines: int = 20) -> None:
+    # Use upside-down floor division: https://stackoverflow.com/questions/14822184/is-there-a-ceiling-equivalent-of-operator-in-python
+    address_digits: int = -(len(ic_definition.address) // -8) * 2
+    data_digits: int = -(len(ic_definition.data) // -4)
+
+    for start, end, bits in runs[:max_lines]:
+        print(f'\t{start:0{address_digits}X}-{end - 1:0{address_digits}X}\tbits {bits:0{data_digits}X}')
+
+    if len(runs) > max_lines:
+        print(f'\t... and {len(runs) - max_lines} more runs')
+
+def _print_verify_report(ic_definition: ICDefinition, mismatches: list[tuple[int, int, int]], max_lines: int = 20) -> None:
+    if not mismatches:
+        print('Verification OK, all the written entries match the input file.')
+        return
+
+    failed_entries: int = sum(end - start for start, end, _ in mismatches)
+
+    print(f'Verification FAILED for {failed_entries} entries in {len(mismatches)} runs:')
+    _print_address_runs(ic_definition, mismatches, max_lines)
+
+def _print_unstable_report(ic_definition: ICDefinition, passes: int, unstable: list[tuple[int, int, int]], max_lines: int = 20) -> None:
+    if not unstable:
+        print(f'All the {passes} passes agree, no unstable bits were found.')
+        return
+
+    unstable_entries: int = sum(end - start for start, end, _ in unstable)
+
+    print(f'Found {unstable_entries} entries with unstable bits in {len(unstable)} runs, their value was decided by majority vote:')
+    _print_address_runs(ic_definition, unstable, max_lines)
+
+def _print_probe_report(ic_definition: ICDefinition, probe_result: ProbeResult, max_lines: int = 20) -> None:
+    if probe_result.mirrors > 1:
+        print(f'Only {probe_result.decoded_bits} of {probe_result.address_bits} address lines are decoded, the content is mirrored {probe_result.mirrors} times.')
+    else:
+        print(f'All the {probe_result.address_bits} address lines are decoded, no mirroring was found.')
+
+    if not probe_result.blank_ranges:
+        print('No blank regions were found.')
+        return
+
+    blank_entries: int = sum(end - start for start, end in probe_result.blank_ranges)
+    address_digits: int = -(len(ic_definition.address) // -8) * 2
+
+    print(f'Found {blank_entries} blank entries in {len(probe_result.blank_ranges)} regions:')
+    for start, end in probe_result.blank_ranges[:max_lines]:
+        print(f'\t{start:0{address_digits}X}-{end - 1:0{address_digits}X}')
+
+    if len(probe_result.blank_ranges) > max_lines:
+        print(f'\t... and {len(probe_result.blank_ranges) - max_lines} more regions')
+
+def connect_board(port: str, baudrate: int) -> tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None:
+    """Opens the serial port, initializes the connection with the board and identifies it
+
+    Args:
+        port (str): Serial port associated with the board
+        baudrate (int): Speed at which to the serial port is opened
+
+    Returns:
+        tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None: The open serial port, the command class for the board and the board info,
+                                                                           or None if the board could not be identified
+    """
+    import serial
+
+    from dupicolib.hardware_board_commands import HardwareBoardCommands
+    from dupicolib.board_command_class_factory import BoardCommandClassFactory
+    from dupicolib.board_utilities import BoardUtilities
+    from dupicolib.board_fw_version import FwVersionTools
+
+    _LOGGER.debug(f'Trying to open serial port {port}')
+    with RunStats.phase('serial_open'):
+        ser_port: serial.Serial = serial.Serial(port = port,
+                                                baudrate=baudrate,
+                                                bytesize = 8,
+                                                stopbits = 1,
+                                                parity = 'N',
+                                                timeout = 5.0)
+
+    try:
+        with RunStats.phase('serial_init'):
+            connected: bool = BoardUtilities.initialize_connection(ser_port)
+
+        if not connected:
+            _LOGGER.critical('Serial port connected, but the board did not respond in time.')
+            ser_port.close()
+            return None
+        
+        _LOGGER.info(f'Board connected @{port}, speed:{baudrate} ...')
+        with RunStats.phase('board_query'):
+            model: int | None = HardwareBoardCommands.get_model(ser_port)
+        if model is None:
+            _LOGGER.critical('Unable to retrieve model number...')
+            ser_port.close()
+            return None
+        elif model < MIN_SUPPORTED_MODEL:
+            _LOGGER.critical(f'Model {model} is not supported.')
+            ser_port.close()
+            return None
+        else:
+            _LOGGER.info(f'Model {model} detected!')
+
+        with RunStats.phase('board_query'):
+            fw_version: str | None = HardwareBoardCommands.get_version(ser_port)
+        fw_version_dict: FWVersionDict
+        if fw_version is None:
+            _LOGGER.critical('Unable to retrieve firmware version...')
+            ser_port.close()
+            return None
+        else:
+            fw_version_dict = FwVersionTools.parse(fw_version) # Check that the version is formatted correctly
+            _LOGGER.info(f'Firmware version on board is "{fw_version}"')
+
+        # Now we have enough information to obtain the class that handles commands specific for this board
+        command_class: type[HardwareBoardCommands] = BoardCommandClassFactory.get_command_class(model, fw_version_dict) # type: ignore
+
+        return (ser_port, command_class, BoardInfo(model, fw_version))
+    except:
+        ser_port.close()
+        raise
+
+def load_definition(definition: str, board_info: BoardInfo, cmd_class: type[HardwareBoardCommands] | None = None, use_cache: bool = True) -> ICDefinition:
+    """Loads an IC definition, and checks that its requirements are satisfied by the board
+
+    Args:
+        definition (str): Path to the definition file
+        board_info (BoardInfo): Information on the connected board
+        cmd_class (type[HardwareBoardCommands] | None, optional): If passed, the pin mappings for this command class are prepared too. Defaults to None.
+        use_cache (bool, optional): False to always parse the file, bypassing the definition cache. Defaults to True.
+
+    Raises:
+        ValueError: If the board does not satisfy the requirements of the definition
+
+    Returns:
+        ICDefinition: The loaded definition
+    """
+    from dpdumper.definition_cache import DefinitionCache
+    from dpdumperlib.ic.ic_loader import ICLoader
+
+    with RunStats.phase('definition_load'):
+        ic_definition: ICDefinition = DefinitionCache().load(definition, cmd_class) if use_cache else ICLoader.extract_definition_from_file(definition)
+
+    if ic_definition.hw_model > board_info.model:
+        raise ValueError(f'Current hardware model {board_info.model} does not satisfy requirement {ic_definition.hw_model}')
+
+    return ic_definition
+
 def cli() -> int:
-    args = _build_argsparser().parse_args()
+    parser: argparse.ArgumentParser = _build_argsparser()
+    args = parser.parse_args()
+
+    if args.subcommand == Subcommands.READ.value and not (args.outfile or args.outfile_binary or args.container):
+        parser.error('the read command requires at least one of -o, -ob or -c')
+
+    if args.subcommand == Subcommands.INDEX.value and not (args.add or args.lookup or args.extract):
+        parser.error('the index command requires at least one of -a, -l or -e')
+
+    if args.subcommand == Subcommands.INDEX.value and args.extract and not args.outfile:
+        parser.error('the index command requires -o to extract an image')
+
+    if args.subcommand == Subcommands.SUBMIT.value and not (args.jobs or args.status or args.shutdown):
+        parser.error('the submit command requires at least one of -j, --status or --shutdown')
+
+    if args.workers is not None and args.workers < 1:
+        parser.error('the number of workers must be at least 1')
+
+    # Without a definition there is no way to know which pins can be toggled with the IC in the socket
+    if args.auto_baud and getattr(args, 'definition', None) is None:
+        parser.error('--auto-baud requires a command with an IC definition')
 
     # Prepare the logger
     debug_level: int = logging.ERROR
@@ -219,57 +902,99 @@ def cli() -> int:
     elif args.verbose > 0:
         debug_level = logging.INFO
     logging.basicConfig(level=debug_level)
+
+    OutputWorkers.set_workers(args.workers)
+
+    with Progress.reporting(Progress.build_renderer(args.progress)):
+        if not args.stats:
+            return _run_command(args)
+
+        with RunStats.collect() as stats:
+            RunStats.set_info(command=args.subcommand, version=__version__)
+            result: int = _run_command(args)
+
+    RunStats.print_summary(stats)
+    RunStats.emit(stats, args.stats)
+
+    return result
+
+def _run_command(args: argparse.Namespace) -> int:
+    if args.subcommand == Subcommands.EXPORT.value:
+        try:
+            export_command(args.infile, args.outfile, args.outfile_binary, args.outfile_binary_z, args.hiz_high, args.reverse_byte_order)
+            return 1
+        except Exception as ex:
+            _LOGGER.critical(traceback.format_exc())
+            return -1
+
+    if args.subcommand == Subcommands.INDEX.value:
+        try:
+            index_command(args.index, args.add, args.glob, args.store, args.lookup, args.extract, args.outfile)
+            return 1
+        except Exception as ex:
+            _LOGGER.critical(traceback.format_exc())
+            return -1
+
+    if args.subcommand == Subcommands.FLEET.value:
+        import dpdumper.fleet as Fleet
+
+        try:
+            return Fleet.fleet_command(args.ports, args.jobs, args.baudrate)
+        except Exception as ex:
+            _LOGGER.critical(traceback.format_exc())
+            return -1
+
+    if args.subcommand == Subcommands.SUBMIT.value:
+        import dpdumper.job_server as JobServer
+
+        try:
+            return JobServer.submit_command(args.jobs, args.socket, args.tcp_port, args.status, args.shutdown)
+        except Exception as ex:
+            _LOGGER.critical(traceback.format_exc())
+            return -1
     
     if not args.port:
         DumperUtilities.print_serial_ports()      
         return 1
+    elif args.subcommand == Subcommands.BENCH_LINK.value:
+        import dpdumper.link_bench as LinkBench
+
+        try:
+            return LinkBench.bench_link_command(args.port, args.baudrates or LinkBench.DEFAULT_BAUDRATES, args.size_bits, args.repeats, args.definition)
+        except Exception as ex:
+            _LOGGER.critical(traceback.format_exc())
+            return -1
     else:
         ser_port: serial.Serial | None = None
 
         try:
-            _LOGGER.debug(f'Trying to open serial port {args.port}')
-            ser_port = serial.Serial(port = args.port,
-                                     baudrate=args.baudrate,
-                                     bytesize = 8,
-                                     stopbits = 1,
-                                     parity = 'N',
-                                     timeout = 5.0)
-
-            if not BoardUtilities.initialize_connection(ser_port):
-                _LOGGER.critical('Serial port connected, but the board did not respond in time.')
-                return -1
-            
-            _LOGGER.info(f'Board connected @{args.port}, speed:{args.baudrate} ...')
-            model: int | None = HardwareBoardCommands.get_model(ser_port)
-            if model is None:
-                _LOGGER.critical('Unable to retrieve model number...')
-                return -1
-            elif model < MIN_SUPPORTED_MODEL:
-                _LOGGER.critical(f'Model {model} is not supported.')
-                return -1
-            else:
-                _LOGGER.info(f'Model {model} detected!')
+            baudrate: int = args.baudrate
+            if args.auto_baud:
+                import dpdumper.link_bench as LinkBench
+                from dpdumperlib.ic.ic_loader import ICLoader
 
-            fw_version: str | None = HardwareBoardCommands.get_version(ser_port)
-            fw_version_dict: FWVersionDict
-            if fw_version is None:
-                _LOGGER.critical('Unable to retrieve firmware version...')
+                print('Measuring the link to pick the fastest reliable speed...')
+                with RunStats.phase('auto_baud'):
+                    baudrate = LinkBench.auto_baudrate(args.port, LinkBench.DEFAULT_BAUDRATES, args.baudrate, ICLoader.extract_definition_from_file(args.definition))
+                print(f'Using speed {baudrate}')
+
+            if args.subcommand == Subcommands.SERVE.value:
+                import dpdumper.job_server as JobServer
+
+                return JobServer.serve_command(args.port, baudrate, args.socket, args.tcp_port)
+
+            connection: tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None = connect_board(args.port, baudrate)
+            if connection is None:
                 return -1
-            else:
-                fw_version_dict = FwVersionTools.parse(fw_version) # Check that the version is formatted correctly
-                _LOGGER.info(f'Firmware version on board is "{fw_version}"')
 
-            # Now we have enough information to obtain the class that handles commands specific for this board
-            command_class: type[HardwareBoardCommands] = BoardCommandClassFactory.get_command_class(model, fw_version_dict) # type: ignore
+            ser_port, command_class, board_info = connection
+            RunStats.set_info(port=args.port, baudrate=baudrate, board_model=board_info.model, fw_version=board_info.fw_version)
 
             # Load and check IC definition requirements
             ic_definition: ICDefinition
             if hasattr(args, 'definition') and args.definition is not None:
-                ic_definition = ICLoader.extract_definition_from_file(args.definition)
-                
-                if ic_definition.hw_model > model:
-                    raise ValueError(f'Current hardware model {model} does not satisfy requirement {ic_definition.hw_model}')
-
+                ic_definition = load_definition(args.definition, board_info, command_class, not args.no_cache)
+                RunStats.set_info(ic=ic_definition.name, definition_hash=DumperUtilities.definition_hash(ic_definition))
             match args.subcommand:
                 case Subcommands.TEST.value:
                     test_command(ser_port, command_class)
@@ -278,7 +1003,12 @@ def cli() -> int:
                                   args.start_skip,
                                   args.end_skip,
                                   args.skip_note,
-                                  args.reverse_byte_order)
+                                  args.reverse_byte_order,
+                                  not args.no_pipeline,
+                                  args.ranges,
+                                  args.diff,
+                                  args.verify,
+                                  args.verify_retries)
                 case Subcommands.READ.value:
                     read_command(ser_port, command_class, ic_definition, args.outfile,
                                  args.outfile_binary if args.outfile_binary else None,
@@ -286,7 +1016,21 @@ def cli() -> int:
                                  args.check_hiz,
                                  args.hiz_high,
                                  args.skip_note,
-                                 args.reverse_byte_order)
+                                 args.reverse_byte_order,
+                                 args.stream,
+                                 board_info,
+                                 args.checkpoint,
+                                 args.resume,
+                                 args.container,
+                                 not args.no_compression,
+                                 args.passes,
+                                 args.probe,
+                                 ranges=args.ranges,
+                                 fill=args.fill,
+                                 rom_index=args.index,
+                                 index_store=args.index_store,
+                                 preflight=args.preflight,
+                                 hiz_stride=args.hiz_stride)
                 case _:
                     _LOGGER.critical(f'Unsupported command {args.subcommand}')
 
@@ -0,0 +1,56 @@
+"""This module contains the selection of the blocks read again to find the bits in Hi-Z, when the IC is checked adaptively"""
+
+from dpdumper.ic_probe import is_uniform
+
+# The adaptive Hi-Z check reads again blocks of 1 << HIZ_BLOCK_BITS addresses, sampling one block every HIZ_STRIDE by default
+HIZ_BLOCK_BITS: int = 8
+HIZ_STRIDE: int = 16
+
+def _fold_entries(value: int, entries: int, entry_bits: int) -> int:
+    # OR together the entries packed in an integer, halving it at every step. Entries must be a power of two
+    while entries > 1:
+        entries //= 2
+        value = (value >> (entries * entry_bits)) | (value & ((1 << (entries * entry_bits)) - 1))
+    return value
+
+def find_hiz_candidates(data: bytes, data_width_bits: int, stride: int, block_bits: int = HIZ_BLOCK_BITS) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Picks the blocks of a dump, read with the data lines pulled low, that have to be read again with the data lines pulled high
+    to find the bits in Hi-Z. A bit in Hi-Z reads as 0 with the lines pulled low, so a block is suspicious if a data line is 0 at every address in it,
+    which includes blocks of all 0s, or if it reads the same value everywhere. One every stride of the other blocks is sampled too,
+    to catch bits that go in Hi-Z only at some addresses.
+
+    Args:
+        data (bytes): Data plane read with the data lines pulled low
+        data_width_bits (int): Number of data lines
+        stride (int): One every stride blocks is sampled
+        block_bits (int, optional): Blocks contain 1 << block_bits addresses. Defaults to HIZ_BLOCK_BITS.
+
+    Returns:
+        tuple[list[tuple[int, int]], list[tuple[int, int]]]: Ranges of the suspicious blocks and ranges of the sampled ones, with the end excluded
+    """
+    entry_width: int = -(data_width_bits // -8)
+    data_mask: int = (1 << data_width_bits) - 1
+    # The dump covers a power of two addresses, so it is always made of whole blocks
+    block_entries: int = min(1 << block_bits, len(data) // entry_width)
+    block_size: int = block_entries * entry_width
+    view: memoryview = memoryview(data)
+    suspicious: list[tuple[int, int]] = []
+    sampled: list[tuple[int, int]] = []
+
+    for block_idx, offset in enumerate(range(0, len(data), block_size)):
+        block: memoryview = view[offset:offset + block_size]
+        start: int = offset // entry_width
+
+        if _fold_entries(int.from_bytes(block), block_entries, entry_width * 8) & data_mask != data_mask or is_uniform(block.tobytes(), entry_width):
+            ranges = suspicious
+        elif block_idx % stride == 0:
+            ranges = sampled
+        else:
+            continue
+
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + block_entries)
+        else:
+            ranges.append((start, start + block_entries))
+
+    return (suspicious, sampled)
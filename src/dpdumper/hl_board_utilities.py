@@ -1,63 +1,157 @@
 """This module contains high level utility code to perform operations on the board"""
 
-from typing import Callable, Generator, List, final, NamedTuple
+from typing import Callable, Generator, Iterator, Sequence, final
+from contextlib import contextmanager
 import time
 import logging
+import functools
+import random
+from array import array
 
 import serial
 
-import dupicolib.utils as DPLibUtils
 from dupicolib.hardware_board_commands import HardwareBoardCommands
 from dpdumperlib.ic.ic_definition import ICDefinition
 
-from dpdumper.dumper_utilities import grouped_iterator
+from dpdumper.ic_dump import ICDump, xor_planes, pack_entries, or_planes, majority_planes, disagreement_plane
+from dpdumper.address_ranges import diff_ranges, intersect_ranges, merge_ranges, ranges_size, aligned_blocks
+from dpdumper.pin_write_pipeline import PinWritePipeline
+from dpdumper.pin_mapping import ICPinMaps
+from dpdumper.ic_probe import ProbeResult, is_uniform, mirror_dump, find_blank_ranges
+from dpdumper.hiz_sampling import HIZ_BLOCK_BITS, find_hiz_candidates
+from dpdumper.preflight import PreflightResult, analyze_samples
+import dpdumper.run_stats as RunStats
+import dpdumper.progress as Progress
 
 _LOGGER = logging.getLogger(__name__)
 
-# Taken from https://stackoverflow.com/questions/3173320/text-progress-bar-in-terminal-with-block-characters
-def _print_progressBar (iteration: int, total: int, prefix: str = '', suffix: str = '', decimals: int = 1, length: int = 50, fill: str = '█', printEnd: str = '\r'):
-    percent: str = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
-    filledLength: int = int(length * iteration // total)
-    bar: str = fill * filledLength + '-' * (length - filledLength)
-    print(f'\r{prefix} |{bar}| {percent}% {suffix}', end = printEnd)
-    # Print New Line on Complete
-    if iteration == total: 
-        print()
+# Number of addresses that are mapped to pins in one go
+_MAPPING_CHUNK: int = 4096
+
+# Seconds to wait after powering the IC, to allow it to settle
+_POWER_SETTLE_TIME: float = 0.5
 
 def _read_pin_map_generator(cmd_class: type[HardwareBoardCommands], ic: ICDefinition, check_hiz: bool = False) -> Generator[int, None, None]:
     addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses that this IC supports
+    maps: ICPinMaps = ICPinMaps.for_ic(cmd_class, ic)
 
-    hi_pins_mapped: int = cmd_class.map_value_to_pins(ic.adapter_hi_pins, 0xFFFFFFFFFFFFFFFF)
-    data_on_mapped: int = cmd_class.map_value_to_pins(ic.data, 0xFFFFFFFFFFFFFFFF) # Use this to detect if we have data pins in high impedance
-    act_h_mapped: int = cmd_class.map_value_to_pins(ic.act_h_enable, 0xFFFFFFFFFFFFFFFF)
-    wr_l_mapped: int = cmd_class.map_value_to_pins(ic.act_l_write, 0xFFFFFFFFFFFFFFFF) # Make sure that we do not try to write anything
-
-    for i in range(0, addr_combs):
-        address_mapped: int = cmd_class.map_value_to_pins(ic.address, i)
-
-        # We will write the following, in sequence, and check their outputs for differences
-        # If there are differences on the data pins, it means the IC has data outputs in high-impedance state
-        out_data_l: int = hi_pins_mapped | act_h_mapped | wr_l_mapped | address_mapped
+    # data_on_mapped is used to detect if we have data pins in high impedance, wr_l_mapped makes sure that we do not try to write anything
+    out_base_l: int = maps.hi_pins_mapped | maps.act_h_mapped | maps.wr_l_mapped
+    out_base_h: int = out_base_l | maps.data_on_mapped
 
-        yield out_data_l
+    for chunk_start in range(0, addr_combs, _MAPPING_CHUNK):
+        for address_mapped in maps.address.map_range(chunk_start, min(addr_combs, chunk_start + _MAPPING_CHUNK)):
+            # We will write the following, in sequence, and check their outputs for differences
+            # If there are differences on the data pins, it means the IC has data outputs in high-impedance state
+            yield out_base_l | address_mapped
 
-        if check_hiz:
-            out_data_h: int = hi_pins_mapped | data_on_mapped | act_h_mapped | wr_l_mapped | address_mapped
-            yield out_data_h
+            if check_hiz:
+                yield out_base_h | address_mapped
+
+def _write_pin_groups(maps: ICPinMaps, data: Sequence[int], ranges: list[tuple[int, int]]) -> Generator[tuple[int, int, int], None, None]:
+    # These are the pins that stay the same for every address, in the three steps of a write
+    write_setup: int = maps.hi_pins_mapped | maps.act_h_mapped | maps.wr_l_mapped
+    write_enable: int = maps.hi_pins_mapped | maps.act_h_mapped | maps.wr_h_mapped
+    write_done: int = maps.hi_pins_mapped | maps.act_l_mapped | maps.wr_l_mapped
+
+    to_write: int = ranges_size(ranges)
+    written: int = 0
+    reporter: Progress.ProgressReporter | None = Progress.current()
+
+    for start, end in ranges:
+        for chunk_start in range(start, end, _MAPPING_CHUNK):
+            chunk_end: int = min(end, chunk_start + _MAPPING_CHUNK)
+            addresses_mapped: list[int] = maps.address.map_range(chunk_start, chunk_end)
+            data_mapped: list[int] = maps.data.map_words(data[chunk_start:chunk_end])
+
+            for address_mapped, word_mapped in zip(addresses_mapped, data_mapped):
+                if reporter:
+                    reporter.post(written, to_write, 'entries')
+                written += 1
+
+                pins: int = address_mapped | word_mapped
+                yield (
+                    # Set data and address, but with writing disabled
+                    write_setup | pins,
+                    # Enable writing
+                    write_enable | pins,
+                    # Disable writing and deselect the IC before switching to the next address
+                    write_done | pins
+                )
+
+def _build_update_callback(max_size: int, offset: int = 0) -> Callable[[int], None] | None:
+    # The callback only posts the counter, the progress is drawn by the reporter on its own thread
+    if (reporter := Progress.current()) is None:
+        return None
 
-def _build_update_callback(max_size: int) -> Callable[[int], None]:
     def update_callback(cur_read: int) -> None:
-        if cur_read > max_size:
-            cur_read = max_size
-        _print_progressBar(cur_read, max_size)
+        reporter.post(min(cur_read + offset, max_size), max_size)
 
     return update_callback
 
 
-@final
-class DataElement(NamedTuple):
-    data: int
-    z_mask: int = 0
+def _pad_to_entries(data: bytes, data_width: int) -> bytes:
+    # Make sure the last entry is complete, in case the board returned a truncated one
+    if (rem := len(data) % data_width):
+        return bytes(data) + bytes(data_width - rem)
+    return bytes(data)
+
+@contextmanager
+def _powered_ic(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition) -> Iterator[None]:
+    # We use this to make sure we start in a safe mode, with IC deselected and write disabled
+    maps: ICPinMaps = ICPinMaps.for_ic(cmd_class, ic)
+
+    try:
+        with RunStats.phase('power_settle'):
+            # Set the pins to deselect the IC and disable writing
+            cmd_class.write_pins(maps.hi_pins_mapped | maps.wr_l_mapped | maps.act_l_mapped, ser)
+            cmd_class.set_power(True, ser)
+
+            # Give the IC some time to settle
+            time.sleep(_POWER_SETTLE_TIME)
+
+        yield
+    finally:
+        ser.reset_input_buffer()
+        ser.reset_output_buffer()
+        cmd_class.set_power(False, ser)
+        cmd_class.write_pins(0, ser)
+
+def _nonzero_runs(plane: bytes, data_width: int, base_address: int = 0) -> list[tuple[int, int, int]]:
+    # Finds the runs of entries with some bit set, and ORs together all the entries in every run, one byte lane at a time
+    runs: list[tuple[int, int, int]] = []
+
+    for start, end in diff_ranges(plane, bytes(len(plane)), data_width):
+        run: bytes = plane[start * data_width:end * data_width]
+        bits: int = 0
+        for lane in range(data_width):
+            lane_or: int = 0
+            for value in set(run[lane::data_width]):
+                lane_or |= value
+            bits |= lane_or << (8 * (data_width - 1 - lane))
+        runs.append((base_address + start, base_address + end, bits))
+
+    return runs
+
+def _pack_expected(data: Sequence[int], data_width_bits: int) -> bytes:
+    # Mapping the values onto the pins drops the bits beyond the data lines, so they must not count when comparing with what the IC reads back
+    data_width: int = -(data_width_bits // -8)
+    data_mask: int = (1 << data_width_bits) - 1
+
+    # Typed arrays and views cannot hold values wider than an entry, and are packed as a whole before masking
+    if not (isinstance(data, (array, memoryview)) and data.itemsize == data_width):
+        data = [word & data_mask for word in data]
+
+    plane: bytes = pack_entries(data, data_width)
+    if data_width_bits % 8:
+        plane = (int.from_bytes(plane) & int.from_bytes(data_mask.to_bytes(data_width) * len(data))).to_bytes(len(plane))
+
+    return plane
+
+def _read_hi_pins(ic: ICDefinition) -> list[int]:
+    # This is to be passed to the CXFER transfer:
+    # make sure we toggle the enable pins for the IC, and disable the active-low for writing (the other pins will all default to low)
+    return list(set(ic.act_h_enable + ic.act_l_write + ic.adapter_hi_pins))
 
 @final
 class HLBoardUtilities:
@@ -66,77 +160,539 @@ class HLBoardUtilities:
     """
 
     _MAX_CONSECUTIVE_COMMANDS: int = 8
+    STREAM_BLOCK_BITS: int = 14
+    _MIN_BLOCK_BITS: int = 4
+    _PROBE_BLOCK_BITS: int = 6
+    _PROBE_SAMPLES: int = 8
+    _PREFLIGHT_SAMPLES: int = 4
 
     @classmethod
-    def read_ic(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, check_hiz: bool = False) -> list[DataElement] | None:
-        read_data: list[DataElement] = []
+    def _preflight(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, hi_pins: list[int], mode: str) -> PreflightResult | None:
+        """Reads a few small blocks of addresses with the data lines pulled low and high, to find out early if the socket is empty,
+        the bus is floating, or the IC is blank, before spending time on the whole read
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to check, must be already powered
+            hi_pins (list[int]): Pins to keep high during the transfers
+            mode (str): 'check' to abort when the read is pointless, 'warn' to only report it, 'off' to skip the check
+
+        Raises:
+            IOError: If mode is 'check' and the bus is not driven by the IC
+
+        Returns:
+            PreflightResult | None: The state of the bus, None if the check was skipped
+        """
+        if mode == 'off':
+            return None
+
+        sample_bits: int = min(cls._PROBE_BLOCK_BITS, len(ic.address))
+        hi_pins_high: list[int] = list(set(hi_pins + ic.data))
+        # The first block is always sampled, the others are picked at random but always the same
+        rnd: random.Random = random.Random(0)
+        samples: list[tuple[int, bytes, bytes]] = []
+
+        with RunStats.phase('preflight'):
+            for sample_idx in range(cls._PREFLIGHT_SAMPLES):
+                base_address: int = rnd.randrange(1 << len(ic.address)) & ~((1 << sample_bits) - 1) if sample_idx else 0
+                samples.append((base_address,
+                                cls._read_block(ser, cmd_class, ic, hi_pins, base_address, sample_bits),
+                                cls._read_block(ser, cmd_class, ic, hi_pins_high, base_address, sample_bits)))
+
+        result: PreflightResult = analyze_samples(samples, len(ic.data))
+        _LOGGER.debug(f'Pre-flight check on {result.samples} entries: {result}')
+
+        if result.failed and mode == 'check':
+            raise IOError(f'Pre-flight check failed, {result.describe()}. The read was aborted')
+
+        if result.failed or result.value is not None or result.always_hiz_bits:
+            print(f'Warning: {result.describe()}.')
+
+        return result
+
+    @classmethod
+    def _read_z_plane_adaptive(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, hi_pins: list[int], data_plane: bytes, stride: int, upd_callback: Callable[[int], None] | None = None) -> bytes:
+        """Builds the Hi-Z plane reading again with the data lines pulled high only the blocks picked by find_hiz_candidates.
+        If a sampled block has bits in Hi-Z, or a suspicious block has bits in Hi-Z only at some of its addresses,
+        the guess is not reliable and the whole IC is read again.
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read, must be already powered
+            hi_pins (list[int]): Pins kept high during the first pass
+            data_plane (bytes): Data plane read with the data lines pulled low
+            stride (int): One every stride of the blocks that do not look suspicious is sampled
+            upd_callback (Callable[[int], None] | None, optional): Callback to track the full pass, if one is needed. Defaults to None.
+
+        Returns:
+            bytes: The Hi-Z plane
+        """
+        addr_combs: int = 1 << len(ic.address)
+        data_width: int = -(len(ic.data) // -8)
+        hi_pins_high: list[int] = list(set(hi_pins + ic.data))
+
+        suspicious, sampled = find_hiz_candidates(data_plane, len(ic.data), stride)
+        ranges: list[tuple[int, int]] = merge_ranges(suspicious + sampled)
+        print(f'Checking {ranges_size(ranges)} of {addr_combs} addresses for Hi-Z pins, {ranges_size(suspicious)} of them look suspicious.')
+
+        planes: list[bytes] = cls._read_ranges(ser, cmd_class, ic, hi_pins_high, ranges) if ranges else []
+
+        z_plane: bytearray = bytearray(len(data_plane))
+        with RunStats.phase('hiz_reconstruct'):
+            for (start, end), plane in zip(ranges, planes):
+                z_plane[start * data_width:end * data_width] = xor_planes(data_plane[start * data_width:end * data_width], plane)
+
+        block_size: int = min((1 << HIZ_BLOCK_BITS) * data_width, len(z_plane))
+        reliable: bool = (all(z_plane[start * data_width:end * data_width] == bytes((end - start) * data_width) for start, end in sampled) and
+                          all(is_uniform(bytes(z_plane[offset:offset + block_size]), data_width)
+                              for start, end in suspicious for offset in range(start * data_width, end * data_width, block_size)))
+
+        if reliable:
+            return bytes(z_plane)
+
+        print('Hi-Z bits were found outside the suspicious blocks, performing a second pass over the whole IC!')
+        with RunStats.phase('cxfer_read'):
+            data_invert: bytes | None = cmd_class.cxfer_read(ic.address, ic.data, hi_pins_high, upd_callback, ser)
+        RunStats.add_bytes('cxfer_read', len(data_invert) if data_invert else 0)
+
+        if not data_invert:
+            raise IOError('Unable to read data from IC')
+
+        with RunStats.phase('hiz_reconstruct'):
+            return xor_planes(data_plane, _pad_to_entries(data_invert, data_width)[:len(data_plane)])
+
+    @classmethod
+    def read_ic(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, check_hiz: bool = False, preflight: str = 'off', hiz_stride: int | None = None) -> ICDump | None:
         addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses
         data_width_bits: int = len(ic.data)
         data_width: int = -(data_width_bits // -8)
         dump_size: int = addr_combs * data_width
 
-        # We use this to make sure we start in a safe mode, with IC deselected and write disabled
-        hi_pins_mapped: int = cmd_class.map_value_to_pins(ic.adapter_hi_pins, 0xFFFFFFFFFFFFFFFF)        
-        act_l_mapped: int = cmd_class.map_value_to_pins(ic.act_l_enable, 0xFFFFFFFFFFFFFFFF)
-        wr_l_mapped: int = cmd_class.map_value_to_pins(ic.act_l_write, 0xFFFFFFFFFFFFFFFF)
-
-        # This is to be passed to the CXFER transfer:
-        # make sure we toggle the enable pins for the IC, and disable the active-low for writing (the other pins will all default to low)
-        hi_pins: list[int] = list(set(ic.act_h_enable + ic.act_l_write + ic.adapter_hi_pins))
+        hi_pins: list[int] = _read_hi_pins(ic)
 
         data_normal: bytes | None = None
         data_invert: bytes | None = None
+        z_plane: bytes | None = None
 
         upd_callback = _build_update_callback(dump_size)
 
-        _LOGGER.debug(f'read_ic command with definition {ic.name}, checking hi-z {check_hiz}. IC has {addr_combs} addresses and data width {len(ic.data)} bits.')
+        _LOGGER.debug(f'read_ic command with definition {ic.name}, checking hi-z {check_hiz}, Hi-Z stride {hiz_stride}. IC has {addr_combs} addresses and data width {len(ic.data)} bits.')
 
         print(f'IC has {addr_combs} addresses, data width of {data_width}B ({data_width_bits} bits), for a total size of ~{-(dump_size//-1024)}KB.')
-        if check_hiz:
+        if check_hiz and hiz_stride:
+            print(f'Hi-Z pins will be checked only on suspicious blocks and one block every {hiz_stride}.')
+        elif check_hiz:
             print('Read will be done in two passes to check for Hi-Z pins.')
 
-        try:
-            # Set the pins to deselect the IC and disable writing
-            cmd_class.write_pins(hi_pins_mapped | wr_l_mapped | act_l_mapped, ser)
-            cmd_class.set_power(True, ser)
-
-            # Give the IC some time to settle
-            time.sleep(0.5)
+        with _powered_ic(ser, cmd_class, ic):
+            cls._preflight(ser, cmd_class, ic, hi_pins, preflight)
 
-            data_normal = cmd_class.cxfer_read(ic.address, ic.data, hi_pins, upd_callback, ser)
+            with RunStats.phase('cxfer_read'):
+                data_normal = cmd_class.cxfer_read(ic.address, ic.data, hi_pins, upd_callback, ser)
+            RunStats.add_bytes('cxfer_read', len(data_normal) if data_normal else 0)
 
             if not data_normal:
                 raise IOError('Unable to read data from IC')
 
+            # Read again with the data pins pulled high only where Hi-Z bits might hide
+            if check_hiz and hiz_stride:
+                z_plane = cls._read_z_plane_adaptive(ser, cmd_class, ic, hi_pins, _pad_to_entries(data_normal, data_width)[:dump_size], hiz_stride, upd_callback)
             # If we need to check for Hi-Z, we need to forcefully set data pins to high and then redo the dump
-            if check_hiz:
+            elif check_hiz:
                 print('Performing a second pass to detect Hi-Z pins!')
                 hi_pins = list(set(hi_pins + ic.data))
-                data_invert = cmd_class.cxfer_read(ic.address, ic.data, hi_pins, upd_callback, ser)
-        finally:
-            ser.reset_input_buffer()
-            ser.reset_output_buffer()
-            cmd_class.set_power(False, ser)
-            cmd_class.write_pins(0, ser)
+                with RunStats.phase('cxfer_read'):
+                    data_invert = cmd_class.cxfer_read(ic.address, ic.data, hi_pins, upd_callback, ser)
+                RunStats.add_bytes('cxfer_read', len(data_invert) if data_invert else 0)
+
+        if not data_normal:
+            return None
 
-        # Reconstruct the data elements
-        if data_normal and data_invert:
+        # Reconstruct the data and Hi-Z planes
+        data_plane: bytes = _pad_to_entries(data_normal, data_width)[:dump_size]
+
+        if data_invert:
             if len(data_normal) != len(data_invert):
                 raise IOError('Same IC read twice, bug got two dumps of different length!!!')
 
-            for dn, di in zip(DPLibUtils.iter_grouper(data_normal, data_width, 0), DPLibUtils.iter_grouper(data_invert, data_width, 0)):
-                dni = int.from_bytes(bytes(dn))
-                dii = int.from_bytes(bytes(di))
-                read_data.append(DataElement(data=dni, z_mask=dni^dii))
-        else:
-            for dn in DPLibUtils.iter_grouper(data_normal, data_width, 0):
-                dni = int.from_bytes(bytes(dn))
-                read_data.append(DataElement(data=dni))
+            with RunStats.phase('hiz_reconstruct'):
+                invert_plane: bytes = _pad_to_entries(data_invert, data_width)[:dump_size]
+                z_plane = xor_planes(data_plane, invert_plane)
 
-        return read_data[:addr_combs]
+        return ICDump(data_plane, data_width_bits, z_plane)
 
     @staticmethod
-    def write_ic(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, data: list[int], begin_skip: int = 0, end_skip: int = 0) -> None:
+    def _read_block(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, hi_pins: list[int], base_address: int, block_bits: int, upd_callback: Callable[[int], None] | None = None) -> bytes:
+        """Reads a block of consecutive addresses with a single bulk transfer
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            hi_pins (list[int]): Pins to keep high during the transfer
+            base_address (int): First address of the block, must be aligned to the block size
+            block_bits (int): The block will contain 1 << block_bits addresses
+            upd_callback (Callable[[int], None] | None, optional): Callback to track the transfer. Defaults to None.
+
+        Returns:
+            bytes: Packed data read from the block, in big endian format
+        """
+        data_width: int = -(len(ic.data) // -8)
+        block_size: int = (1 << block_bits) * data_width
+
+        if base_address & ((1 << block_bits) - 1):
+            raise ValueError(f'Base address {base_address:X} is not aligned to a block of {1 << block_bits} addresses')
+
+        # The transfer walks only the lower address lines, the upper ones are held in place by forcing them high when needed
+        upper_pins: list[int] = [pin for idx, pin in enumerate(ic.address[block_bits:], block_bits) if (base_address >> idx) & 1]
+        with RunStats.phase('cxfer_read'):
+            data: bytes | None = cmd_class.cxfer_read(ic.address[:block_bits], ic.data, list(set(hi_pins + upper_pins)), upd_callback, ser)
+        RunStats.add_bytes('cxfer_read', len(data) if data else 0)
+
+        if not data:
+            raise IOError(f'Unable to read block at address {base_address:X} from IC')
+
+        return _pad_to_entries(data, data_width)[:block_size]
+
+    @classmethod
+    def _read_ranges(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, hi_pins: list[int], ranges: list[tuple[int, int]]) -> list[bytes]:
+        """Reads ranges of addresses, splitting them in aligned blocks that are read with bulk transfers
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            hi_pins (list[int]): Pins to keep high during the transfers
+            ranges (list[tuple[int, int]]): Ranges of addresses to read, with the end excluded
+
+        Returns:
+            list[bytes]: Packed data read for every range, in big endian format
+        """
+        data_width: int = -(len(ic.data) // -8)
+        range_blocks: list[list[tuple[int, int]]] = [aligned_blocks(start, end, len(ic.address), cls._MIN_BLOCK_BITS) for start, end in ranges]
+        read_size: int = sum((1 << bits) * data_width for blocks in range_blocks for _, bits in blocks)
+        progress_offset: int = 0
+        planes: list[bytes] = []
+
+        for (start, end), blocks in zip(ranges, range_blocks):
+            chunks: list[bytes] = []
+
+            for base_address, block_bits in blocks:
+                chunks.append(cls._read_block(ser, cmd_class, ic, hi_pins, base_address, block_bits, _build_update_callback(read_size, progress_offset)))
+                progress_offset += (1 << block_bits) * data_width
+
+            # Blocks might extend past the edges of the range, trim them
+            first_address: int = blocks[0][0]
+            planes.append(b''.join(chunks)[(start - first_address) * data_width:(end - first_address) * data_width])
+
+        return planes
+
+    @classmethod
+    def _verify_ranges(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, expected: bytes, ranges: list[tuple[int, int]]) -> list[tuple[int, int, int]]:
+        """Reads back ranges of addresses and compares them with the expected content
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            expected (bytes): Expected content for the whole address space, packed in big endian format and masked to the data lines
+            ranges (list[tuple[int, int]]): Ranges of addresses to verify, with the end excluded
+
+        Returns:
+            list[tuple[int, int, int]]: List of (start, end, mask of mismatching bits) for every run of addresses that do not match
+        """
+        data_width: int = -(len(ic.data) // -8)
+        entry_mask: bytes = ((1 << len(ic.data)) - 1).to_bytes(data_width)
+        mismatches: list[tuple[int, int, int]] = []
+
+        for (start, end), plane in zip(ranges, cls._read_ranges(ser, cmd_class, ic, _read_hi_pins(ic), ranges)):
+            expected_plane: bytes = expected[start * data_width:end * data_width]
+            # Only the data lines are compared, so padding bits can never cause a mismatch and a retry
+            diff: int = int.from_bytes(xor_planes(plane, expected_plane)) & int.from_bytes(entry_mask * (end - start))
+            mismatches.extend(_nonzero_runs(diff.to_bytes(len(plane)), data_width, start))
+
+        return mismatches
+
+    @classmethod
+    def read_ic_consensus(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, passes: int, check_hiz: bool = False, preflight: str = 'off') -> tuple[ICDump, list[tuple[int, int, int]]]:
+        """Reads the IC several times in the same powered session, and votes every bit across the passes.
+        Addresses that did not read the same in every pass are read again as many times, and voted on all the samples.
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            passes (int): Number of times the IC is read
+            check_hiz (bool, optional): True if every pass must also detect Hi-Z pins. Defaults to False.
+            preflight (str, optional): 'check' or 'warn' to sample the bus before the read, aborting or warning if it is not driven by the IC. Defaults to 'off'.
+
+        Returns:
+            tuple[ICDump, list[tuple[int, int, int]]]: The voted dump, and a list of (start, end, mask of unstable bits) for every run of addresses that did not read consistently
+        """
+        addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses
+        data_width_bits: int = len(ic.data)
+        data_width: int = -(data_width_bits // -8)
+        dump_size: int = addr_combs * data_width
+        pass_size: int = dump_size * (2 if check_hiz else 1)
+
+        # Every kind of read (normal, and with the data pins pulled high to detect Hi-Z) is voted on its own
+        hi_pins_list: list[list[int]] = [_read_hi_pins(ic)]
+        if check_hiz:
+            hi_pins_list.append(list(set(hi_pins_list[0] + ic.data)))
+
+        samples: list[list[bytes]] = [[] for _ in hi_pins_list]
+
+        _LOGGER.debug(f'read_ic_consensus command with definition {ic.name}, {passes} passes, checking hi-z {check_hiz}.')
+
+        print(f'IC has {addr_combs} addresses, data width of {data_width}B ({data_width_bits} bits), for a total size of ~{-(dump_size//-1024)}KB.')
+        print(f'The IC will be read {passes} times{", twice per pass to check for Hi-Z pins" if check_hiz else ""}.')
+
+        with _powered_ic(ser, cmd_class, ic):
+            cls._preflight(ser, cmd_class, ic, hi_pins_list[0], preflight)
+
+            for pass_idx in range(passes):
+                for kind, hi_pins in enumerate(hi_pins_list):
+                    upd_callback = _build_update_callback(pass_size * passes, pass_idx * pass_size + kind * dump_size)
+                    samples[kind].append(cls._read_block(ser, cmd_class, ic, hi_pins, 0, len(ic.address), upd_callback))
+
+            voted: list[bytearray] = [bytearray(majority_planes(kind_samples)) for kind_samples in samples]
+            unstable: bytearray = bytearray(functools.reduce(or_planes, (disagreement_plane(kind_samples) for kind_samples in samples)))
+            ranges: list[tuple[int, int]] = diff_ranges(bytes(unstable), bytes(dump_size), data_width)
+
+            if ranges:
+                print(f'{ranges_size(ranges)} addresses in {len(ranges)} runs did not read the same in every pass, reading them {passes} more times.')
+
+                for kind, hi_pins in enumerate(hi_pins_list):
+                    rereads: list[list[bytes]] = [cls._read_ranges(ser, cmd_class, ic, hi_pins, ranges) for _ in range(passes)]
+
+                    for range_idx, (start, end) in enumerate(ranges):
+                        range_samples: list[bytes] = [sample[start * data_width:end * data_width] for sample in samples[kind]] + [reread[range_idx] for reread in rereads]
+                        voted[kind][start * data_width:end * data_width] = majority_planes(range_samples)
+
+                        # The bits that flipped are unstable, even if they agreed on the second round
+                        unstable[start * data_width:end * data_width] = or_planes(disagreement_plane(range_samples), bytes(unstable[start * data_width:end * data_width]))
+
+        z_plane: bytes | None = xor_planes(bytes(voted[0]), bytes(voted[1])) if check_hiz else None
+
+        return (ICDump(bytes(voted[0]), data_width_bits, z_plane), _nonzero_runs(bytes(unstable), data_width))
+
+    @classmethod
+    def _probe_decoded_bits(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, hi_pins: list[int]) -> int:
+        """Finds how many of the lower address lines are actually decoded by the IC.
+        Starting from the top, an address line is considered ignored (undriven or mirroring the lower half) if toggling it
+        never changes the content of some small sample blocks. Samples that are all the same value prove nothing, as they
+        could come from blank regions, so at least one of them must contain actual data.
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to probe, must be already powered
+            hi_pins (list[int]): Pins to keep high during the transfers
+
+        Returns:
+            int: Number of decoded address lines
+        """
+        data_width: int = -(len(ic.data) // -8)
+        sample_bits: int = min(cls._PROBE_BLOCK_BITS, len(ic.address))
+        # Always sample the same addresses, so the probe gives the same result every time
+        rnd: random.Random = random.Random(0)
+        decoded_bits: int = len(ic.address)
+
+        for line in reversed(range(sample_bits, len(ic.address))):
+            # The lines above this one are already known to be ignored, so samples are taken below it
+            mirrored: bool = True
+            informative: bool = False
+
+            for _ in range(cls._PROBE_SAMPLES):
+                base_address: int = rnd.randrange(1 << line) & ~((1 << sample_bits) - 1)
+                low_sample: bytes = cls._read_block(ser, cmd_class, ic, hi_pins, base_address, sample_bits)
+                high_sample: bytes = cls._read_block(ser, cmd_class, ic, hi_pins, base_address | (1 << line), sample_bits)
+
+                if low_sample != high_sample:
+                    mirrored = False
+                    break
+
+                informative = informative or not is_uniform(low_sample, data_width)
+
+            if not (mirrored and informative):
+                break
+
+            _LOGGER.debug(f'Address line A{line} does not change the output of the IC')
+            decoded_bits = line
+
+        return decoded_bits
+
+    @classmethod
+    def read_ic_probed(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, check_hiz: bool = False, preflight: str = 'off') -> tuple[ICDump, ProbeResult]:
+        """Probes the IC to find the upper address lines that it ignores, reads only the region that is actually decoded
+        and rebuilds the rest of the address space by mirroring it. Blank regions of the result are identified too.
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            check_hiz (bool, optional): True if the read must be done twice to detect Hi-Z pins. Defaults to False.
+            preflight (str, optional): 'check' or 'warn' to sample the bus before the read, aborting or warning if it is not driven by the IC. Defaults to 'off'.
+
+        Returns:
+            tuple[ICDump, ProbeResult]: The dump of the whole address space, and the results of the probe
+        """
+        addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses
+        data_width_bits: int = len(ic.data)
+        data_width: int = -(data_width_bits // -8)
+
+        hi_pins: list[int] = _read_hi_pins(ic)
+        z_plane: bytes | None = None
+
+        _LOGGER.debug(f'read_ic_probed command with definition {ic.name}, checking hi-z {check_hiz}.')
+
+        print(f'IC has {addr_combs} addresses, data width of {data_width}B ({data_width_bits} bits), for a total size of ~{-((addr_combs * data_width)//-1024)}KB.')
+
+        with _powered_ic(ser, cmd_class, ic):
+            cls._preflight(ser, cmd_class, ic, hi_pins, preflight)
+
+            print('Probing the address lines...')
+            decoded_bits: int = cls._probe_decoded_bits(ser, cmd_class, ic, hi_pins)
+            decoded_size: int = (1 << decoded_bits) * data_width
+
+            if decoded_bits < len(ic.address):
+                print(f'Address lines A{decoded_bits} and above do not change the output, reading only the first {1 << decoded_bits} addresses.')
+
+            read_size: int = decoded_size * (2 if check_hiz else 1)
+            data_normal: bytes = cls._read_block(ser, cmd_class, ic, hi_pins, 0, decoded_bits, _build_update_callback(read_size))
+
+            if check_hiz:
+                data_invert: bytes = cls._read_block(ser, cmd_class, ic, list(set(hi_pins + ic.data)), 0, decoded_bits, _build_update_callback(read_size, decoded_size))
+                z_plane = xor_planes(data_normal, data_invert)
+
+        dump: ICDump = mirror_dump(ICDump(data_normal, data_width_bits, z_plane), 1 << (len(ic.address) - decoded_bits))
+
+        return (dump, ProbeResult(len(ic.address), decoded_bits, find_blank_ranges(dump)))
+
+    @classmethod
+    def read_ic_ranges(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, ranges: list[tuple[int, int]], check_hiz: bool = False, preflight: str = 'off') -> list[tuple[int, ICDump]]:
+        """Reads only some ranges of addresses from the IC. Every range is split in aligned blocks, read with bulk transfers
+        that hold the upper address lines in place, so no support for offsets is required from the firmware.
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            ranges (list[tuple[int, int]]): Ranges of addresses to read, with the end excluded
+            check_hiz (bool, optional): True if the ranges must be read twice to detect Hi-Z pins. Defaults to False.
+            preflight (str, optional): 'check' or 'warn' to sample the bus before the read, aborting or warning if it is not driven by the IC. Defaults to 'off'.
+
+        Returns:
+            list[tuple[int, ICDump]]: Tuples of first address and data for every range, sorted and without overlaps
+        """
+        addr_combs: int = 1 << len(ic.address)
+
+        if any(end > addr_combs for _, end in ranges):
+            raise ValueError(f'Requested ranges {ranges} go past the {addr_combs} addresses supported by the IC')
+
+        ranges = intersect_ranges(merge_ranges(ranges), [(0, addr_combs)])
+        if not ranges:
+            raise ValueError('Requested ranges do not contain any address to read')
+
+        data_width_bits: int = len(ic.data)
+        hi_pins: list[int] = _read_hi_pins(ic)
+        planes_invert: list[bytes] | None = None
+
+        _LOGGER.debug(f'read_ic_ranges command with definition {ic.name}, checking hi-z {check_hiz}, ranges {ranges}.')
+
+        print(f'Reading {ranges_size(ranges)} of {addr_combs} addresses, in {len(ranges)} ranges.')
+        if check_hiz:
+            print('Read will be done in two passes to check for Hi-Z pins.')
+
+        with _powered_ic(ser, cmd_class, ic):
+            cls._preflight(ser, cmd_class, ic, hi_pins, preflight)
+
+            planes_normal: list[bytes] = cls._read_ranges(ser, cmd_class, ic, hi_pins, ranges)
+
+            if check_hiz:
+                print('Performing a second pass to detect Hi-Z pins!')
+                planes_invert = cls._read_ranges(ser, cmd_class, ic, list(set(hi_pins + ic.data)), ranges)
+
+        dumps: list[tuple[int, ICDump]] = []
+        for idx, (start, _) in enumerate(ranges):
+            z_plane: bytes | None = xor_planes(planes_normal[idx], planes_invert[idx]) if planes_invert is not None else None
+            dumps.append((start, ICDump(planes_normal[idx], data_width_bits, z_plane)))
+
+        return dumps
+
+    @classmethod
+    def read_ic_blocks(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, check_hiz: bool = False, block_bits: int = STREAM_BLOCK_BITS, block_addresses: list[int] | None = None, preflight: str = 'off') -> Generator[tuple[int, ICDump], None, None]:
+        """Reads the IC one block of addresses at a time, and yields every block as soon as it is complete
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to read
+            check_hiz (bool, optional): True if every block must be read twice to detect Hi-Z pins. Defaults to False.
+            block_bits (int, optional): Every block will contain 1 << block_bits addresses. Defaults to STREAM_BLOCK_BITS.
+            block_addresses (list[int] | None, optional): Base addresses of the blocks to read, in order. Defaults to None, to read the whole IC.
+            preflight (str, optional): 'check' or 'warn' to sample the bus before the read, aborting or warning if it is not driven by the IC. Defaults to 'off'.
+
+        Yields:
+            tuple[int, ICDump]: Tuple containing the first address of the block and its data
+        """
+        addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses
+        data_width_bits: int = len(ic.data)
+        data_width: int = -(data_width_bits // -8)
+        dump_size: int = addr_combs * data_width
+        block_bits = min(block_bits, len(ic.address))
+        block_size: int = (1 << block_bits) * data_width
+        passes: int = 2 if check_hiz else 1
+
+        if block_addresses is None:
+            block_addresses = list(range(0, addr_combs, 1 << block_bits))
+
+        read_size: int = len(block_addresses) * block_size * passes
+
+        hi_pins: list[int] = _read_hi_pins(ic)
+        hi_pins_invert: list[int] = list(set(hi_pins + ic.data))
+
+        _LOGGER.debug(f'read_ic_blocks command with definition {ic.name}, checking hi-z {check_hiz}, blocks of {1 << block_bits} addresses.')
+
+        print(f'IC has {addr_combs} addresses, data width of {data_width}B ({data_width_bits} bits), for a total size of ~{-(dump_size//-1024)}KB.')
+        if check_hiz:
+            print('Every block will be read twice to check for Hi-Z pins.')
+
+        with _powered_ic(ser, cmd_class, ic):
+            cls._preflight(ser, cmd_class, ic, hi_pins, preflight)
+
+            for block_idx, base_address in enumerate(block_addresses):
+                progress_offset: int = block_idx * block_size * passes
+                data_normal: bytes = cls._read_block(ser, cmd_class, ic, hi_pins, base_address, block_bits, _build_update_callback(read_size, progress_offset))
+                z_plane: bytes | None = None
+
+                if check_hiz:
+                    data_invert: bytes = cls._read_block(ser, cmd_class, ic, hi_pins_invert, base_address, block_bits, _build_update_callback(read_size, progress_offset + block_size))
+                    with RunStats.phase('hiz_reconstruct'):
+                        z_plane = xor_planes(data_normal, data_invert)
+
+                yield (base_address, ICDump(data_normal, data_width_bits, z_plane))
+
+    @classmethod
+    def write_ic(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, data: Sequence[int], ranges: list[tuple[int, int]] | None = None, pipelined: bool = True, diff: bool = False, verify: bool = False, verify_retries: int = 0) -> list[tuple[int, int, int]] | None:
+        """Writes data into the IC
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC to write
+            data (Sequence[int]): Content for the whole address space of the IC, e.g. the entries of a WriteInput
+            ranges (list[tuple[int, int]] | None, optional): Ranges of addresses to write, with the end excluded. Defaults to None, to write the whole IC.
+            pipelined (bool, optional): False to wait for the response to every command before sending the next. Defaults to True.
+            diff (bool, optional): True to read the IC first, and write only the entries that differ. Defaults to False.
+            verify (bool, optional): True to read back the written ranges and compare them with the data. Defaults to False.
+            verify_retries (int, optional): Number of times the addresses that fail verification are written again. Defaults to 0.
+
+        Returns:
+            list[tuple[int, int, int]] | None: If verifying, list of (start, end, mask of mismatching bits) for every run of addresses that do not match
+        """
         data_width: int = -(len(ic.data) // -8)
         addr_combs: int = 1 << len(ic.address) # Calculate the number of addresses that this IC supports
         _LOGGER.debug(f'write_ic command with definition {ic.name}, IC has {addr_combs} addresses and data width {data_width} bits.')
@@ -145,53 +701,65 @@ class HLBoardUtilities:
         if (d_len := len(data)) != addr_combs:
             raise ValueError(f'IC definition supports {addr_combs} addresses, but input array has {d_len}')
 
-        if addr_combs - (begin_skip + end_skip) <= 0:
-            raise ValueError(f'Skipping {begin_skip} entries at the beginning and {end_skip} entries at the end results in a 0 or negative number of addresses')
+        if ranges is None:
+            ranges = [(0, addr_combs)]
 
-        # Write only up to the address obtained by skipping the selected ones
-        addr_combs = addr_combs - end_skip
+        if any(end > addr_combs for _, end in ranges):
+            raise ValueError(f'Requested ranges {ranges} go past the {addr_combs} addresses supported by the IC')
 
-        hi_pins_mapped: int = cmd_class.map_value_to_pins(ic.adapter_hi_pins, 0xFFFFFFFFFFFFFFFF)
+        ranges = intersect_ranges(ranges, [(0, addr_combs)])
+        if not ranges:
+            raise ValueError('Requested ranges do not contain any address to write')
 
-        act_h_mapped: int = cmd_class.map_value_to_pins(ic.act_h_enable, 0xFFFFFFFFFFFFFFFF)
-        
-        act_l_mapped: int = cmd_class.map_value_to_pins(ic.act_l_enable, 0xFFFFFFFFFFFFFFFF)
+        maps: ICPinMaps = ICPinMaps.for_ic(cmd_class, ic)
+        expected: bytes = _pack_expected(data, len(ic.data)) if (diff or verify) else b''
+        mismatches: list[tuple[int, int, int]] | None = None
 
-        # These are to disable writing
-        wr_l_mapped: int = cmd_class.map_value_to_pins(ic.act_l_write, 0xFFFFFFFFFFFFFFFF)
+        _LOGGER.debug(f'This IC requires the following pin mask forced high: {maps.hi_pins_mapped:0{16}X}')
 
-        # These are to enable writing
-        wr_h_mapped: int = cmd_class.map_value_to_pins(ic.act_h_write, 0xFFFFFFFFFFFFFFFF)
+        with _powered_ic(ser, cmd_class, ic):
+            if diff:
+                print('Reading the current content of the IC, to find the entries that changed.')
+                current: bytes = cls._read_block(ser, cmd_class, ic, _read_hi_pins(ic), 0, len(ic.address), _build_update_callback(addr_combs * data_width))
+                changed_ranges: list[tuple[int, int]] = intersect_ranges(ranges, diff_ranges(current, expected, data_width))
 
-        _LOGGER.debug(f'This IC requires the following pin mask forced high: {hi_pins_mapped:0{16}X}')
+                print(f'{ranges_size(changed_ranges)} entries in {len(changed_ranges)} runs differ from the content of the IC.')
+                ranges = changed_ranges
 
-        try:
-            # Start with the pins that must be forced high, so the IC is deselected
-            cmd_class.write_pins(hi_pins_mapped | wr_l_mapped | act_l_mapped, ser)
-            cmd_class.set_power(True, ser)
+            if ranges:
+                cls._write_ranges(ser, cmd_class, maps, data, ranges, pipelined)
 
-            # Give the IC some time to settle
-            time.sleep(0.5)
-
-            for i in range(begin_skip, addr_combs):
-                if i % 250 == 0:
-                    _print_progressBar(i, addr_combs)
-                
-                address_mapped: int = cmd_class.map_value_to_pins(ic.address, i)
-                data_mapped: int = cmd_class.map_value_to_pins(ic.data, data[i])
-
-                # Set data and address, but with writing disabled
-                cmd_class.write_pins(hi_pins_mapped | address_mapped | data_mapped | act_h_mapped | wr_l_mapped, ser)
-                # Enable writing
-                cmd_class.write_pins(hi_pins_mapped | address_mapped | data_mapped | act_h_mapped | wr_h_mapped, ser)
-                # Disable writing and deselect the IC before switching to the next address
-                cmd_class.write_pins(hi_pins_mapped | address_mapped | data_mapped | act_l_mapped | wr_l_mapped, ser)
-            
-            _print_progressBar(addr_combs, addr_combs)
-        finally:
-            print('')
-            cmd_class.set_power(False, ser)
-            cmd_class.write_pins(0, ser)
+            if verify:
+                print('Reading back the written entries to verify them.')
+                mismatches = cls._verify_ranges(ser, cmd_class, ic, expected, ranges) if ranges else []
+
+                for attempt in range(verify_retries):
+                    if not mismatches:
+                        break
+
+                    failed_ranges: list[tuple[int, int]] = [(start, end) for start, end, _ in mismatches]
+                    print(f'Verification failed for {ranges_size(failed_ranges)} entries, writing them again (attempt {attempt + 1} of {verify_retries}).')
+                    cls._write_ranges(ser, cmd_class, maps, data, failed_ranges, pipelined)
+                    mismatches = cls._verify_ranges(ser, cmd_class, ic, expected, failed_ranges)
 
+        return mismatches
+
+    @classmethod
+    def _write_ranges(cls, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], maps: ICPinMaps, data: Sequence[int], ranges: list[tuple[int, int]], pipelined: bool) -> None:
+        to_write: int = ranges_size(ranges)
 
-                
+        try:
+            pipeline: PinWritePipeline = PinWritePipeline(ser, cmd_class, cls._MAX_CONSECUTIVE_COMMANDS, pipelined)
+            with RunStats.phase('pin_write'):
+                pipeline.write_groups(_write_pin_groups(maps, data, ranges))
+            _LOGGER.debug(f'Sent {pipeline.commands} commands in {pipeline.round_trips} round trips, pipelined {pipeline.pipelined}')
+
+            RunStats.count('entries_written', to_write)
+            RunStats.count('commands', pipeline.commands)
+            RunStats.count('round_trips', pipeline.round_trips)
+
+            if reporter := Progress.current():
+                reporter.post(to_write, to_write, 'entries')
+        finally:
+            # Close the bar if the write was interrupted
+            Progress.end()
@@ -0,0 +1,253 @@
+"""This module contains the compact representation of data read from an IC"""
+
+from typing import Generator, Sequence, final
+from array import array
+import sys
+
+
+def xor_planes(plane_a: bytes, plane_b: bytes) -> bytes:
+    """XORs two planes of the same size in a single operation
+
+    Args:
+        plane_a (bytes): First plane
+        plane_b (bytes): Second plane
+
+    Returns:
+        bytes: Plane containing the XOR of the two inputs
+    """
+    if len(plane_a) != len(plane_b):
+        raise ValueError(f'Cannot combine planes of size {len(plane_a)} and {len(plane_b)}')
+
+    # Big integers work as arbitrarily sized bit vectors, and are much faster than going byte by byte
+    return (int.from_bytes(plane_a) ^ int.from_bytes(plane_b)).to_bytes(len(plane_a))
+
+def or_planes(plane_a: bytes, plane_b: bytes) -> bytes:
+    """ORs two planes of the same size in a single operation
+
+    Args:
+        plane_a (bytes): First plane
+        plane_b (bytes): Second plane
+
+    Returns:
+        bytes: Plane containing the OR of the two inputs
+    """
+    if len(plane_a) != len(plane_b):
+        raise ValueError(f'Cannot combine planes of size {len(plane_a)} and {len(plane_b)}')
+
+    return (int.from_bytes(plane_a) | int.from_bytes(plane_b)).to_bytes(len(plane_a))
+
+def majority_planes(planes: Sequence[bytes]) -> bytes:
+    """Votes every bit across several planes of the same size, a bit is set if it was set in more than half of them
+
+    Args:
+        planes (Sequence[bytes]): Planes to vote on
+
+    Returns:
+        bytes: Plane containing the result of the vote
+    """
+    size: int = len(planes[0])
+    if any(len(plane) != size for plane in planes):
+        raise ValueError('Cannot vote on planes of different sizes')
+
+    if len(planes) == 1:
+        return planes[0]
+
+    # Bit-sliced counter: counter[k] holds bit k of the number of planes that have every bit set
+    counter: list[int] = []
+    for plane in planes:
+        carry: int = int.from_bytes(plane)
+        for k in range(len(counter)):
+            counter[k], carry = counter[k] ^ carry, counter[k] & carry
+            if not carry:
+                break
+        if carry:
+            counter.append(carry)
+
+    # Compare every count with the threshold, starting from the most significant bit
+    threshold: int = len(planes) // 2 + 1
+    greater: int = 0
+    equal: int = (1 << (size * 8)) - 1
+    for k in reversed(range(max(len(counter), threshold.bit_length()))):
+        count_bit: int = counter[k] if k < len(counter) else 0
+        if (threshold >> k) & 1:
+            equal &= count_bit
+        else:
+            greater |= equal & count_bit
+            equal &= ~count_bit
+
+    return (greater | equal).to_bytes(size)
+
+def disagreement_plane(planes: Sequence[bytes]) -> bytes:
+    """Finds the bits that do not have the same value in all the planes
+
+    Args:
+        planes (Sequence[bytes]): Planes to compare
+
+    Returns:
+        bytes: Plane with the bits that differ in at least one plane set
+    """
+    size: int = len(planes[0])
+    if any(len(plane) != size for plane in planes):
+        raise ValueError('Cannot compare planes of different sizes')
+
+    reference: int = int.from_bytes(planes[0])
+    differing: int = 0
+    for plane in planes[1:]:
+        differing |= reference ^ int.from_bytes(plane)
+
+    return differing.to_bytes(size)
+
+def swap_entries_byte_order(plane: bytes, entry_width: int) -> bytes:
+    """Reverses the byte order of every entry in a plane
+
+    Args:
+        plane (bytes): Plane to convert
+        entry_width (int): Size in bytes of every entry
+
+    Returns:
+        bytes: Plane with the byte order of every entry reversed
+    """
+    if entry_width <= 1:
+        return plane
+
+    swapped: bytearray = bytearray(len(plane))
+    # Move one byte lane at a time with extended slices, instead of going entry by entry
+    for lane in range(entry_width):
+        swapped[lane::entry_width] = plane[entry_width - 1 - lane::entry_width]
+
+    return bytes(swapped)
+
+
+def pack_entries(words: Sequence[int], entry_width: int) -> bytes:
+    """Packs a sequence of values into a plane of big endian entries
+
+    Args:
+        words (Sequence[int]): Values to pack
+        entry_width (int): Size in bytes of every entry
+
+    Returns:
+        bytes: The packed plane
+    """
+    if entry_width == 1:
+        return bytes(words)
+
+    typecode: str | None = next((code for code in ('H', 'I', 'L', 'Q') if array(code).itemsize == entry_width), None)
+    if typecode is None:
+        return b''.join(word.to_bytes(entry_width) for word in words)
+
+    packed: array = array(typecode)
+    # Typed arrays and views already hold the entries in the host byte order, and are copied as a whole
+    if isinstance(words, (array, memoryview)) and words.itemsize == entry_width:
+        packed.frombytes(memoryview(words).cast('B'))
+    else:
+        packed.extend(words)
+
+    if sys.byteorder == 'little':
+        packed.byteswap()
+
+    return packed.tobytes()
+
+@final
+class ICDump:
+    """
+    This class holds the result of an IC read in compact form.
+
+    Data and Hi-Z mask are kept in two separate planes, each one a contiguous buffer
+    where every entry takes the minimum number of bytes required by the data width,
+    stored in big endian order and in addressing order.
+    If the Hi-Z state was not checked, the Hi-Z plane is not allocated at all.
+    """
+
+    __slots__ = ('data', 'z_mask', 'data_width_bits', 'entry_width')
+
+    data: bytes
+    z_mask: bytes | None
+    data_width_bits: int
+    entry_width: int
+
+    def __init__(self, data: bytes, data_width_bits: int, z_mask: bytes | None = None) -> None:
+        # Use upside-down floor division: https://stackoverflow.com/questions/14822184/is-there-a-ceiling-equivalent-of-operator-in-python
+        entry_width: int = -(data_width_bits // -8)
+
+        if len(data) % entry_width:
+            raise ValueError(f'Data plane of {len(data)} bytes is not a multiple of the entry width {entry_width}')
+
+        if z_mask is not None and len(z_mask) != len(data):
+            raise ValueError(f'Hi-Z plane has size {len(z_mask)}, but data plane has size {len(data)}')
+
+        self.data = data
+        self.z_mask = z_mask
+        self.data_width_bits = data_width_bits
+        self.entry_width = entry_width
+
+    def __len__(self) -> int:
+        return len(self.data) // self.entry_width
+
+    @property
+    def has_hiz(self) -> bool:
+        """True if this dump carries a Hi-Z plane"""
+        return self.z_mask is not None
+
+    @property
+    def z_plane(self) -> bytes:
+        """Hi-Z plane of the dump, all zeroes if the Hi-Z state was not checked"""
+        return self.z_mask if self.z_mask is not None else bytes(len(self.data))
+
+    def entry(self, index: int) -> tuple[int, int]:
+        """Returns a single entry of the dump
+
+        Args:
+            index (int): Index (address) of the entry
+
+        Returns:
+            tuple[int, int]: Tuple containing data and Hi-Z mask for the entry
+        """
+        start: int = index * self.entry_width
+        end: int = start + self.entry_width
+
+        data: int = int.from_bytes(self.data[start:end])
+        z_mask: int = int.from_bytes(self.z_mask[start:end]) if self.z_mask is not None else 0
+
+        return (data, z_mask)
+
+    def entries(self) -> Generator[tuple[int, int], None, None]:
+        """Iterates over the entries of the dump, in addressing order, without storing them
+
+        Yields:
+            tuple[int, int]: Tuple containing data and Hi-Z mask for every entry
+        """
+        width: int = self.entry_width
+        data_view: memoryview = memoryview(self.data)
+
+        if self.z_mask is None:
+            for start in range(0, len(data_view), width):
+                yield (int.from_bytes(data_view[start:start + width]), 0)
+        else:
+            z_view: memoryview = memoryview(self.z_mask)
+            for start in range(0, len(data_view), width):
+                yield (int.from_bytes(data_view[start:start + width]), int.from_bytes(z_view[start:start + width]))
+
+def fill_gaps(blocks: Sequence[tuple[int, ICDump]], entries: int, data_width_bits: int, fill: int) -> ICDump:
+    """Builds a dump of a whole address space out of dumps of some ranges of it, filling the addresses in between
+
+    Args:
+        blocks (Sequence[tuple[int, ICDump]]): Tuples of first address and data for every range, without overlaps
+        entries (int): Number of addresses in the whole space
+        data_width_bits (int): Width of the data, in bits
+        fill (int): Value of the addresses outside the ranges, their Hi-Z mask is always clear
+
+    Returns:
+        ICDump: Dump of the whole address space, with a Hi-Z plane only if the ranges carry one
+    """
+    entry_width: int = -(data_width_bits // -8)
+    data: bytearray = bytearray((fill & ((1 << data_width_bits) - 1)).to_bytes(entry_width) * entries)
+    has_hiz: bool = any(dump.has_hiz for _, dump in blocks)
+    z_mask: bytearray | None = bytearray(entries * entry_width) if has_hiz else None
+
+    for start, dump in blocks:
+        offset: int = start * entry_width
+        data[offset:offset + len(dump.data)] = dump.data
+        if z_mask is not None:
+            z_mask[offset:offset + len(dump.data)] = dump.z_plane
+
+    return ICDump(bytes(data), data_width_bits, bytes(z_mask) if z_mask is not None else None)
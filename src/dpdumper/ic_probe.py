@@ -0,0 +1,84 @@
+"""This module contains the results of probing an IC, and the analysis done on its dump"""
+
+from typing import NamedTuple, final
+
+from dpdumper.ic_dump import ICDump, or_planes
+
+# Blank regions are reported with a granularity of 1 << BLANK_BLOCK_BITS addresses
+BLANK_BLOCK_BITS: int = 8
+
+@final
+class ProbeResult(NamedTuple):
+    address_bits: int
+    decoded_bits: int
+    blank_ranges: list[tuple[int, int]]
+
+    @property
+    def mirrors(self) -> int:
+        """Number of times the decoded region is repeated in the address space"""
+        return 1 << (self.address_bits - self.decoded_bits)
+
+    def to_dict(self) -> dict:
+        """Returns the result in a form that can be serialized to JSON"""
+        return {
+            'address_bits': self.address_bits,
+            'decoded_bits': self.decoded_bits,
+            'mirrors': self.mirrors,
+            'blank_ranges': [list(blank_range) for blank_range in self.blank_ranges]
+        }
+
+def is_uniform(plane: bytes, entry_width: int) -> bool:
+    """Checks if all the entries in a plane have the same value
+
+    Args:
+        plane (bytes): Plane to check
+        entry_width (int): Size in bytes of every entry
+
+    Returns:
+        bool: True if all the entries are equal
+    """
+    return plane == plane[:entry_width] * (len(plane) // entry_width)
+
+def mirror_dump(dump: ICDump, repeats: int) -> ICDump:
+    """Builds the dump of the whole address space, from the dump of a region that is mirrored over it
+
+    Args:
+        dump (ICDump): Dump of the decoded region
+        repeats (int): Number of times the region is repeated
+
+    Returns:
+        ICDump: Dump of the whole address space
+    """
+    return ICDump(dump.data * repeats, dump.data_width_bits, dump.z_mask * repeats if dump.z_mask is not None else None)
+
+def find_blank_ranges(dump: ICDump, block_bits: int = BLANK_BLOCK_BITS) -> list[tuple[int, int]]:
+    """Finds the blocks of addresses where every bit is either set or in Hi-Z, like in an erased EPROM
+
+    Args:
+        dump (ICDump): Dump to analyze
+        block_bits (int, optional): Blocks contain 1 << block_bits addresses. Defaults to BLANK_BLOCK_BITS.
+
+    Returns:
+        list[tuple[int, int]]: Sorted, non-overlapping ranges of blank addresses, with the end excluded
+    """
+    # The dump covers a power of two addresses, so it is always made of whole blocks
+    block_entries: int = min(1 << block_bits, len(dump))
+    block_size: int = block_entries * dump.entry_width
+
+    # Hi-Z bits count as set, so a single comparison per block is enough
+    plane: bytes = or_planes(dump.data, dump.z_mask) if dump.z_mask is not None else dump.data
+    blank_block: bytes = ((1 << dump.data_width_bits) - 1).to_bytes(dump.entry_width) * block_entries
+    view: memoryview = memoryview(plane)
+    ranges: list[tuple[int, int]] = []
+
+    for offset in range(0, len(plane), block_size):
+        if view[offset:offset + block_size] != blank_block:
+            continue
+
+        start: int = offset // dump.entry_width
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + block_entries)
+        else:
+            ranges.append((start, start + block_entries))
+
+    return ranges
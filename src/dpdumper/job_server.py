@@ -0,0 +1,482 @@
+"""This module contains a server that keeps the session with a board open and runs the jobs submitted over a local socket, and the client to submit them"""
+
+import io
+import os
+import sys
+import json
+import stat
+import time
+import queue
+import socket
+import logging
+import tomllib
+import tempfile
+import itertools
+import threading
+import traceback
+import socketserver
+
+from typing import Any, BinaryIO, TextIO, final
+
+import serial
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+
+import dpdumper.frontend as Frontend
+import dpdumper.fleet as Fleet
+import dpdumper.progress as Progress
+from dpdumper.dumper_utilities import BoardInfo
+
+_LOGGER = logging.getLogger(__name__)
+
+# Requests handled by the server itself, besides the read, write and test jobs
+_REQUEST_STATUS: str = 'status'
+_REQUEST_SHUTDOWN: str = 'shutdown'
+_JOB_TEST: str = 'test'
+
+def default_socket_path() -> str:
+    """Returns the path of the Unix socket used when no address is given"""
+    return os.path.join(tempfile.gettempdir(), 'dpdumper.sock')
+
+@final
+class _QueuedJob:
+    """
+    A job waiting in the queue of the server, with the queue of events to stream back to the client that submitted it.
+    The end of the events is marked by None.
+    """
+
+    id: int
+    job: Fleet.FleetJob
+    events: 'queue.Queue[dict[str, Any] | None]'
+
+    def __init__(self, job_id: int, job: Fleet.FleetJob) -> None:
+        self.id = job_id
+        self.job = job
+        self.events = queue.Queue()
+
+@final
+class _JobOutput(io.TextIOBase):
+    """
+    Replacement for stdout while the server is running.
+    What the worker prints while running a job is turned into events for the client: complete lines become output events,
+    while the lines that are redrawn in place become progress events. Lines are also echoed on the server console.
+    """
+
+    _out: TextIO
+    _lock: threading.Lock
+    _worker: int | None
+    _events: 'queue.Queue[dict[str, Any] | None] | None'
+    _job_id: int
+    _partial: str
+    _last_status: str
+
+    def __init__(self, out: TextIO) -> None:
+        self._out = out
+        self._lock = threading.Lock()
+        self._worker = None
+        self._events = None
+        self._job_id = 0
+        self._partial = ''
+        self._last_status = ''
+
+    def attach(self, queued: _QueuedJob) -> None:
+        with self._lock:
+            self._worker = threading.get_ident()
+            self._events = queued.events
+            self._job_id = queued.id
+            self._partial = ''
+            self._last_status = ''
+
+    def release(self) -> None:
+        with self._lock:
+            self._worker = None
+            self._events = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        with self._lock:
+            if self._events is None or threading.get_ident() != self._worker:
+                return self._out.write(s)
+
+            text: str = self._partial + s
+            *lines, rest = text.split('\n')
+
+            for line in lines:
+                # Only the last redraw of a line is relevant
+                line = line.split('\r')[-1].strip()
+                if line:
+                    self._events.put({'event': 'output', 'job': self._job_id, 'line': line})
+                    self._out.write(f'[job {self._job_id}] {line}\n')
+
+            if '\r' in rest:
+                status: str = rest.rstrip('\r').split('\r')[-1].strip()
+                # Progress bars are redrawn far more often than they change
+                if status and status != self._last_status:
+                    self._events.put({'event': 'progress', 'job': self._job_id, 'status': status})
+                    self._last_status = status
+                rest = ''
+
+            self._partial = rest
+            self._out.flush()
+
+        return len(s)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._out.flush()
+
+@final
+class _EventRenderer(Progress.ProgressRenderer):
+    """Turns the progress of the transfers of a job into progress events for the client"""
+
+    _events: 'queue.Queue[dict[str, Any] | None]'
+    _job_id: int
+
+    def __init__(self, queued: _QueuedJob) -> None:
+        self._events = queued.events
+        self._job_id = queued.id
+
+    def update(self, state: Progress.ProgressState) -> None:
+        self._events.put({'event': 'progress', 'job': self._job_id, 'status': state.describe(), 'done': state.done, 'total': state.total, 'unit': state.unit})
+
+    def finish(self, state: Progress.ProgressState) -> None:
+        self.update(state)
+
+@final
+class _BoardSession:
+    """
+    This class holds the connection with the board between jobs, opening it again only when it was lost.
+    """
+
+    _port: str
+    _baudrate: int
+    _connection: tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None
+
+    def __init__(self, port: str, baudrate: int) -> None:
+        self._port = port
+        self._baudrate = baudrate
+        self._connection = None
+
+    @property
+    def board_info(self) -> BoardInfo | None:
+        return self._connection[2] if self._connection else None
+
+    def get(self) -> tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo]:
+        if self._connection is None or self._connection[0].closed:
+            _LOGGER.info(f'Connecting to the board on {self._port}')
+            self._connection = Frontend.connect_board(self._port, self._baudrate)
+
+            if self._connection is None:
+                raise IOError(f'Unable to connect to the board on {self._port}')
+
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection and not self._connection[0].closed:
+            self._connection[0].close()
+        self._connection = None
+
+def _parse_request(job_id: int, request: dict[str, Any], root: str | None = None) -> Fleet.FleetJob:
+    if request.get('command') == _JOB_TEST:
+        return Fleet.FleetJob(job_id, _JOB_TEST, '', {})
+
+    # Clients run on the same machine, relative paths refer to the directory they passed
+    job: Fleet.FleetJob = Fleet.parse_job(job_id, request, request.get('base_dir') or os.getcwd())
+
+    if root is not None:
+        paths: list[str] = [job.definition] + [job.options[key] for key in Fleet.PATH_OPTIONS if job.options.get(key)]
+        for path in paths:
+            if os.path.commonpath([root, os.path.realpath(path)]) != root:
+                raise ValueError(f'Job {job_id} uses {path}, outside of the directory {root} served over TCP')
+
+    return job
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a client connection. Every line received is a JSON request, and every line sent back is a JSON event.
+    Jobs submitted on the same connection run one after the other, in order.
+    """
+
+    def _send(self, event: dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(event).encode() + b'\n')
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        server: Any = self.server
+
+        for raw_request in self.rfile:
+            try:
+                request: dict[str, Any] = json.loads(raw_request)
+            except json.JSONDecodeError as ex:
+                self._send({'event': 'error', 'error': f'Malformed request: {ex}'})
+                continue
+
+            if request.get('command') == _REQUEST_STATUS:
+                board_info: BoardInfo | None = server.session.board_info
+                self._send({'event': 'status',
+                            'board': {'model': board_info.model, 'fw_version': board_info.fw_version} if board_info else None,
+                            'queued': server.jobs.qsize()})
+                continue
+
+            if request.get('command') == _REQUEST_SHUTDOWN:
+                # Jobs already in the queue are completed first
+                server.jobs.put(None)
+                self._send({'event': 'shutdown'})
+                return
+
+            job_id: int = next(server.job_ids)
+            try:
+                queued: _QueuedJob = _QueuedJob(job_id, _parse_request(job_id, request, server.root))
+            except ValueError as ex:
+                self._send({'event': 'error', 'job': job_id, 'error': str(ex)})
+                continue
+
+            server.jobs.put(queued)
+            self._send({'event': 'queued', 'job': job_id, 'position': server.jobs.qsize()})
+
+            while (event := queued.events.get()) is not None:
+                self._send(event)
+
+class _TCPJobServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer): # type: ignore
+        daemon_threads = True
+
+def _remove_socket(path: str) -> None:
+    """Removes the Unix socket at a path, if there is one, refusing to touch any other kind of file"""
+    try:
+        mode: int = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f'{path} exists and is not a socket, refusing to remove it')
+
+    os.remove(path)
+
+def _remove_stale_socket(path: str) -> None:
+    """Removes the Unix socket left behind at a path by a server that did not shut down cleanly, refusing to touch one a server still answers on"""
+    probe: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) # type: ignore
+    try:
+        probe.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # Nothing is listening, any other error leaves the path alone
+        pass
+    else:
+        raise ValueError(f'A server is already listening on {path}')
+    finally:
+        probe.close()
+
+    _remove_socket(path)
+
+def _build_server(socket_path: str | None, tcp_port: int | None) -> socketserver.BaseServer:
+    if tcp_port is not None:
+        # Jobs can read and write any file the server can access: never listen beyond this machine
+        return _TCPJobServer(('127.0.0.1', tcp_port), _RequestHandler)
+
+    if not hasattr(socketserver, 'UnixStreamServer'):
+        raise ValueError('Unix sockets are not supported on this platform, use a TCP port')
+
+    path: str = socket_path or default_socket_path()
+    # A socket left behind by a server that did not shut down cleanly would prevent binding
+    _remove_stale_socket(path)
+
+    return _UnixJobServer(path, _RequestHandler)
+
+def _run_queued(session: _BoardSession, queued: _QueuedJob, output: _JobOutput) -> None:
+    job: Fleet.FleetJob = queued.job
+    start_time: float = time.time()
+    transferred: int = 0
+    error: str | None = None
+
+    output.attach(queued)
+    queued.events.put({'event': 'started', 'job': queued.id})
+
+    try:
+        print(f'Starting job {queued.id} ({job.command}{" " + os.path.basename(job.definition) if job.definition else ""})')
+        ser, cmd_class, board_info = session.get()
+
+        with Progress.reporting(_EventRenderer(queued)):
+            if job.command == _JOB_TEST:
+                # Nobody is in front of the terminal to cancel the test, no point in waiting
+                if not Frontend.test_command(ser, cmd_class, 0):
+                    error = 'Board self-test failed'
+            else:
+                transferred = Fleet.run_job(job, ser, cmd_class, board_info, close_port=False)
+    except (FileNotFoundError, ValueError) as ex:
+        # Bad files or parameters are found before talking to the board, the session is still good
+        _LOGGER.debug(traceback.format_exc())
+        error = str(ex)
+    except Exception as ex:
+        _LOGGER.debug(traceback.format_exc())
+        error = str(ex) or type(ex).__name__
+        # The board may be in an unknown state, start the next job from a fresh connection
+        session.close()
+    finally:
+        print(f'Job {queued.id} {"FAILED: " + error if error else "completed"}')
+        output.release()
+
+    queued.events.put({'event': 'done', 'job': queued.id, 'ok': error is None, 'seconds': round(time.time() - start_time, 3), 'transferred': transferred, 'error': error})
+    queued.events.put(None)
+
+def serve_command(port: str, baudrate: int, socket_path: str | None = None, tcp_port: int | None = None) -> int:
+    """Keeps the session with a board open, and runs the jobs submitted by the clients one at a time, in the order they arrive
+
+    Args:
+        port (str): Serial port of the board
+        baudrate (int): Speed at which the serial port is opened
+        socket_path (str | None, optional): Path of the Unix socket to listen on. Defaults to default_socket_path().
+        tcp_port (int | None, optional): If passed, listen on this TCP port of the loopback interface instead, accepting only jobs
+                                         whose files are inside the current directory. Defaults to None.
+
+    Returns:
+        int: 1 when the server is shut down
+    """
+    # Bind first: if another server is running, its board must not be touched
+    server: Any = _build_server(socket_path, tcp_port)
+    address: str = f'127.0.0.1:{tcp_port}' if tcp_port is not None else server.server_address
+
+    session: _BoardSession = _BoardSession(port, baudrate)
+    try:
+        session.get()
+    except Exception:
+        server.server_close()
+        if tcp_port is None:
+            _remove_socket(address)
+        raise
+
+    server.session = session
+    # Any local user can connect to a TCP port, so jobs coming from one are confined to the directory the server runs in.
+    # Unix sockets are protected by the permissions of the file.
+    server.root = os.path.realpath(os.getcwd()) if tcp_port is not None else None
+    server.jobs = queue.Queue()
+    server.job_ids = itertools.count(1)
+
+    print(f'Serving the board on {port}, listening on {address}. Press CTRL-C to stop.')
+
+    threading.Thread(target=server.serve_forever, name='dpdumper-server', daemon=True).start()
+
+    output: _JobOutput = _JobOutput(sys.stdout)
+    original_stdout: TextIO = sys.stdout
+    sys.stdout = output
+    try:
+        while True:
+            try:
+                queued: _QueuedJob | None = server.jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if queued is None:
+                break
+
+            _run_queued(session, queued, output)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout = original_stdout
+        server.shutdown()
+        server.server_close()
+        session.close()
+
+        if tcp_port is None:
+            _remove_socket(address)
+
+    print('Server stopped.')
+    return 1
+
+def _connect(socket_path: str | None, tcp_port: int | None) -> socket.socket:
+    if tcp_port is not None:
+        return socket.create_connection(('127.0.0.1', tcp_port))
+
+    sock: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) # type: ignore
+    sock.connect(socket_path or default_socket_path())
+    return sock
+
+def _request(rfile: BinaryIO, wfile: BinaryIO, request: dict[str, Any]) -> dict[str, Any]:
+    wfile.write(json.dumps(request).encode() + b'\n')
+    wfile.flush()
+
+    last: dict[str, Any] = {}
+    progress_shown: bool = False
+
+    for raw_event in rfile:
+        event: dict[str, Any] = json.loads(raw_event)
+        last = event
+
+        match event.get('event'):
+            case 'progress':
+                print(f'\r{event["status"]}'.ljust(60), end='')
+                progress_shown = True
+            case 'output':
+                if progress_shown:
+                    print('')
+                    progress_shown = False
+                print(event['line'])
+            case 'queued':
+                if event['position'] > 1:
+                    print(f'Job {event["job"]} queued, {event["position"] - 1} jobs ahead')
+            case 'started':
+                pass
+            case _:
+                # Every other event is the answer to the request
+                break
+
+    if progress_shown:
+        print('')
+
+    return last
+
+def submit_command(jobs_file: str | None, socket_path: str | None = None, tcp_port: int | None = None, status: bool = False, shutdown: bool = False) -> int:
+    """Submits the jobs in a file to a running server, and relays what they print
+
+    Args:
+        jobs_file (str | None): Path to a TOML file with the jobs, in the same format used by the fleet command
+        socket_path (str | None, optional): Path of the Unix socket of the server. Defaults to default_socket_path().
+        tcp_port (int | None, optional): If passed, connect to this TCP port of the loopback interface instead. Defaults to None.
+        status (bool, optional): True to print the state of the server. Defaults to False.
+        shutdown (bool, optional): True to stop the server once the jobs are done. Defaults to False.
+
+    Returns:
+        int: 1 if all the jobs completed, -1 otherwise
+    """
+    requests: list[dict[str, Any]] = []
+
+    if jobs_file:
+        with open(jobs_file, 'rb') as f:
+            content: dict[str, Any] = tomllib.load(f)
+
+        # Paths in the jobs file are relative to the file itself, the server resolves them
+        base_dir: str = os.path.dirname(os.path.abspath(jobs_file))
+        requests = [{**job, 'base_dir': base_dir} for job in content.get('jobs', [])]
+
+    results: list[dict[str, Any]] = []
+
+    with _connect(socket_path, tcp_port) as sock, sock.makefile('rb') as rfile, sock.makefile('wb') as wfile:
+        if status:
+            state: dict[str, Any] = _request(rfile, wfile, {'command': _REQUEST_STATUS})
+            board: dict[str, Any] | None = state.get('board')
+            print(f'Server is {"connected to board model " + str(board["model"]) + ", firmware " + board["fw_version"] if board else "not connected to a board"}, {state.get("queued", 0)} jobs queued.')
+
+        for request in requests:
+            results.append(_request(rfile, wfile, request))
+
+        if shutdown:
+            _request(rfile, wfile, {'command': _REQUEST_SHUTDOWN})
+            print('Server is shutting down.')
+
+    if not results:
+        return 1
+
+    print('Job\tResult\tTime\tThroughput')
+    for result in results:
+        ok: bool = result.get('ok', False)
+        seconds: float = result.get('seconds', 0)
+        throughput: str = f'{result["transferred"] / seconds / 1024:.1f}KB/s' if ok and seconds > 0 and result.get('transferred') else '-'
+        print(f'{result.get("job", "-")}\t{"OK" if ok else "FAILED (" + str(result.get("error")) + ")"}\t{seconds:.1f}s\t{throughput}')
+
+    return 1 if all(result.get('ok', False) for result in results) else -1
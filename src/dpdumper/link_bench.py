@@ -0,0 +1,165 @@
+"""This module contains code to measure the throughput of the link with the board, and pick the best speed"""
+
+import time
+import logging
+import traceback
+
+from typing import NamedTuple, final
+
+import serial
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+from dpdumperlib.ic.ic_definition import ICDefinition
+from dpdumperlib.ic.ic_loader import ICLoader
+
+import dpdumper.frontend as Frontend
+from dpdumper.dumper_utilities import BoardInfo
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BAUDRATES: list[int] = [115200, 230400, 460800, 921600, 1000000, 2000000, 3000000]
+
+# Pins toggled during the benchmark when no definition is given. They avoid GND (21) and +5V (42) and the IC is never powered,
+# but they are driven regardless of what sits in the socket: they are only meant for bench-link with an empty socket.
+_BENCH_ADDRESS_PINS: list[int] = list(range(1, 21))
+_BENCH_DATA_PINS: list[int] = list(range(22, 30))
+
+@final
+class LinkResult(NamedTuple):
+    baudrate: int
+    transfers: int
+    errors: int
+    bytes_per_second: float
+    error: str | None = None
+
+    @property
+    def reliable(self) -> bool:
+        return self.error is None and self.transfers > 0 and self.errors == 0
+
+def _measure(ser: serial.Serial, cmd_class: type[HardwareBoardCommands], address_pins: list[int], data_pins: list[int], repeats: int) -> tuple[int, int, float]:
+    data_width: int = -(len(data_pins) // -8)
+    expected_size: int = (1 << len(address_pins)) * data_width
+    errors: int = 0
+    transferred: int = 0
+    elapsed: float = 0
+
+    for _ in range(repeats):
+        start_time: float = time.perf_counter()
+        try:
+            data: bytes | None = cmd_class.cxfer_read(address_pins, data_pins, [], None, ser)
+        except Exception as ex:
+            _LOGGER.debug(f'Transfer failed: {ex}')
+            data = None
+        elapsed += time.perf_counter() - start_time
+
+        # The IC is not powered and the data lines may float, so only the framing of the transfer is checked, not its content
+        if not data or len(data) != expected_size:
+            errors += 1
+            # Whatever was left on the line would corrupt the next transfer
+            ser.reset_input_buffer()
+            continue
+
+        transferred += len(data)
+
+    return (errors, transferred, elapsed)
+
+def bench_link(port: str, baudrates: list[int], address_bits: int = 14, repeats: int = 3, ic: ICDefinition | None = None) -> list[LinkResult]:
+    """Measures the effective throughput and the error rate of bulk transfers at different speeds
+
+    Args:
+        port (str): Serial port associated with the board
+        baudrates (list[int]): Speeds to try
+        address_bits (int, optional): Every transfer walks this many address lines. Defaults to 14.
+        repeats (int, optional): Number of transfers for every speed. Defaults to 3.
+        ic (ICDefinition | None, optional): If passed, use the pins of this IC for the transfers. Defaults to None.
+
+    Returns:
+        list[LinkResult]: Results for every speed, in the same order
+    """
+    address_pins: list[int] = (ic.address if ic else _BENCH_ADDRESS_PINS)[:address_bits]
+    data_pins: list[int] = ic.data if ic else _BENCH_DATA_PINS
+    results: list[LinkResult] = []
+
+    for baudrate in baudrates:
+        ser: serial.Serial | None = None
+
+        try:
+            connection: tuple[serial.Serial, type[HardwareBoardCommands], BoardInfo] | None = Frontend.connect_board(port, baudrate)
+            if connection is None:
+                results.append(LinkResult(baudrate, 0, 0, 0, 'board did not respond'))
+                continue
+
+            ser, cmd_class, _ = connection
+            errors, transferred, elapsed = _measure(ser, cmd_class, address_pins, data_pins, repeats)
+            results.append(LinkResult(baudrate, repeats, errors, transferred / elapsed if elapsed > 0 else 0))
+        except Exception as ex:
+            _LOGGER.debug(traceback.format_exc())
+            results.append(LinkResult(baudrate, 0, 0, 0, str(ex)))
+        finally:
+            if ser and not ser.closed:
+                ser.close()
+
+    return results
+
+def pick_baudrate(results: list[LinkResult]) -> int | None:
+    """Picks the speed with the best throughput, among the ones that had no errors
+
+    Args:
+        results (list[LinkResult]): Results of a benchmark
+
+    Returns:
+        int | None: The best speed, or None if no speed was reliable
+    """
+    reliable: list[LinkResult] = [result for result in results if result.reliable]
+
+    if not reliable:
+        return None
+
+    # Links where the baud rate is ignored (e.g. USB-CDC) give the same result everywhere: within 5% prefer the lowest speed
+    best_throughput: float = max(result.bytes_per_second for result in reliable)
+    return min(result.baudrate for result in reliable if result.bytes_per_second >= best_throughput * 0.95)
+
+def bench_link_command(port: str, baudrates: list[int], address_bits: int, repeats: int, definition: str | None = None) -> int:
+    ic: ICDefinition | None = None
+    if definition:
+        ic = ICLoader.extract_definition_from_file(definition)
+
+    print(f'Benchmarking the link on {port}, {repeats} transfers of {1 << address_bits} entries for every speed.')
+    results: list[LinkResult] = bench_link(port, baudrates, address_bits, repeats, ic)
+
+    print('Baud rate\tThroughput\tErrors')
+    for result in results:
+        if result.error:
+            print(f'{result.baudrate}\t\t-\t\tFAILED ({result.error})')
+        else:
+            print(f'{result.baudrate}\t\t{result.bytes_per_second / 1024:.1f}KB/s\t{result.errors}/{result.transfers}')
+
+    best: int | None = pick_baudrate(results)
+    if best is None:
+        print('No speed gave reliable transfers!')
+        return -1
+
+    print(f'Fastest reliable speed is {best}, use it with -b {best}')
+    return 1
+
+def auto_baudrate(port: str, baudrates: list[int], fallback: int, ic: ICDefinition) -> int:
+    """Quickly benchmarks the link and returns the fastest reliable speed
+
+    Args:
+        port (str): Serial port associated with the board
+        baudrates (list[int]): Speeds to try
+        fallback (int): Speed returned if no speed is reliable
+        ic (ICDefinition): IC in the socket, only its pins are used for the transfers
+
+    Returns:
+        int: The speed to use
+    """
+    # The IC is already in the socket, so the pins of its definition are the only ones that can be toggled safely
+    best: int | None = pick_baudrate(bench_link(port, baudrates, 12, 2, ic))
+
+    if best is None:
+        _LOGGER.warning(f'Unable to find a reliable speed, falling back to {fallback}')
+        return fallback
+
+    _LOGGER.info(f'Auto-selected speed {best}')
+    return best
@@ -2,13 +2,17 @@
 
 import math
 import hashlib
+import functools
 
-from typing import Generator, Literal
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Generator, Iterable, TextIO, BinaryIO, final
 
 from dpdumperlib.ic.ic_definition import ICDefinition
 
-from dpdumper.hl_board_utilities import DataElement
-from dpdumper.dumper_utilities import grouped_iterator
+from dpdumper.ic_dump import ICDump, or_planes, swap_entries_byte_order
+import dpdumper.run_stats as RunStats
+import dpdumper.output_workers as OutputWorkers
 
 # See https://stackoverflow.com/questions/8898807/pythonic-way-to-iterate-over-bits-of-integer
 # and https://lemire.me/blog/2018/02/21/iterating-over-set-bits-quickly/
@@ -18,58 +22,284 @@ def _bits_iterator(n: int) -> Generator[int, None, None]:
         yield b
         n ^= b
 
-def build_binary_array(ic: ICDefinition, elements: list[DataElement], hiz_high: bool = False, reverse_byte_order: bool = False) -> tuple[bytearray, bytearray, str]:
+def build_binary_array(ic: ICDefinition, dump: ICDump, hiz_high: bool = False, reverse_byte_order: bool = False) -> tuple[bytes, bytes, str]:
     """Builds a binary array out of data read from the IC, and returns it plus the SHA1SUM of the data
 
     Args:
         ic (ICDefinition): Definition of the IC that was read
-        elements (list[DataElement]): Array of the reads, in addressing order, containing both data and Hi-Z info
+        dump (ICDump): Compact dump of the reads, in addressing order, containing both data and Hi-Z info
         hiz_high (bool, optional): True if the Hi-Z pins will be represented as 1 in the binary out. Defaults to False.
+        reverse_byte_order (bool, optional): True if the entries will be written in little endian order. Defaults to False.
 
     Returns:
-        tuple[bytearray, bytearray, str]: Tuple containing the byte array for the data, for they hi-z and the sha1 sum for data
+        tuple[bytes, bytes, str]: Tuple containing the byte array for the data, for they hi-z and the sha1 sum for data
+    """
+    with RunStats.phase('binary_build'):
+        data_arr, hiz_arr = build_binary_block(ic, dump, hiz_high, reverse_byte_order)
+
+    with RunStats.phase('sha1'):
+        sha1sum: str = hashlib.sha1(data_arr).hexdigest()
+
+    return (data_arr, hiz_arr, sha1sum)
+
+def build_binary_block(ic: ICDefinition, dump: ICDump, hiz_high: bool = False, reverse_byte_order: bool = False) -> tuple[bytes, bytes]:
+    """Builds the binary data and Hi-Z arrays for a dump, or for a block of it
+
+    Args:
+        ic (ICDefinition): Definition of the IC that was read
+        dump (ICDump): Compact dump of the reads, in addressing order, containing both data and Hi-Z info
+        hiz_high (bool, optional): True if the Hi-Z pins will be represented as 1 in the binary out. Defaults to False.
+        reverse_byte_order (bool, optional): True if the entries will be written in little endian order. Defaults to False.
+
+    Returns:
+        tuple[bytes, bytes]: Tuple containing the byte array for the data and for the hi-z
     """
-    data_width: int = len(ic.data)
     # Use upside-down floor division: https://stackoverflow.com/questions/14822184/is-there-a-ceiling-equivalent-of-operator-in-python
-    bytes_per_entry = -(data_width // -8)
-    data_arr: bytearray = bytearray()
-    hiz_arr: bytearray = bytearray()
-    endianness: Literal['big', 'little'] = 'little' if reverse_byte_order else 'big'
+    bytes_per_entry: int = -(len(ic.data) // -8)
+    data_arr: bytes = dump.data
+    hiz_arr: bytes = dump.z_plane
 
-    for el in elements:
-        data: int = el.data | (el.z_mask if hiz_high else 0)
-        data_b: bytes = data.to_bytes(bytes_per_entry, endianness)
-        data_arr += bytearray(data_b)
+    if hiz_high and dump.z_mask is not None:
+        data_arr = or_planes(data_arr, hiz_arr)
 
-        data_z: bytes = el.z_mask.to_bytes(bytes_per_entry, endianness)
-        hiz_arr += bytearray(data_z)
+    # The planes in the dump are big endian, reverse every entry if needed
+    if reverse_byte_order:
+        data_arr = swap_entries_byte_order(data_arr, bytes_per_entry)
+        hiz_arr = swap_entries_byte_order(hiz_arr, bytes_per_entry)
 
-    return (data_arr, hiz_arr, hashlib.sha1(data_arr).hexdigest())  
+    return (data_arr, hiz_arr)
 
-def build_output_binary_file(outf: str, data: bytearray) -> None:
+def build_output_binary_file(outf: str, data: bytes) -> None:
     with open(outf, 'wb') as f:
         f.write(data)
 
-def build_output_table_file(outf: str, ic: ICDefinition, elements: list[DataElement]) -> None:
+def _write_table_header(f: TextIO, ic: ICDefinition) -> None:
+    f.write(f'Name:\t{ic.name}\n')
+    f.write(f'Type:\t{ic.ic_type.value}\n')
+    f.write(f'A:\t{len(ic.address)}\n')
+    f.write(f'D:\t{len(ic.data)}\n')
+    f.write('\n')
+
+# Number of table lines that are formatted and written in one go
+_TABLE_CHUNK: int = 4096
+
+# Tables of dumps with at least this many entries are formatted by the pool of workers, in shards of _TABLE_SHARD entries.
+# Smaller ones take less time than handing them over
+PARALLEL_MIN_ENTRIES: int = 1 << 18
+_TABLE_SHARD: int = 1 << 16
+
+# Bit strings for every byte value, and hex strings for the lowest byte of the addresses
+_BYTE_BITS: list[str] = [f'{value:08b}' for value in range(256)]
+_BYTE_HEX: list[str] = [f'{value:02X}' for value in range(256)]
+
+@functools.cache
+def _byte_bits_table(bits: int) -> list[str]:
+    # Table for the most significant byte of an entry, which might use less than 8 bits
+    return [bit_str[8 - bits:] for bit_str in _BYTE_BITS]
+
+@functools.cache
+def _byte_bits_z_table(bits: int) -> list[str]:
+    # Table indexed by (Hi-Z mask << 8) | data, with the Hi-Z bits overlaid as 'Z'
+    return [''.join('Z' if z_char == '1' else d_char for d_char, z_char in zip(d_str, z_str)) for z_str in _byte_bits_table(bits) for d_str in _byte_bits_table(bits)]
+
+def _format_table_entries_generic(dump: ICDump, data_width: int, address_digits: int, base_address: int, start: int, end: int) -> str:
+    lines: list[str] = []
+
+    for i in range(start, end):
+        data, z_mask = dump.entry(i)
+        address_str: str = f'{base_address + i:0{address_digits}X}'
+        data_bit_list: list[str] = list(f'{data:0{data_width}b}')
+
+        for hiz_pin in _bits_iterator(z_mask):
+            data_bit_list[(data_width - 1) - int(math.log2(hiz_pin))] = 'Z'
+
+        lines.append(f'{address_str}\t{''.join(data_bit_list)}\n')
+
+    return ''.join(lines)
+
+def _format_addresses(address_digits: int, start: int, end: int) -> list[str]:
+    if address_digits < 2:
+        return [f'{address:0{address_digits}X}' for address in range(start, end)]
+
+    # Only the lowest byte changes within every run of 256 addresses
+    addresses: list[str] = []
+    address: int = start
+    while address < end:
+        run_end: int = min(end, (address | 0xFF) + 1)
+        prefix: str = f'{address >> 8:0{address_digits - 2}X}' if address_digits > 2 or address >> 8 else ''
+        addresses.extend([prefix + low for low in _BYTE_HEX[address & 0xFF:((run_end - 1) & 0xFF) + 1]])
+        address = run_end
+
+    return addresses
+
+def _format_table_entries(dump: ICDump, data_width: int, address_digits: int, base_address: int, start: int, end: int) -> str:
+    entry_width: int = dump.entry_width
+    top_bits: int = data_width - (entry_width - 1) * 8
+    data_view: bytes = dump.data[start * entry_width:end * entry_width]
+    z_view: bytes | None = dump.z_mask[start * entry_width:end * entry_width] if dump.z_mask is not None else None
+
+    # The lookup tables cover exactly the data width, anything outside of it is left to the generic formatter
+    if entry_width == 0 or top_bits > 8 or (top_bits < 8 and any(max(plane[0::entry_width], default=0) >> top_bits for plane in (data_view, z_view) if plane)):
+        return _format_table_entries_generic(dump, data_width, address_digits, base_address, start, end)
+
+    lanes: list[list[str]] = []
+    for lane in range(entry_width):
+        lane_bits: int = top_bits if lane == 0 else 8
+        data_lane: bytes = data_view[lane::entry_width]
+        z_lane: bytes | None = z_view[lane::entry_width] if z_view else None
+
+        if z_lane and any(z_lane):
+            z_table: list[str] = _byte_bits_z_table(lane_bits)
+            lanes.append([z_table[(z << 8) | d] for d, z in zip(data_lane, z_lane)])
+        else:
+            lanes.append(list(map(_byte_bits_table(lane_bits).__getitem__, data_lane)))
+
+    data_strs: list[str] = lanes[0] if entry_width == 1 else list(map(''.join, zip(*lanes)))
+    addresses: list[str] = _format_addresses(address_digits, base_address + start, base_address + end)
+
+    return ''.join([f'{address_str}\t{data_str}\n' for address_str, data_str in zip(addresses, data_strs)])
+
+def _format_table_shard(data: bytes, z_mask: bytes | None, data_width: int, address_digits: int, base_address: int) -> str:
+    # Runs in the workers, which receive only the planes of their shard
+    dump: ICDump = ICDump(data, data_width, z_mask)
+    return ''.join(_format_table_entries(dump, data_width, address_digits, base_address, start, min(len(dump), start + _TABLE_CHUNK))
+                   for start in range(0, len(dump), _TABLE_CHUNK))
+
+def _write_table_entries(f: TextIO, ic: ICDefinition, dump: ICDump, base_address: int = 0) -> None:
     data_width: int = len(ic.data)
     address_width: int = len(ic.address)
     # Use upside-down floor division: https://stackoverflow.com/questions/14822184/is-there-a-ceiling-equivalent-of-operator-in-python
     address_bytes: int = -(address_width // -8)
+    pool: Executor | None = OutputWorkers.get_pool() if len(dump) >= PARALLEL_MIN_ENTRIES else None
+
+    # Lines are built through per-byte lookup tables and written in big chunks
+    if pool is None:
+        for start in range(0, len(dump), _TABLE_CHUNK):
+            f.write(_format_table_entries(dump, data_width, address_bytes * 2, base_address, start, min(len(dump), start + _TABLE_CHUNK)))
+        return
+
+    # Shards are written in addressing order as they complete, with only a few of them waiting in memory
+    entry_width: int = dump.entry_width
+    max_pending: int = 2 * OutputWorkers.worker_count()
+    pending: deque[Future[str]] = deque()
+
+    for start in range(0, len(dump), _TABLE_SHARD):
+        end: int = min(len(dump), start + _TABLE_SHARD)
+        pending.append(pool.submit(_format_table_shard,
+                                   dump.data[start * entry_width:end * entry_width],
+                                   dump.z_mask[start * entry_width:end * entry_width] if dump.z_mask is not None else None,
+                                   data_width, address_bytes * 2, base_address + start))
+        if len(pending) >= max_pending:
+            f.write(pending.popleft().result())
+
+    while pending:
+        f.write(pending.popleft().result())
+
+def build_output_table_file(outf: str, ic: ICDefinition, dump: ICDump) -> None:
+    with open(outf, "wt") as f:
+        _write_table_header(f, ic)
+        _write_table_entries(f, ic, dump)
+
+    return
+
+def build_output_table_file_from_blocks(outf: str, ic: ICDefinition, blocks: Iterable[tuple[int, ICDump]], allow_gaps: bool = False) -> None:
+    """Writes the table file from blocks of a dump, without requiring the whole dump in memory
+
+    Args:
+        outf (str): Path of the table file
+        ic (ICDefinition): Definition of the IC that was read
+        blocks (Iterable[tuple[int, ICDump]]): Tuples of base address and data for every block, in addressing order
+        allow_gaps (bool, optional): True if the blocks cover only some ranges of addresses, the table will list only those. Defaults to False.
+    """
+    next_address: int = 0
 
     with open(outf, "wt") as f:
-        f.write(f'Name:\t{ic.name}\n')
-        f.write(f'Type:\t{ic.ic_type.value}\n')
-        f.write(f'A:\t{len(ic.address)}\n')
-        f.write(f'D:\t{len(ic.data)}\n')
-        f.write('\n')
+        _write_table_header(f, ic)
+
+        for base_address, dump in blocks:
+            if base_address < next_address or (base_address != next_address and not allow_gaps):
+                raise ValueError(f'Expected a block starting at address {next_address:X}, got one at {base_address:X}')
+
+            _write_table_entries(f, ic, dump, base_address)
+            next_address = base_address + len(dump)
+
+@final
+class DumpStreamWriter:
+    """
+    This class writes the output files of a read incrementally, one block of addresses at a time,
+    and keeps a running SHA1SUM of the binary data.
+    Blocks must be fed in addressing order.
+    """
+
+    _ic: ICDefinition
+    _hiz_high: bool
+    _reverse_byte_order: bool
+    _data_listener: Callable[[bytes], None] | None
+    _table_file: TextIO | None
+    _binary_file: BinaryIO | None
+    _binary_z_file: BinaryIO | None
+    _next_address: int
+
+    def __init__(self, ic: ICDefinition, outf: str | None, outfb: str | None = None, outfbz: str | None = None, hiz_high: bool = False, reverse_byte_order: bool = False, data_listener: Callable[[bytes], None] | None = None) -> None:
+        self._ic = ic
+        self._hiz_high = hiz_high
+        self._reverse_byte_order = reverse_byte_order
+        # Receives the binary data of every block, as it is written
+        self._data_listener = data_listener
+        self._sha1 = hashlib.sha1()
+        self._next_address = 0
+
+        self._table_file = open(outf, "wt") if outf else None
+        self._binary_file = open(outfb, 'wb') if outfb else None
+        self._binary_z_file = open(outfbz, 'wb') if outfbz else None
+
+        if self._table_file:
+            _write_table_header(self._table_file, ic)
+
+    def __enter__(self) -> 'DumpStreamWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write_block(self, base_address: int, dump: ICDump) -> None:
+        """Appends a block of data to all the output files
+
+        Args:
+            base_address (int): Address of the first entry in the block
+            dump (ICDump): Data of the block
+        """
+        if base_address != self._next_address:
+            raise ValueError(f'Expected a block starting at address {self._next_address:X}, got one at {base_address:X}')
+
+        data_arr, hiz_arr = build_binary_block(self._ic, dump, self._hiz_high, self._reverse_byte_order)
+
+        if self._table_file:
+            _write_table_entries(self._table_file, self._ic, dump, base_address)
+
+        self._sha1.update(data_arr)
+
+        if self._data_listener:
+            self._data_listener(data_arr)
+
+        if self._binary_file:
+            self._binary_file.write(data_arr)
+
+        if self._binary_z_file:
+            self._binary_z_file.write(hiz_arr)
 
-        for i, el in enumerate(elements):
-            address_str: str = f'{i:0{address_bytes*2}X}'
-            data_bit_list: list[str] = list(f'{el.data:0{data_width}b}')
+        # Make the data available on disk while the read is still running
+        for f in (self._table_file, self._binary_file, self._binary_z_file):
+            if f:
+                f.flush()
 
-            for hiz_pin in _bits_iterator(el.z_mask):
-                data_bit_list[(data_width - 1) - int(math.log2(hiz_pin))] = 'Z'
+        self._next_address = base_address + len(dump)
 
-            f.write(f'{address_str}\t{''.join(data_bit_list)}\n')
+    def hexdigest(self) -> str:
+        """Returns the SHA1SUM of the binary data written so far"""
+        return self._sha1.hexdigest()
 
-    return
\ No newline at end of file
+    def close(self) -> None:
+        for f in (self._table_file, self._binary_file, self._binary_z_file):
+            if f and not f.closed:
+                f.close()
@@ -0,0 +1,67 @@
+"""This module contains the pool of workers that builds the outputs of large dumps, shared by all the commands running in the process"""
+
+import os
+import sys
+import logging
+import threading
+import multiprocessing
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+_LOGGER = logging.getLogger(__name__)
+
+# None means one worker per CPU
+_workers: int | None = None
+_pool: Executor | None = None
+_lock: threading.Lock = threading.Lock()
+
+def set_workers(workers: int | None) -> None:
+    """Sets how many workers build the outputs of large dumps. A pool that is already running is stopped, and started again on next use
+
+    Args:
+        workers (int | None): Number of workers, 1 to build the outputs in the calling thread, None for one per CPU
+    """
+    global _workers, _pool
+
+    if workers is not None and workers < 1:
+        raise ValueError(f'Number of workers must be at least 1, got {workers}')
+
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+        _workers = workers
+
+def worker_count() -> int:
+    """Returns the number of workers the outputs are built with"""
+    return _workers or os.cpu_count() or 1
+
+def _gil_enabled() -> bool:
+    # Interpreters built without the GIL run threads in parallel, so there is no need to copy the data to other processes
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled is not None else True
+
+def get_pool() -> Executor | None:
+    """Returns the pool of workers, starting it on first use
+
+    Returns:
+        Executor | None: The pool, or None if the outputs should be built in the calling thread
+    """
+    global _workers, _pool
+
+    workers: int = worker_count()
+    if workers < 2:
+        return None
+
+    with _lock:
+        if _pool is None:
+            try:
+                # Spawned processes do not inherit the threads of the parent, like the progress reporter or the fleet workers
+                _pool = (ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) if _gil_enabled()
+                         else ThreadPoolExecutor(workers, thread_name_prefix='dpdumper-output'))
+            except (NotImplementedError, OSError) as ex:
+                _LOGGER.warning(f'Unable to start the workers, outputs will be built in a single process: {ex}')
+                _workers = 1
+                return None
+
+        return _pool
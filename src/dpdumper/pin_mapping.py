@@ -0,0 +1,148 @@
+"""This module contains precomputed mappings between values and board pins"""
+
+from typing import Iterable, final
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+from dpdumperlib.ic.ic_definition import ICDefinition
+
+from dpdumper.dumper_utilities import DumperUtilities
+
+_ALL_PINS: int = 0xFFFFFFFFFFFFFFFF
+
+@final
+class PinMapper:
+    """
+    This class maps values onto a list of board pins, like HardwareBoardCommands.map_value_to_pins does,
+    but using one lookup table per byte of the value, built once. The partial masks are ORed together.
+    """
+
+    _tables: list[list[int]]
+    _width: int
+
+    def __init__(self, cmd_class: type[HardwareBoardCommands], pins: list[int]) -> None:
+        self._width = len(pins)
+        self._tables = [[cmd_class.map_value_to_pins(pins[idx:idx + 8], value) for value in range(256)] for idx in range(0, len(pins), 8)]
+
+    @property
+    def width(self) -> int:
+        """Number of pins covered by this mapper"""
+        return self._width
+
+    def map(self, value: int) -> int:
+        """Maps a value onto the pins
+
+        Args:
+            value (int): Value to map, bit N goes to the Nth pin
+
+        Returns:
+            int: Pin mask for the value
+        """
+        mapped: int = 0
+        for table in self._tables:
+            mapped |= table[value & 0xFF]
+            value >>= 8
+        return mapped
+
+    def map_range(self, start: int, stop: int) -> list[int]:
+        """Maps a range of consecutive values onto the pins
+
+        Args:
+            start (int): First value of the range
+            stop (int): End of the range, excluded
+
+        Returns:
+            list[int]: Pin masks for every value in the range
+        """
+        if not self._tables:
+            return [0] * max(0, stop - start)
+
+        low_table: list[int] = self._tables[0]
+        mapped: list[int] = []
+
+        # Within every run of 256 values only the lowest byte changes, so the rest is mapped once per run
+        value: int = start
+        while value < stop:
+            run_end: int = min(stop, (value | 0xFF) + 1)
+            high_mapped: int = self.map(value & ~0xFF)
+            mapped.extend([high_mapped | low for low in low_table[value & 0xFF:((run_end - 1) & 0xFF) + 1]])
+            value = run_end
+
+        return mapped
+
+    def map_words(self, words: Iterable[int]) -> list[int]:
+        """Maps a sequence of values onto the pins
+
+        Args:
+            words (Iterable[int]): Values to map
+
+        Returns:
+            list[int]: Pin masks for every value, in the same order
+        """
+        match self._tables:
+            case []:
+                return [0 for _ in words]
+            case [t0]:
+                return [t0[word & 0xFF] for word in words]
+            case [t0, t1]:
+                return [t0[word & 0xFF] | t1[(word >> 8) & 0xFF] for word in words]
+            case _:
+                return [self.map(word) for word in words]
+
+@final
+class ICPinMaps:
+    """
+    This class holds the pin mappings required to drive an IC, computed once per definition and command class.
+    """
+
+    _cache: dict[tuple[type[HardwareBoardCommands], str], 'ICPinMaps'] = {}
+
+    address: PinMapper
+    data: PinMapper
+
+    hi_pins_mapped: int
+    data_on_mapped: int
+    act_h_mapped: int
+    act_l_mapped: int
+    wr_h_mapped: int
+    wr_l_mapped: int
+
+    def __init__(self, cmd_class: type[HardwareBoardCommands], ic: ICDefinition) -> None:
+        self.address = PinMapper(cmd_class, ic.address)
+        self.data = PinMapper(cmd_class, ic.data)
+
+        self.hi_pins_mapped = cmd_class.map_value_to_pins(ic.adapter_hi_pins, _ALL_PINS)
+        self.data_on_mapped = cmd_class.map_value_to_pins(ic.data, _ALL_PINS)
+        self.act_h_mapped = cmd_class.map_value_to_pins(ic.act_h_enable, _ALL_PINS)
+        self.act_l_mapped = cmd_class.map_value_to_pins(ic.act_l_enable, _ALL_PINS)
+        self.wr_h_mapped = cmd_class.map_value_to_pins(ic.act_h_write, _ALL_PINS)
+        self.wr_l_mapped = cmd_class.map_value_to_pins(ic.act_l_write, _ALL_PINS)
+
+    @classmethod
+    def for_ic(cls, cmd_class: type[HardwareBoardCommands], ic: ICDefinition) -> 'ICPinMaps':
+        """Returns the pin mappings for an IC, building them only the first time they are requested
+
+        Args:
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC
+
+        Returns:
+            ICPinMaps: Pin mappings for the IC
+        """
+        key: tuple[type[HardwareBoardCommands], str] = (cmd_class, DumperUtilities.definition_hash(ic))
+
+        if (maps := cls._cache.get(key)) is None:
+            maps = cls(cmd_class, ic)
+            cls._cache[key] = maps
+
+        return maps
+
+    @classmethod
+    def register(cls, cmd_class: type[HardwareBoardCommands], ic: ICDefinition, maps: 'ICPinMaps') -> None:
+        """Registers pin mappings that were computed earlier, e.g. loaded from a cache, so they are not built again
+
+        Args:
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            ic (ICDefinition): Definition of the IC
+            maps (ICPinMaps): Pin mappings for the IC
+        """
+        cls._cache[(cmd_class, DumperUtilities.definition_hash(ic))] = maps
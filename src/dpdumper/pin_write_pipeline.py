@@ -0,0 +1,288 @@
+"""This module contains code to send pin-state commands to the board back to back, without waiting for every response"""
+
+from collections import deque
+from typing import Iterable, Sequence, final
+import logging
+import time
+
+import serial
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+
+_LOGGER = logging.getLogger(__name__)
+
+@final
+class _CaptureSerial:
+    """
+    Stand-in for the serial port, used to record the bytes that a command class sends for a command,
+    and to feed it a response that was already received from the board, so it can be validated.
+    """
+
+    _tx: bytearray
+    _rx: bytearray
+    writes: int
+    timeout: float | None = 0
+    write_timeout: float | None = 0
+    is_open: bool = True
+
+    def __init__(self, response: bytes = b'') -> None:
+        self._tx = bytearray()
+        self._rx = bytearray(response)
+        self.writes = 0
+
+    @property
+    def sent(self) -> bytes:
+        return bytes(self._tx)
+
+    @property
+    def pending(self) -> int:
+        return len(self._rx)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._rx)
+
+    def write(self, data: bytes) -> int:
+        self._tx += data
+        self.writes += 1
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def read(self, size: int = 1) -> bytes:
+        data: bytes = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def read_until(self, expected: bytes = b'\n', size: int | None = None) -> bytes:
+        idx: int = self._rx.find(expected)
+        end: int = len(self._rx) if idx < 0 else idx + len(expected)
+        if size is not None:
+            end = min(end, size)
+        return self.read(end)
+
+    def readline(self, size: int | None = None) -> bytes:
+        return self.read_until(b'\n', size)
+
+    def reset_input_buffer(self) -> None:
+        # The canned response must survive the command class clearing the buffer before sending
+        pass
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+@final
+class _RecordingSerial:
+    """
+    Wrapper around the real serial port that records the bytes sent and received for a command.
+    """
+
+    _ser: serial.Serial
+    _tx: bytearray
+    _rx: bytearray
+    writes: int
+
+    def __init__(self, ser: serial.Serial) -> None:
+        self._ser = ser
+        self._tx = bytearray()
+        self._rx = bytearray()
+        self.writes = 0
+
+    @property
+    def sent(self) -> bytes:
+        return bytes(self._tx)
+
+    @property
+    def received(self) -> bytes:
+        return bytes(self._rx)
+
+    def write(self, data: bytes) -> int | None:
+        self._tx += data
+        self.writes += 1
+        return self._ser.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data: bytes = self._ser.read(size)
+        self._rx += data
+        return data
+
+    def read_until(self, expected: bytes = b'\n', size: int | None = None) -> bytes:
+        data: bytes = self._ser.read_until(expected, size)
+        self._rx += data
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data: bytes = self._ser.readline(size)
+        self._rx += data
+        return data
+
+    def __getattr__(self, name: str):
+        return getattr(self._ser, name)
+
+@final
+class PinWritePipeline:
+    """
+    This class sends groups of pin-state commands to the board keeping a window of commands in flight,
+    and collects the responses afterwards, so that the throughput is bounded by the link speed and not by the round-trip time.
+
+    The encoding of the commands and the size of the responses are learned from the command class itself, with a first
+    command sent in the normal way. If the command class cannot be driven this way, or the board fails to answer
+    correctly to commands sent back to back, the pipeline falls back to sending one command at a time.
+    Groups of commands are the unit of retry: a group whose responses could not be validated is sent again.
+    """
+
+    _ser: serial.Serial
+    _cmd_class: type[HardwareBoardCommands]
+    _window: int
+    _pipelined: bool
+    _calibrated: bool
+    _response_size: int
+
+    commands: int
+    round_trips: int
+
+    def __init__(self, ser: serial.Serial, cmd_class: type[HardwareBoardCommands], window: int, pipelined: bool = True) -> None:
+        """Prepares the pipeline
+
+        Args:
+            ser (serial.Serial): Serial port connected to the board
+            cmd_class (type[HardwareBoardCommands]): Command class for the board
+            window (int): Maximum number of commands that can be waiting for a response
+            pipelined (bool, optional): False to always send one command at a time. Defaults to True.
+        """
+        self._ser = ser
+        self._cmd_class = cmd_class
+        self._window = max(1, window)
+        self._pipelined = pipelined and window > 1
+        self._calibrated = False
+        self._response_size = 0
+        self.commands = 0
+        self.round_trips = 0
+
+    @property
+    def pipelined(self) -> bool:
+        """True if commands are currently being sent back to back"""
+        return self._pipelined
+
+    def write_groups(self, groups: Iterable[Sequence[int]]) -> None:
+        """Sends groups of pin-state commands to the board, in order
+
+        Args:
+            groups (Iterable[Sequence[int]]): Groups of pin states to write. A group is always sent as a whole.
+        """
+        in_flight: deque[Sequence[int]] = deque()
+        in_flight_cmds: int = 0
+
+        for group in groups:
+            if not self._calibrated and self._pipelined:
+                self._calibrate(group[0])
+                self._write_single(group[1:])
+                continue
+
+            if not self._pipelined:
+                self._write_single(group)
+                continue
+
+            # Make room in the window before queueing this group
+            while in_flight and in_flight_cmds + len(group) > self._window:
+                in_flight_cmds -= len(in_flight[0])
+                if not self._collect(in_flight[0]):
+                    self._fall_back(in_flight)
+                    in_flight_cmds = 0
+                    break
+                in_flight.popleft()
+
+            if not self._pipelined:
+                self._write_single(group)
+                continue
+
+            self._ser.write(b''.join(self._encode(value) for value in group))
+            self.commands += len(group)
+            in_flight.append(group)
+            in_flight_cmds += len(group)
+
+        # Collect whatever is still in flight
+        while in_flight:
+            if not self._collect(in_flight[0]):
+                self._fall_back(in_flight)
+                break
+            in_flight.popleft()
+
+    def _write_single(self, group: Sequence[int]) -> None:
+        for value in group:
+            self._cmd_class.write_pins(value, self._ser)
+            self.commands += 1
+            self.round_trips += 1
+
+    def _encode(self, value: int) -> bytes:
+        capture: _CaptureSerial = _CaptureSerial()
+        self._cmd_class.write_pins(value, capture) # type: ignore
+        return capture.sent
+
+    def _validate(self, value: int, response: bytes) -> bool:
+        capture: _CaptureSerial = _CaptureSerial(response)
+        try:
+            result: int | None = self._cmd_class.write_pins(value, capture) # type: ignore
+        except Exception:
+            return False
+
+        # The whole response must have been consumed, or we would be misaligned with the next one
+        return result is not None and capture.pending == 0
+
+    def _calibrate(self, value: int) -> None:
+        # Pipelining relies on an assumption about the command classes of dupicolib that is not part of their documented interface:
+        # write_pins() sends a command with a single write to the port, whose encoding depends only on the value and whose length
+        # does not, then reads back a response of fixed size that it validates on its own. Anything else falls back to one command at a time.
+        self._calibrated = True
+
+        recorder: _RecordingSerial = _RecordingSerial(self._ser)
+        result: int | None = self._cmd_class.write_pins(value, recorder) # type: ignore
+        self.commands += 1
+        self.round_trips += 1
+
+        try:
+            capture: _CaptureSerial = _CaptureSerial()
+            self._cmd_class.write_pins(value, capture) # type: ignore
+            encoded: bytes = capture.sent
+            # A different value must give a command of the same size, sent the same way
+            other_capture: _CaptureSerial = _CaptureSerial()
+            self._cmd_class.write_pins(0 if value else 1, other_capture) # type: ignore
+        except Exception as ex:
+            _LOGGER.warning(f'Unable to encode commands for pipelining ({ex}), falling back to one command at a time.')
+            self._pipelined = False
+            return
+
+        if recorder.writes != 1 or capture.writes != 1 or other_capture.writes != 1 or len(other_capture.sent) != len(encoded):
+            _LOGGER.warning(f'Command class sent {recorder.writes} writes for a single command, or commands of variable size, falling back to one command at a time.')
+            self._pipelined = False
+            return
+
+        if result is None or not recorder.received or encoded != recorder.sent or not self._validate(value, recorder.received):
+            _LOGGER.warning('Command class did not answer with a single response of fixed size, falling back to one command at a time.')
+            self._pipelined = False
+            return
+
+        self._response_size = len(recorder.received)
+        _LOGGER.debug(f'Pipelining enabled, commands of {len(encoded)} bytes, responses of {self._response_size} bytes, window of {self._window} commands')
+
+    def _collect(self, group: Sequence[int]) -> bool:
+        response: bytes = self._ser.read(self._response_size * len(group))
+        self.round_trips += 1
+
+        if len(response) != self._response_size * len(group):
+            return False
+
+        return all(self._validate(value, response[idx * self._response_size:(idx + 1) * self._response_size]) for idx, value in enumerate(group))
+
+    def _fall_back(self, in_flight: deque[Sequence[int]]) -> None:
+        _LOGGER.warning('Board did not handle commands sent back to back, falling back to one command at a time.')
+        self._pipelined = False
+
+        # Let the board finish whatever it was processing, then drop the leftover responses
+        time.sleep(0.1)
+        self._ser.reset_input_buffer()
+
+        # Groups that were not acknowledged are sent again, pin states are idempotent
+        while in_flight:
+            self._write_single(in_flight.popleft())
@@ -0,0 +1,96 @@
+"""This module contains the analysis of the samples taken before a read, to spot an empty socket, a blank chip or a bus that is not driven"""
+
+from enum import Enum
+from typing import NamedTuple, final
+
+from dpdumper.ic_dump import xor_planes
+
+PREFLIGHT_MODES: list[str] = ['check', 'warn', 'off']
+
+class BusState(Enum):
+    OK = 'ok'
+    EMPTY = 'empty'
+    FLOATING = 'floating'
+    BLANK = 'blank'
+    STUCK = 'stuck'
+
+# States that make the whole read pointless
+FAILED_STATES: set[BusState] = {BusState.EMPTY, BusState.FLOATING}
+
+@final
+class PreflightResult(NamedTuple):
+    state: BusState
+    data_width_bits: int
+    value: int | None
+    hiz_bits: int
+    always_hiz_bits: int
+    samples: int
+
+    @property
+    def failed(self) -> bool:
+        return self.state in FAILED_STATES
+
+    def describe(self) -> str:
+        """Returns a human readable explanation of the result"""
+        digits: int = -(self.data_width_bits // -4)
+
+        match self.state:
+            case BusState.EMPTY:
+                text = 'every data line is in Hi-Z, the socket looks empty or the IC is not enabled'
+            case BusState.FLOATING:
+                text = 'the data lines follow the address lines, the bus is floating or the adapter is wrong'
+            case BusState.BLANK:
+                text = 'every sampled entry has all the bits set, the IC looks blank'
+            case BusState.STUCK:
+                text = f'every sampled entry reads {self.value:0{digits}X}, the data bus looks stuck'
+            case _:
+                text = 'the sampled data looks plausible'
+
+        if self.always_hiz_bits and self.state != BusState.EMPTY:
+            lines: list[int] = [bit for bit in range(self.data_width_bits) if (self.always_hiz_bits >> bit) & 1]
+            text += f', data line{"s" if len(lines) > 1 else ""} {", ".join(f"D{bit}" for bit in lines)} {"are" if len(lines) > 1 else "is"} always in Hi-Z'
+
+        return text
+
+def _entries(plane: bytes, entry_width: int) -> list[int]:
+    return [int.from_bytes(plane[offset:offset + entry_width]) for offset in range(0, len(plane), entry_width)]
+
+def analyze_samples(samples: list[tuple[int, bytes, bytes]], data_width_bits: int) -> PreflightResult:
+    """Classifies the state of the data bus from some blocks read with the data lines pulled low and high
+
+    Args:
+        samples (list[tuple[int, bytes, bytes]]): Tuples of first address of the block, data read with the data lines pulled low and with the data lines pulled high
+        data_width_bits (int): Number of data lines
+
+    Returns:
+        PreflightResult: The state of the bus
+    """
+    entry_width: int = -(data_width_bits // -8)
+    data_mask: int = (1 << data_width_bits) - 1
+
+    values: list[int] = []
+    addresses: list[int] = []
+    hiz_bits: int = 0
+    always_hiz_bits: int = data_mask
+
+    for base_address, data_low, data_high in samples:
+        entries: list[int] = _entries(data_low, entry_width)
+        values.extend(entries)
+        addresses.extend(range(base_address, base_address + len(entries)))
+
+        for z in _entries(xor_planes(data_low, data_high), entry_width):
+            hiz_bits |= z
+            always_hiz_bits &= z
+
+    state: BusState = BusState.OK
+    value: int | None = None
+
+    if always_hiz_bits == data_mask:
+        state = BusState.EMPTY
+    elif len(set(values)) == 1:
+        value = values[0]
+        state = BusState.BLANK if value == data_mask else BusState.STUCK
+    elif all(entry == address & data_mask for entry, address in zip(values, addresses)):
+        state = BusState.FLOATING
+
+    return PreflightResult(state, data_width_bits, value, hiz_bits, always_hiz_bits, len(values))
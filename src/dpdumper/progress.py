@@ -0,0 +1,256 @@
+"""This module contains the progress reporting of transfers: the transfer loops only post counters, rendering happens on a separate thread"""
+
+import sys
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple, TextIO, final
+
+# Seconds between two refreshes of the progress
+REFRESH_INTERVAL: float = 0.1
+
+RENDERERS: list[str] = ['bar', 'quiet', 'jsonl']
+
+@final
+class ProgressState(NamedTuple):
+    done: int
+    total: int
+    unit: str
+    seconds: float
+
+    @property
+    def percent(self) -> float:
+        return 100 * self.done / self.total if self.total else 100.0
+
+    @property
+    def rate(self) -> float | None:
+        """Units transferred per second, None if it cannot be computed yet"""
+        return self.done / self.seconds if self.seconds > 0 and self.done else None
+
+    @property
+    def eta(self) -> float | None:
+        """Seconds until the transfer is complete, None if they cannot be estimated yet"""
+        rate: float | None = self.rate
+        return (self.total - self.done) / rate if rate else None
+
+    def describe(self) -> str:
+        """Returns the percentage, throughput and remaining time in a human readable form"""
+        text: str = f'{self.percent:.1f}%'
+
+        if (rate := self.rate) is not None:
+            text += f' {rate / 1024:.1f}KB/s' if self.unit == 'B' else f' {rate:.0f} {self.unit}/s'
+
+        if self.done >= self.total:
+            text += f' in {_format_seconds(self.seconds)}'
+        elif (eta := self.eta) is not None:
+            text += f' ETA {_format_seconds(eta)}'
+
+        return text
+
+def _format_seconds(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds + 0.5), 60)
+    return f'{minutes // 60}:{minutes % 60:02d}:{secs:02d}' if minutes >= 60 else f'{minutes}:{secs:02d}'
+
+class ProgressRenderer:
+    """
+    Base class for the renderers of the progress. update() is called at a fixed rate from the reporting thread while a transfer
+    is running, finish() once from the transfer thread when it completes. This base class shows nothing.
+    """
+
+    def update(self, state: ProgressState) -> None:
+        pass
+
+    def finish(self, state: ProgressState) -> None:
+        pass
+
+@final
+class BarRenderer(ProgressRenderer):
+    """Draws a progress bar in place on the terminal"""
+
+    _out: TextIO | None
+    _length: int
+    _last: str
+
+    def __init__(self, out: TextIO | None = None, length: int = 50) -> None:
+        self._out = out
+        self._length = length
+        self._last = ''
+
+    def _draw(self, state: ProgressState, end: str) -> None:
+        filled: int = self._length * state.done // state.total if state.total else self._length
+        line: str = f'\r |{"█" * filled}{"-" * (self._length - filled)}| {state.describe()}'
+        # Standard output is looked up every time, it might have been redirected after the renderer was built
+        out: TextIO = self._out or sys.stdout
+        out.write(line.ljust(len(self._last)) + end)
+        out.flush()
+        self._last = line if not end else ''
+
+    def update(self, state: ProgressState) -> None:
+        self._draw(state, '')
+
+    def finish(self, state: ProgressState) -> None:
+        self._draw(state, '\n')
+
+@final
+class JsonLinesRenderer(ProgressRenderer):
+    """Writes the progress as lines of JSON, for tools that drive dpdumper"""
+
+    _out: TextIO | None
+
+    def __init__(self, out: TextIO | None = None) -> None:
+        self._out = out
+
+    def _emit(self, event: str, state: ProgressState) -> None:
+        out: TextIO = self._out or sys.stderr
+        out.write(json.dumps({
+            'event': event,
+            'done': state.done,
+            'total': state.total,
+            'unit': state.unit,
+            'seconds': round(state.seconds, 3),
+            'rate': round(state.rate, 1) if state.rate is not None else None,
+            'eta': round(state.eta, 1) if state.eta is not None else None
+        }) + '\n')
+        out.flush()
+
+    def update(self, state: ProgressState) -> None:
+        self._emit('progress', state)
+
+    def finish(self, state: ProgressState) -> None:
+        self._emit('done', state)
+
+def build_renderer(name: str) -> ProgressRenderer:
+    """Returns the renderer with the given name, one of RENDERERS"""
+    match name:
+        case 'bar':
+            return BarRenderer()
+        case 'jsonl':
+            return JsonLinesRenderer()
+        case 'quiet':
+            return ProgressRenderer()
+        case _:
+            raise ValueError(f'Unknown progress renderer {name}')
+
+@final
+class ProgressReporter:
+    """
+    This class tracks the transfer in progress, and renders it periodically from its own thread.
+    Transfers post their counters with post(): a transfer starts when the total changes or the counter goes back,
+    and ends when the counter reaches the total, so the posting code does not need to mark where transfers begin.
+    """
+
+    _renderer: ProgressRenderer
+    _interval: float
+    _lock: threading.Lock
+    _stop: threading.Event
+    _thread: threading.Thread | None
+    _active: bool
+    _done: int
+    _total: int
+    _unit: str
+    _start: float
+    _rendered: int
+
+    def __init__(self, renderer: ProgressRenderer, interval: float = REFRESH_INTERVAL) -> None:
+        self._renderer = renderer
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._active = False
+        self._done = 0
+        self._total = 0
+        self._unit = 'B'
+        self._start = 0
+        self._rendered = -1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='dpdumper-progress', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.end()
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _state(self) -> ProgressState:
+        return ProgressState(min(self._done, self._total), self._total, self._unit, time.perf_counter() - self._start)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                # Redraw only if something moved since the last refresh
+                if self._active and self._done != self._rendered:
+                    self._rendered = self._done
+                    self._renderer.update(self._state())
+
+    def _begin(self, total: int, unit: str) -> None:
+        with self._lock:
+            if self._active:
+                self._renderer.finish(self._state())
+            self._active = True
+            self._done = 0
+            self._total = total
+            self._unit = unit
+            self._start = time.perf_counter()
+            self._rendered = -1
+
+    def post(self, done: int, total: int, unit: str = 'B') -> None:
+        """Updates the counter of the current transfer. This is all the work done in the transfer loop.
+
+        Args:
+            done (int): Units transferred so far
+            total (int): Units to transfer
+            unit (str, optional): Unit of the counters, 'B' for bytes. Defaults to 'B'.
+        """
+        if not self._active or total != self._total or done < self._done:
+            self._begin(total, unit)
+
+        self._done = done
+
+        if done >= total:
+            self.end()
+
+    def end(self) -> None:
+        """Renders the final state of the current transfer, even if it did not complete"""
+        with self._lock:
+            if self._active:
+                self._active = False
+                self._renderer.finish(self._state())
+
+# Progress is reported only while a command runs inside reporting(), every thread has its own reporter
+_CURRENT: ContextVar[ProgressReporter | None] = ContextVar('progress_reporter', default=None)
+
+@contextmanager
+def reporting(renderer: ProgressRenderer, interval: float = REFRESH_INTERVAL) -> Iterator[ProgressReporter]:
+    """Reports the progress of the transfers running in the current context
+
+    Args:
+        renderer (ProgressRenderer): Renderer that shows the progress
+        interval (float, optional): Seconds between two refreshes. Defaults to REFRESH_INTERVAL.
+
+    Yields:
+        ProgressReporter: The reporter
+    """
+    reporter: ProgressReporter = ProgressReporter(renderer, interval)
+    reporter.start()
+    token = _CURRENT.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _CURRENT.reset(token)
+        reporter.stop()
+
+def current() -> ProgressReporter | None:
+    """Returns the reporter of the current context, None if progress is not being reported"""
+    return _CURRENT.get()
+
+def end() -> None:
+    """Closes the transfer in progress, if any, e.g. when it was interrupted by an error"""
+    if (reporter := _CURRENT.get()) is not None:
+        reporter.end()
@@ -0,0 +1,174 @@
+"""This module contains code to checkpoint reads on disk, so they can be resumed after a failure"""
+
+import os
+import json
+import logging
+
+from typing import Any, final
+
+from dpdumperlib.ic.ic_definition import ICDefinition
+
+from dpdumper.dumper_utilities import BoardInfo, DumperUtilities
+from dpdumper.ic_dump import ICDump
+
+_LOGGER = logging.getLogger(__name__)
+
+@final
+class ReadCheckpoint:
+    """
+    This class tracks which blocks of addresses were already read from an IC.
+
+    The state is kept in a JSON sidecar file next to the output table, while the data read so far
+    is stored in a second file, holding the data plane followed by the Hi-Z plane (if checked).
+    Both files are removed once the read is complete.
+    """
+
+    _FORMAT_VERSION: int = 1
+    _SIDECAR_EXTENSION: str = '.dpck'
+    _PLANES_EXTENSION: str = '.dpck.bin'
+
+    _sidecar_path: str
+    _planes_path: str
+    _ic: ICDefinition
+    _check_hiz: bool
+    _block_bits: int
+    _state: dict[str, Any]
+    _completed: set[int]
+
+    def __init__(self, outf: str, ic: ICDefinition, board_info: BoardInfo, check_hiz: bool, block_bits: int, resume: bool = False) -> None:
+        """Prepares a checkpoint for a read, optionally continuing one that was interrupted
+
+        Args:
+            outf (str): Path of the output table of the read, the checkpoint files are placed next to it
+            ic (ICDefinition): Definition of the IC being read
+            board_info (BoardInfo): Model and firmware of the board doing the read
+            check_hiz (bool): True if the read checks for Hi-Z pins
+            block_bits (int): Every block will contain 1 << block_bits addresses. Ignored when resuming.
+            resume (bool, optional): True to continue from an existing checkpoint. Defaults to False.
+
+        Raises:
+            ValueError: If the existing checkpoint was created for a different IC, board or read mode
+        """
+        self._sidecar_path = outf + self._SIDECAR_EXTENSION
+        self._planes_path = outf + self._PLANES_EXTENSION
+        self._ic = ic
+        self._check_hiz = check_hiz
+
+        identity: dict[str, Any] = {
+            'definition_hash': DumperUtilities.definition_hash(ic),
+            'model': board_info.model,
+            'fw_version': board_info.fw_version,
+            'check_hiz': check_hiz
+        }
+
+        if resume and os.path.exists(self._sidecar_path):
+            with open(self._sidecar_path, 'rt') as f:
+                self._state = json.load(f)
+
+            if self._state.get('version') != self._FORMAT_VERSION:
+                raise ValueError(f'Checkpoint {self._sidecar_path} has unsupported format version {self._state.get('version')}')
+
+            for key, value in identity.items():
+                if self._state.get(key) != value:
+                    raise ValueError(f'Checkpoint {self._sidecar_path} does not match the current setup: {key} was {self._state.get(key)}, now is {value}')
+
+            if not os.path.exists(self._planes_path):
+                raise ValueError(f'Checkpoint {self._sidecar_path} is missing its data file {self._planes_path}')
+
+            self._block_bits = self._state['block_bits']
+            self._completed = {addr for start, end in self._state['completed'] for addr in range(start, end, 1 << self._block_bits)}
+            _LOGGER.info(f'Resuming read from checkpoint {self._sidecar_path}, {len(self._completed)} blocks already read')
+        else:
+            if resume:
+                _LOGGER.warning(f'Resume was requested, but no checkpoint was found at {self._sidecar_path}. Starting from scratch.')
+
+            self._block_bits = min(block_bits, len(ic.address))
+            self._completed = set()
+            self._state = {'version': self._FORMAT_VERSION, **identity, 'block_bits': self._block_bits}
+
+            # Preallocate the planes, blocks will be written at their offset as they arrive
+            with open(self._planes_path, 'wb') as f:
+                f.truncate(self._plane_size * (2 if check_hiz else 1))
+
+            self._save_state()
+
+    @property
+    def _plane_size(self) -> int:
+        return (1 << len(self._ic.address)) * -(len(self._ic.data) // -8)
+
+    @property
+    def block_bits(self) -> int:
+        """Every block will contain 1 << block_bits addresses"""
+        return self._block_bits
+
+    @property
+    def sidecar_path(self) -> str:
+        return self._sidecar_path
+
+    def missing_blocks(self) -> list[int]:
+        """Returns the base addresses of the blocks that still need to be read, in order"""
+        return [addr for addr in range(0, 1 << len(self._ic.address), 1 << self._block_bits) if addr not in self._completed]
+
+    def store_block(self, base_address: int, block: ICDump) -> None:
+        """Saves a block to disk and marks it as completed
+
+        Args:
+            base_address (int): Address of the first entry in the block
+            block (ICDump): Data of the block
+        """
+        offset: int = base_address * block.entry_width
+
+        with open(self._planes_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(block.data)
+
+            if self._check_hiz:
+                f.seek(self._plane_size + offset)
+                f.write(block.z_plane)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._completed.add(base_address)
+        self._save_state()
+
+    def load_dump(self) -> ICDump:
+        """Loads the complete dump from the checkpoint
+
+        Raises:
+            IOError: If some blocks were not read yet
+
+        Returns:
+            ICDump: The data read from the IC
+        """
+        if (missing := len(self.missing_blocks())):
+            raise IOError(f'Checkpoint {self._sidecar_path} still has {missing} blocks to read')
+
+        with open(self._planes_path, 'rb') as f:
+            data_plane: bytes = f.read(self._plane_size)
+            z_plane: bytes | None = f.read(self._plane_size) if self._check_hiz else None
+
+        return ICDump(data_plane, len(self._ic.data), z_plane)
+
+    def remove(self) -> None:
+        """Deletes the checkpoint files"""
+        for path in (self._sidecar_path, self._planes_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _save_state(self) -> None:
+        # Store the completed blocks as merged address ranges, with the end excluded
+        block_len: int = 1 << self._block_bits
+        ranges: list[list[int]] = []
+        for addr in sorted(self._completed):
+            if ranges and ranges[-1][1] == addr:
+                ranges[-1][1] = addr + block_len
+            else:
+                ranges.append([addr, addr + block_len])
+        self._state['completed'] = ranges
+
+        # Write to a temporary file and swap it in, so an interruption never leaves a truncated sidecar
+        tmp_path: str = self._sidecar_path + '.tmp'
+        with open(tmp_path, 'wt') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self._sidecar_path)
@@ -0,0 +1,330 @@
+"""This module contains an on-disk index of known ROM images, to identify dumps by their hashes or by the blocks they have in common"""
+
+import os
+import zlib
+import fnmatch
+import sqlite3
+import hashlib
+
+from typing import Any, NamedTuple, final
+
+# Images are split in blocks of this many bytes, and every block is hashed on its own
+BLOCK_SIZE: int = 4096
+
+# Near matches must share at least this fraction of their blocks with the dump
+NEAR_MATCH_FRACTION: float = 0.5
+
+_SCHEMA: str = '''
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS roms (
+    id INTEGER PRIMARY KEY,
+    sha1 TEXT NOT NULL UNIQUE,
+    crc32 INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT,
+    stored INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS roms_crc32 ON roms (crc32);
+CREATE TABLE IF NOT EXISTS blocks (
+    rom_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    PRIMARY KEY (rom_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS blocks_hash ON blocks (hash, idx);
+CREATE TABLE IF NOT EXISTS block_data (hash BLOB PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID;
+'''
+
+@final
+class RomFingerprint(NamedTuple):
+    size: int
+    sha1: str
+    crc32: int
+    block_hashes: list[bytes]
+
+@final
+class RomMatch(NamedTuple):
+    name: str
+    path: str | None
+    sha1: str
+    size: int
+    matching_blocks: int
+    total_blocks: int
+
+    @property
+    def exact(self) -> bool:
+        return self.matching_blocks == self.total_blocks
+
+    @property
+    def differing_blocks(self) -> int:
+        return self.total_blocks - self.matching_blocks
+
+@final
+class Fingerprinter:
+    """
+    This class computes the fingerprint of an image fed in pieces of any size, e.g. as blocks stream in from the board.
+    The complete blocks can be kept, to store them in the index afterwards.
+    """
+
+    _sha1: Any
+    _crc32: int
+    _size: int
+    _pending: bytes
+    _keep_blocks: bool
+    block_hashes: list[bytes]
+    blocks: list[bytes]
+
+    def __init__(self, keep_blocks: bool = False) -> None:
+        self._sha1 = hashlib.sha1()
+        self._crc32 = 0
+        self._size = 0
+        self._pending = b''
+        self._keep_blocks = keep_blocks
+        self.block_hashes = []
+        self.blocks = []
+
+    def _add_block(self, block: bytes) -> None:
+        self.block_hashes.append(hashlib.sha1(block).digest())
+        if self._keep_blocks:
+            self.blocks.append(block)
+
+    def update(self, data: bytes) -> None:
+        self._sha1.update(data)
+        self._crc32 = zlib.crc32(data, self._crc32)
+        self._size += len(data)
+
+        data = self._pending + data
+        full: int = len(data) - len(data) % BLOCK_SIZE
+        for offset in range(0, full, BLOCK_SIZE):
+            self._add_block(data[offset:offset + BLOCK_SIZE])
+        self._pending = data[full:]
+
+    def fingerprint(self) -> RomFingerprint:
+        """Returns the fingerprint of the data fed so far. The last block can be shorter than the others"""
+        if self._pending:
+            self._add_block(self._pending)
+            self._pending = b''
+
+        return RomFingerprint(self._size, self._sha1.hexdigest(), self._crc32, list(self.block_hashes))
+
+def fingerprint(data: bytes, keep_blocks: bool = False) -> tuple[RomFingerprint, list[bytes]]:
+    """Computes the fingerprint of a whole image
+
+    Args:
+        data (bytes): The image
+        keep_blocks (bool, optional): True to return the blocks of the image too. Defaults to False.
+
+    Returns:
+        tuple[RomFingerprint, list[bytes]]: The fingerprint, and the blocks if they were requested
+    """
+    fingerprinter: Fingerprinter = Fingerprinter(keep_blocks)
+    fingerprinter.update(data)
+    return (fingerprinter.fingerprint(), fingerprinter.blocks)
+
+# Files written next to the outputs by the checkpoints of interrupted reads
+_CHECKPOINT_SUFFIXES: tuple[str, ...] = ('.dpck', '.dpck.bin')
+
+def is_image_file(path: str) -> bool:
+    """Returns True for a dump container, or a file whose size fits a raw image of a power of two entries of 1 to 4 bytes
+    that is neither a table output nor a checkpoint file"""
+    if path.endswith(_CHECKPOINT_SUFFIXES):
+        return False
+
+    size: int = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        magic: bytes = f.read(6)
+
+    if magic == b'DPDUMP':
+        return True
+
+    # Without the power of two factor, entries of 1, 2 or 4 bytes leave 1 and entries of 3 bytes leave 3
+    return size > 0 and size // (size & -size) in (1, 3) and magic != b'Name:\t'
+
+def read_image(path: str) -> bytes:
+    """Returns the image in a binary file or, for a dump container, its data plane, which is what a read writes in the binary output by default"""
+    with open(path, 'rb') as f:
+        magic: bytes = f.read(6)
+
+    if magic == b'DPDUMP':
+        import dpdumper.dump_container as DumpContainer
+
+        with DumpContainer.DumpContainerReader(path) as reader:
+            return b''.join(block.data for _, block in reader.blocks(verify=True))
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+@final
+class RomIndex:
+    """
+    This class keeps the fingerprints of known ROM images in a SQLite database: SHA1SUM and CRC32 of the whole image
+    plus the hash of every block, all indexed, so a dump is identified with a few lookups regardless of the size of the index.
+    Images with the same SHA1SUM are stored once. Optionally the blocks of the images are stored too, each distinct block only once,
+    so that the images can be extracted again.
+    """
+
+    _path: str
+    _db: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        """Opens the index, creating it if it does not exist
+
+        Args:
+            path (str): Path of the index file
+        """
+        self._path = path
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.executescript(_SCHEMA)
+
+        block_size: tuple[int] | None = self._db.execute('SELECT value FROM settings WHERE key = ?', ('block_size',)).fetchone()
+        if block_size is None:
+            with self._db:
+                self._db.execute('INSERT INTO settings VALUES (?, ?)', ('block_size', BLOCK_SIZE))
+        elif block_size[0] != BLOCK_SIZE:
+            self._db.close()
+            raise ValueError(f'ROM index {path} uses blocks of {block_size[0]} bytes, {BLOCK_SIZE} are expected')
+
+    def __enter__(self) -> 'RomIndex':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM roms').fetchone()[0]
+
+    def add(self, name: str, path: str | None, rom: RomFingerprint, blocks: list[bytes] | None = None) -> bool:
+        """Adds an image to the index
+
+        Args:
+            name (str): Name of the image
+            path (str | None): Where the image can be found, if anywhere
+            rom (RomFingerprint): Fingerprint of the image
+            blocks (list[bytes] | None, optional): If passed, the blocks of the image are stored in the index. Defaults to None.
+
+        Returns:
+            bool: False if an image with the same SHA1SUM was already in the index
+        """
+        with self._db:
+            cursor: sqlite3.Cursor = self._db.execute('INSERT OR IGNORE INTO roms (sha1, crc32, size, name, path, stored) VALUES (?, ?, ?, ?, ?, ?)',
+                                                      (rom.sha1, rom.crc32, rom.size, name, path, blocks is not None))
+            if not cursor.rowcount:
+                return False
+
+            rom_id: int = cursor.lastrowid # type: ignore
+            self._db.executemany('INSERT INTO blocks VALUES (?, ?, ?)', ((rom_id, idx, block_hash) for idx, block_hash in enumerate(rom.block_hashes)))
+
+            if blocks is not None:
+                self._db.executemany('INSERT OR IGNORE INTO block_data VALUES (?, ?)', zip(rom.block_hashes, blocks))
+
+        return True
+
+    def add_file(self, path: str, store: bool = False) -> bool:
+        """Adds a binary image or a dump container to the index, named after the file
+
+        Args:
+            path (str): Path of the file
+            store (bool, optional): True to store the blocks of the image in the index. Defaults to False.
+
+        Returns:
+            bool: False if the image was already in the index
+        """
+        rom, blocks = fingerprint(read_image(path), store)
+        return self.add(os.path.basename(path), os.path.abspath(path), rom, blocks if store else None)
+
+    def add_directory(self, directory: str, pattern: str = '*', store: bool = False) -> tuple[int, int]:
+        """Adds all the images in a directory tree whose name matches a pattern. Files that is_image_file() rejects are skipped
+
+        Args:
+            directory (str): Root of the tree
+            pattern (str, optional): Shell pattern for the names of the files. Defaults to '*'.
+            store (bool, optional): True to store the blocks of the images in the index. Defaults to False.
+
+        Returns:
+            tuple[int, int]: Number of images added, and number of images that were already in the index
+        """
+        added: int = 0
+        skipped: int = 0
+        index_path: str = os.path.abspath(self._path)
+
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for file_name in sorted(fnmatch.filter(files, pattern)):
+                path: str = os.path.join(root, file_name)
+                # Do not index the index, or files that cannot be a dump
+                if os.path.abspath(path) == index_path or not is_image_file(path):
+                    continue
+
+                if self.add_file(path, store):
+                    added += 1
+                else:
+                    skipped += 1
+
+        return (added, skipped)
+
+    def lookup(self, rom: RomFingerprint, max_results: int = 5) -> list[RomMatch]:
+        """Looks for an image in the index
+
+        Args:
+            rom (RomFingerprint): Fingerprint of the image
+            max_results (int, optional): Maximum number of near matches to return. Defaults to 5.
+
+        Returns:
+            list[RomMatch]: The exact match if there is one, otherwise the images that share at least NEAR_MATCH_FRACTION
+                            of their blocks with it, at the same offsets, best first
+        """
+        row: tuple[str, str | None, str, int] | None = self._db.execute('SELECT name, path, sha1, size FROM roms WHERE sha1 = ?', (rom.sha1,)).fetchone()
+        if row is not None:
+            name, path, sha1, size = row
+            return [RomMatch(name, path, sha1, size, len(rom.block_hashes), len(rom.block_hashes))]
+
+        if not rom.block_hashes:
+            return []
+
+        # Blocks count only if they sit at the same offset in both images.
+        # CROSS JOIN keeps the few blocks of the dump as the outer loop, so the index on the hashes is used instead of scanning every block
+        self._db.execute('CREATE TEMP TABLE IF NOT EXISTS query_blocks (idx INTEGER PRIMARY KEY, hash BLOB NOT NULL)')
+        self._db.execute('DELETE FROM query_blocks')
+        self._db.executemany('INSERT INTO query_blocks VALUES (?, ?)', enumerate(rom.block_hashes))
+
+        rows: list[tuple] = self._db.execute('''
+            SELECT roms.name, roms.path, roms.sha1, roms.size, shared.matching
+            FROM (SELECT blocks.rom_id AS rom_id, COUNT(*) AS matching
+                  FROM query_blocks CROSS JOIN blocks ON blocks.hash = query_blocks.hash AND blocks.idx = query_blocks.idx
+                  GROUP BY blocks.rom_id) AS shared
+            JOIN roms ON roms.id = shared.rom_id
+        ''').fetchall()
+
+        matches: list[RomMatch] = []
+        for name, path, sha1, size, matching in rows:
+            total: int = max(-(size // -BLOCK_SIZE), len(rom.block_hashes))
+            if matching >= total * NEAR_MATCH_FRACTION:
+                matches.append(RomMatch(name, path, sha1, size, matching, total))
+
+        matches.sort(key=lambda match: (match.differing_blocks, match.name))
+        return matches[:max_results]
+
+    def extract(self, sha1: str) -> bytes:
+        """Rebuilds an image from the blocks stored in the index
+
+        Args:
+            sha1 (str): SHA1SUM of the image
+
+        Raises:
+            KeyError: If the image is not in the index, or its blocks were not stored
+
+        Returns:
+            bytes: The image
+        """
+        row: tuple[int, int] | None = self._db.execute('SELECT id, stored FROM roms WHERE sha1 = ?', (sha1.lower(),)).fetchone()
+        if row is None or not row[1]:
+            raise KeyError(f'No image with SHA1SUM {sha1} is stored in the index')
+
+        return b''.join(data for (data,) in self._db.execute('''
+            SELECT block_data.data FROM blocks JOIN block_data ON block_data.hash = blocks.hash
+            WHERE blocks.rom_id = ? ORDER BY blocks.idx
+        ''', (row[0],)))
@@ -0,0 +1,134 @@
+"""This module contains code to collect a timing breakdown of a command, phase by phase, and to emit it as JSON"""
+
+import json
+import time
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, ContextManager, Iterator, final
+
+@final
+class RunStats:
+    """
+    This class accumulates the time spent in every phase of a command, how many times the phase was entered
+    and how many bytes it moved, plus free-form counters (e.g. commands sent to the board) and information on the run.
+    Phases are exclusive: the time spent in a phase nested inside another one is counted only for the inner phase.
+    """
+
+    _start: float
+    _phases: dict[str, list[float]]
+    _nested: list[float]
+    counters: dict[str, int]
+    info: dict[str, Any]
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self._phases = {}
+        # Time spent in the inner phases of every phase that is running, outermost first
+        self._nested = []
+        self.counters = {}
+        self.info = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start_time: float = time.perf_counter()
+        self._nested.append(0)
+        try:
+            yield
+        finally:
+            elapsed: float = time.perf_counter() - start_time
+            entry: list[float] = self._phases.setdefault(name, [0, 0, 0])
+            entry[0] += elapsed - self._nested.pop()
+            entry[1] += 1
+
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def add_bytes(self, name: str, size: int) -> None:
+        self._phases.setdefault(name, [0, 0, 0])[2] += size
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the collected statistics in a form that can be serialized to JSON"""
+        phases: dict[str, dict[str, Any]] = {}
+
+        for name, (seconds, calls, size) in self._phases.items():
+            phases[name] = {'seconds': round(seconds, 6), 'calls': int(calls)}
+            if size:
+                phases[name]['bytes'] = int(size)
+                phases[name]['bytes_per_second'] = round(size / seconds, 1) if seconds > 0 else None
+
+        return {
+            **self.info,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'total_seconds': round(time.perf_counter() - self._start, 6),
+            'phases': phases,
+            'counters': dict(self.counters)
+        }
+
+# Statistics are collected only while a command runs inside collect(), every thread has its own
+_CURRENT: ContextVar[RunStats | None] = ContextVar('run_stats', default=None)
+
+@contextmanager
+def collect() -> Iterator[RunStats]:
+    """Starts collecting statistics for the code running in the current context
+
+    Yields:
+        RunStats: The statistics being collected
+    """
+    stats: RunStats = RunStats()
+    token = _CURRENT.set(stats)
+    try:
+        yield stats
+    finally:
+        _CURRENT.reset(token)
+
+def phase(name: str) -> ContextManager[None]:
+    """Times a phase of the command, does nothing if statistics are not being collected"""
+    stats: RunStats | None = _CURRENT.get()
+    return stats.phase(name) if stats else nullcontext()
+
+def add_bytes(name: str, size: int) -> None:
+    """Adds to the bytes moved by a phase, does nothing if statistics are not being collected"""
+    if (stats := _CURRENT.get()) is not None:
+        stats.add_bytes(name, size)
+
+def count(name: str, value: int = 1) -> None:
+    """Increments a counter, does nothing if statistics are not being collected"""
+    if (stats := _CURRENT.get()) is not None:
+        stats.count(name, value)
+
+def set_info(**info: Any) -> None:
+    """Records information on the run (board, IC, settings), does nothing if statistics are not being collected"""
+    if (stats := _CURRENT.get()) is not None:
+        stats.info.update(info)
+
+def emit(stats: RunStats, path: str) -> None:
+    """Appends the statistics as a single line of JSON to a file, so runs can be tracked over time
+
+    Args:
+        stats (RunStats): Statistics to emit
+        path (str): File to append to, or '-' to print them on the standard output
+    """
+    line: str = json.dumps(stats.to_dict())
+
+    if path == '-':
+        print(line)
+        return
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+def print_summary(stats: RunStats) -> None:
+    """Prints a human readable breakdown of the statistics"""
+    data: dict[str, Any] = stats.to_dict()
+
+    print(f'Time breakdown, {data["total_seconds"]:.3f} seconds in total:')
+    for name, entry in data['phases'].items():
+        rate: str = f'\t{entry["bytes_per_second"] / 1024:.1f}KB/s' if entry.get('bytes_per_second') else ''
+        print(f'\t{name:<16}{entry["seconds"]:>10.3f}s\t{entry["calls"]} calls{rate}')
+
+    for name, value in data['counters'].items():
+        print(f'\t{name:<16}{value:>10}')
@@ -0,0 +1,110 @@
+"""This module contains the loading of the files written into an IC, mapped in memory and viewed as arrays of entries"""
+
+import os
+import sys
+import mmap
+
+from array import array
+from typing import BinaryIO, Literal, Sequence, final
+
+_Typecode = Literal['B', 'H', 'I', 'L', 'Q']
+_TYPECODES: tuple[_Typecode, ...] = ('B', 'H', 'I', 'L', 'Q')
+
+def _typecode(entry_width: int) -> _Typecode | None:
+    # Unsigned array type with exactly the size of an entry, if there is one
+    return next((code for code in _TYPECODES if array(code).itemsize == entry_width), None)
+
+@final
+class WriteInput:
+    """
+    This class maps a file to write into an IC in memory, and exposes its content as a sequence of entries.
+    When the byte order of the file matches the one of the host, the entries are a typed view on the mapped file and nothing is copied,
+    otherwise the file is copied once in a typed array and byte swapped in bulk.
+    Entries whose width has no matching array type are converted one by one.
+    """
+
+    path: str
+    entry_width: int
+    entries: Sequence[int]
+    _file: BinaryIO | None
+    _map: mmap.mmap | None
+    _views: list[memoryview]
+
+    def __init__(self, path: str, entry_width: int, reverse_byte_order: bool = False, expected_entries: int | None = None) -> None:
+        """Maps a file, checking its size before reading anything
+
+        Args:
+            path (str): Path of the file
+            entry_width (int): Size in bytes of every entry
+            reverse_byte_order (bool, optional): True if the entries in the file are little endian. Defaults to False.
+            expected_entries (int | None, optional): If passed, the file must hold exactly this many entries. Defaults to None.
+
+        Raises:
+            ValueError: If the size of the file does not match the entries
+        """
+        size: int = os.path.getsize(path)
+
+        if size % entry_width:
+            raise ValueError(f'Input file {path} has {size} bytes, which is not a multiple of the entry width {entry_width}')
+
+        if expected_entries is not None and size // entry_width != expected_entries:
+            raise ValueError(f'IC definition supports {expected_entries} addresses, but input file {path} has {size // entry_width} entries')
+
+        self.path = path
+        self.entry_width = entry_width
+        self.entries = []
+        self._file = None
+        self._map = None
+        self._views = []
+
+        # Empty files cannot be mapped
+        if not size:
+            return
+
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view: memoryview = memoryview(self._map)
+        self._views.append(view)
+
+        byte_order: Literal['little', 'big'] = 'little' if reverse_byte_order else 'big'
+        typecode: _Typecode | None = _typecode(entry_width)
+
+        if typecode is None:
+            self.entries = [int.from_bytes(view[offset:offset + entry_width], byte_order) for offset in range(0, size, entry_width)]
+        elif entry_width == 1 or byte_order == sys.byteorder:
+            entries_view: memoryview = view.cast(typecode)
+            self._views.append(entries_view)
+            self.entries = entries_view
+        else:
+            swapped: array = array(typecode)
+            swapped.frombytes(view)
+            swapped.byteswap()
+            self.entries = swapped
+
+    def __enter__(self) -> 'WriteInput':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def close(self) -> None:
+        self.entries = []
+        # Views built on top of others go first
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Slices of the view are still around somewhere, the map is closed when they go away
+                pass
+            self._map = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
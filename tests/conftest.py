@@ -5,5 +5,49 @@
 import sys
 sys.path.insert(1, '.') # Make VSCode happy...
 
+from typing import Callable
+
 import pytest
 
+@pytest.fixture
+def rom_definition() -> Callable:
+    """Factory for the definitions of generic ROMs, for the tests that do not need a board"""
+    ic_definition = pytest.importorskip('dpdumperlib.ic.ic_definition')
+
+    def _build(address_bits: int, data_bits: int = 8):
+        return ic_definition.ICDefinition(name=f'ROM {address_bits}x{data_bits}',
+                                          ic_type=ic_definition.ICType('ROM'),
+                                          hw_model=3,
+                                          address=list(range(1, address_bits + 1)),
+                                          data=list(range(22, data_bits + 22)),
+                                          act_h_enable=[],
+                                          act_l_enable=[40],
+                                          act_h_write=[],
+                                          act_l_write=[],
+                                          adapter_hi_pins=[],
+                                          adapter_notes=None)
+
+    return _build
+
+@pytest.fixture
+def no_settle_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Removes the delay after powering the IC, which would otherwise dominate the timings"""
+    hl_board_utilities = pytest.importorskip('dpdumper.hl_board_utilities')
+    monkeypatch.setattr(hl_board_utilities, '_POWER_SETTLE_TIME', 0)
+
+@pytest.fixture
+def sim_board(tmp_path, no_settle_delay) -> Callable:
+    """Factory for simulated boards. Returns the serial port, the command class and the IC definition."""
+    simulated_board = pytest.importorskip('simulated_board')
+    ic_loader = pytest.importorskip('dpdumperlib.ic.ic_loader')
+
+    def _build(address_bits: int, data_bits: int = 8, writable: bool = False, hiz_fraction: float = 0, round_trip_latency: float = 0, byte_latency: float = 0, seed: int = 0):
+        definition_path: str = str(tmp_path / f'sim_{address_bits}_{data_bits}_{int(writable)}.toml')
+        simulated_board.write_definition(definition_path, address_bits, data_bits, writable)
+        ic = ic_loader.ICLoader.extract_definition_from_file(definition_path)
+
+        board = simulated_board.SimulatedIC.random(ic, seed, hiz_fraction)
+        ser = simulated_board.SimulatedSerial(board, round_trip_latency, byte_latency)
+        return (ser, simulated_board.SimulatedBoardCommands, ic)
+
+    return _build
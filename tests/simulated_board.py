@@ -0,0 +1,379 @@
+"""Simulated dupico board, to run the high level code without hardware"""
+
+from collections import deque
+from typing import Callable, final
+import random
+import time
+
+from dupicolib.hardware_board_commands import HardwareBoardCommands
+from dpdumperlib.ic.ic_definition import ICDefinition
+
+_ALL_PINS: int = 0xFFFFFFFFFFFFFFFF
+
+# Bytes of a bulk transfer after which the progress callback is called
+_XFER_CALLBACK_CHUNK: int = 4096
+
+@final
+class SimulatedIC:
+    """
+    Emulates a ROM or SRAM wired to the socket as described by an ICDefinition.
+    Hi-Z bits in the mask float, so they read back at whatever level the board is driving the data pin.
+    Flaky bits, like the ones of an aging EPROM, read back a random value every time.
+    """
+
+    ic: ICDefinition
+    memory: list[int]
+    z_mask: list[int]
+    flaky: dict[int, int]
+    powered: bool
+
+    _rnd: random.Random
+
+    _data_mask: int
+    _enable_h: int
+    _enable_l: int
+    _write_h: int
+    _write_l: int
+
+    def __init__(self, ic: ICDefinition, memory: list[int], z_mask: list[int] | None = None) -> None:
+        self.ic = ic
+        self.memory = memory
+        self.z_mask = z_mask if z_mask is not None else [0] * len(memory)
+        self.flaky = {}
+        self.powered = False
+        self._rnd = random.Random(0)
+
+        self._data_mask = HardwareBoardCommands.map_value_to_pins(ic.data, _ALL_PINS)
+        self._enable_h = HardwareBoardCommands.map_value_to_pins(ic.act_h_enable, _ALL_PINS)
+        self._enable_l = HardwareBoardCommands.map_value_to_pins(ic.act_l_enable, _ALL_PINS)
+        self._write_h = HardwareBoardCommands.map_value_to_pins(ic.act_h_write, _ALL_PINS)
+        self._write_l = HardwareBoardCommands.map_value_to_pins(ic.act_l_write, _ALL_PINS)
+
+    @classmethod
+    def random(cls, ic: ICDefinition, seed: int = 0, hiz_fraction: float = 0) -> 'SimulatedIC':
+        """Builds an IC with random content, and optionally some random Hi-Z bits
+
+        Args:
+            ic (ICDefinition): Definition of the IC
+            seed (int, optional): Seed for the content. Defaults to 0.
+            hiz_fraction (float, optional): Fraction of the addresses that have some bits in Hi-Z. Defaults to 0.
+
+        Returns:
+            SimulatedIC: The simulated IC
+        """
+        rnd: random.Random = random.Random(seed)
+        size: int = 1 << len(ic.address)
+        data_bits: int = len(ic.data)
+
+        memory: list[int] = [rnd.getrandbits(data_bits) for _ in range(size)]
+        z_mask: list[int] = [rnd.getrandbits(data_bits) if rnd.random() < hiz_fraction else 0 for _ in range(size)]
+
+        return cls(ic, memory, z_mask)
+
+    def _enabled(self, pins: int) -> bool:
+        return self.powered and (pins & self._enable_h) == self._enable_h and (pins & self._enable_l) == 0
+
+    def _flip(self, value: int, address: int) -> int:
+        if (flaky := self.flaky.get(address)):
+            value ^= self._rnd.getrandbits(len(self.ic.data)) & flaky
+        return value
+
+    def _writing(self, pins: int) -> bool:
+        if not self.ic.act_h_write and not self.ic.act_l_write:
+            return False
+        return (pins & self._write_h) == self._write_h and (pins & self._write_l) == 0
+
+    def drive(self, pins: int) -> int:
+        """Applies a pin state to the IC, performing a write if the write pins are active
+
+        Args:
+            pins (int): State of the pins driven by the board
+
+        Returns:
+            int: State of the pins as read back by the board
+        """
+        if not self._enabled(pins):
+            return pins
+
+        address: int = HardwareBoardCommands.map_pins_to_value(self.ic.address, pins)
+        driven: int = HardwareBoardCommands.map_pins_to_value(self.ic.data, pins)
+
+        if self._writing(pins):
+            self.memory[address] = driven
+            return pins
+
+        value: int = self._flip((self.memory[address] & ~self.z_mask[address]) | (driven & self.z_mask[address]), address)
+        return (pins & ~self._data_mask) | HardwareBoardCommands.map_value_to_pins(self.ic.data, value)
+
+    def transfer(self, address_pins: list[int], data_pins: list[int], hi_pins: list[int]) -> bytes:
+        """Emulates a bulk read, walking the address pins with the hi pins held high
+
+        Args:
+            address_pins (list[int]): Pins walked during the transfer, lowest bit first
+            data_pins (list[int]): Pins sampled for every address
+            hi_pins (list[int]): Pins held high during the transfer
+
+        Returns:
+            bytes: Sampled values, big endian
+        """
+        width: int = -(len(data_pins) // -8)
+        base_pins: int = HardwareBoardCommands.map_value_to_pins(hi_pins, _ALL_PINS)
+        entries: int = 1 << len(address_pins)
+
+        # Fast path for the common case: the walked pins are the lower address lines and the data pins are the IC ones
+        if self._enabled(base_pins) and not self._writing(base_pins) and address_pins == self.ic.address[:len(address_pins)] and data_pins == self.ic.data:
+            base: int = HardwareBoardCommands.map_pins_to_value(self.ic.address, base_pins) & ~(entries - 1)
+            driven: int = HardwareBoardCommands.map_pins_to_value(self.ic.data, base_pins)
+            words: list[int] = [(mem & ~z) | (driven & z) for mem, z in zip(self.memory[base:base + entries], self.z_mask[base:base + entries])]
+            for address in self.flaky:
+                if base <= address < base + entries:
+                    words[address - base] = self._flip(words[address - base], address)
+            return b''.join(word.to_bytes(width) for word in words)
+
+        out: bytearray = bytearray()
+        for idx in range(entries):
+            pins: int = self.drive(base_pins | HardwareBoardCommands.map_value_to_pins(address_pins, idx))
+            out += HardwareBoardCommands.map_pins_to_value(data_pins, pins).to_bytes(width)
+
+        return bytes(out)
+
+@final
+class SimulatedSerial:
+    """
+    Loopback stand-in for the serial port connected to a dupico, with the board on the other side.
+    Commands are executed as soon as they are written, and their responses become readable after
+    a delay that models the link: a fixed latency per round trip plus a time per byte transferred.
+    Commands sent back to back overlap their round trips, like on a real link.
+    """
+
+    board: SimulatedIC
+    round_trip_latency: float
+    byte_latency: float
+    timeout: float | None
+    write_timeout: float | None
+    baudrate: int
+    port: str
+
+    commands: int
+    bytes_written: int
+    bytes_read: int
+
+    _rx: deque[tuple[float, bytes]]
+    _tx: bytearray
+    _link_free_at: float
+    _closed: bool
+
+    def __init__(self, board: SimulatedIC, round_trip_latency: float = 0, byte_latency: float = 0, baudrate: int = 115200, port: str = 'SIM') -> None:
+        self.board = board
+        self.round_trip_latency = round_trip_latency
+        self.byte_latency = byte_latency
+        self.timeout = 1
+        self.write_timeout = 1
+        self.baudrate = baudrate
+        self.port = port
+        self.commands = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self._rx = deque()
+        self._tx = bytearray()
+        self._link_free_at = 0
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def is_open(self) -> bool:
+        return not self._closed
+
+    @property
+    def in_waiting(self) -> int:
+        now: float = time.perf_counter()
+        return sum(len(chunk) for ready_at, chunk in self._rx if ready_at <= now)
+
+    def close(self) -> None:
+        self._closed = True
+
+    def flush(self) -> None:
+        pass
+
+    def reset_input_buffer(self) -> None:
+        self._rx.clear()
+
+    def reset_output_buffer(self) -> None:
+        self._tx.clear()
+
+    def write(self, data: bytes) -> int:
+        self.bytes_written += len(data)
+        self._tx += data
+
+        while (idx := self._tx.find(b'\n')) >= 0:
+            line: bytes = bytes(self._tx[:idx + 1])
+            del self._tx[:idx + 1]
+            self._queue_response(line, self._execute(line.decode('ascii').strip()))
+
+        return len(data)
+
+    def _queue_response(self, command: bytes, response: bytes) -> None:
+        self.commands += 1
+
+        # Bytes share the link, so a response cannot arrive before the ones of the commands sent earlier
+        ready_at: float = max(time.perf_counter() + self.round_trip_latency, self._link_free_at) + (len(command) + len(response)) * self.byte_latency
+        self._link_free_at = ready_at
+        self._rx.append((ready_at, response))
+
+    def _execute(self, line: str) -> bytes:
+        if not line.startswith('>'):
+            return b'CMD_ERR\n'
+
+        cmd, _, args = line[1:].partition(' ')
+        match cmd:
+            case 'W':
+                return f'[W {self.board.drive(int(args, 16)):016X}]\n'.encode('ascii')
+            case 'P':
+                self.board.powered = args == '1'
+                return f'[P {args}]\n'.encode('ascii')
+            case 'X':
+                address_pins, data_pins, hi_pins = ([int(pin) for pin in group.split(',') if pin] for group in args.split(';'))
+                data: bytes = self.board.transfer(address_pins, data_pins, hi_pins)
+                return f'[X {len(data):08X}]\n'.encode('ascii') + data
+            case 'M':
+                return b'[M 3]\n'
+            case 'V':
+                return b'[V 1.0.0]\n'
+            case _:
+                return b'CMD_ERR\n'
+
+    def _wait_for(self, size: int | None, expected: bytes | None) -> None:
+        # Wait until the responses needed to satisfy the read have arrived. Nothing else will ever
+        # arrive after the last queued response, so there is no point in waiting for the timeout.
+        deadline: float = time.perf_counter() + (self.timeout if self.timeout is not None else 3600)
+        available: bytearray = bytearray()
+        wait_until: float = 0
+
+        for ready_at, chunk in self._rx:
+            wait_until = min(ready_at, deadline)
+            available += chunk
+            if ready_at > deadline or (size is not None and len(available) >= size) or (expected is not None and expected in available):
+                break
+
+        delay: float = wait_until - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _take(self, size: int) -> bytes:
+        now: float = time.perf_counter()
+        out: bytearray = bytearray()
+
+        while self._rx and len(out) < size and self._rx[0][0] <= now:
+            ready_at, chunk = self._rx.popleft()
+            needed: int = size - len(out)
+            out += chunk[:needed]
+            if len(chunk) > needed:
+                self._rx.appendleft((ready_at, chunk[needed:]))
+
+        self.bytes_read += len(out)
+        return bytes(out)
+
+    def read(self, size: int = 1) -> bytes:
+        self._wait_for(size, None)
+        return self._take(size)
+
+    def read_until(self, expected: bytes = b'\n', size: int | None = None) -> bytes:
+        self._wait_for(size, expected)
+
+        now: float = time.perf_counter()
+        available: bytes = b''.join(chunk for ready_at, chunk in self._rx if ready_at <= now)
+        idx: int = available.find(expected)
+        end: int = len(available) if idx < 0 else idx + len(expected)
+
+        return self._take(end if size is None else min(end, size))
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read_until(b'\n', None if size < 0 else size)
+
+class SimulatedBoardCommands(HardwareBoardCommands):
+    """
+    Command class for the simulated board. It speaks a small line protocol modeled after the dupico one:
+    every command is a line starting with '>', and the board answers with a line in square brackets.
+    """
+
+    @classmethod
+    def _command(cls, command: str, ser: SimulatedSerial) -> str | None:
+        ser.write(f'>{command}\n'.encode('ascii'))
+        response: bytes = ser.read_until(b'\n')
+
+        if not response.startswith(b'[') or not response.endswith(b']\n'):
+            return None
+
+        return response[1:-2].decode('ascii')
+
+    @classmethod
+    def write_pins(cls, pins: int, ser: SimulatedSerial) -> int | None: # type: ignore[override]
+        response: str | None = cls._command(f'W {pins:016X}', ser)
+        if response is None or not response.startswith('W '):
+            return None
+        return int(response[2:], 16)
+
+    @classmethod
+    def set_power(cls, state: bool, ser: SimulatedSerial) -> bool | None: # type: ignore[override]
+        response: str | None = cls._command(f'P {int(state)}', ser)
+        return None if response is None else response == 'P 1'
+
+    @classmethod
+    def get_model(cls, ser: SimulatedSerial) -> int | None: # type: ignore[override]
+        response: str | None = cls._command('M', ser)
+        return None if response is None else int(response[2:])
+
+    @classmethod
+    def get_version(cls, ser: SimulatedSerial) -> str | None: # type: ignore[override]
+        response: str | None = cls._command('V', ser)
+        return None if response is None else response[2:]
+
+    @classmethod
+    def cxfer_read(cls, address_pins: list[int], data_pins: list[int], hi_pins: list[int], update_callback: Callable[[int], None] | None, ser: SimulatedSerial) -> bytes | None: # type: ignore[override]
+        groups: str = ';'.join(','.join(str(pin) for pin in pins) for pins in (address_pins, data_pins, hi_pins))
+        response: str | None = cls._command(f'X {groups}', ser)
+        if response is None or not response.startswith('X '):
+            return None
+
+        size: int = int(response[2:], 16)
+        data: bytearray = bytearray()
+        while len(data) < size:
+            chunk: bytes = ser.read(min(_XFER_CALLBACK_CHUNK, size - len(data)))
+            if not chunk:
+                return None
+            data += chunk
+            if update_callback:
+                update_callback(len(data))
+
+        return bytes(data)
+
+def write_definition(path: str, address_bits: int, data_bits: int = 8, writable: bool = False) -> None:
+    """Writes a TOML definition for a generic IC, wired to the socket in a plausible way
+
+    Args:
+        path (str): Path of the definition file
+        address_bits (int): Number of address lines, up to 20
+        data_bits (int, optional): Number of data lines, up to 16. Defaults to 8.
+        writable (bool, optional): True for an SRAM with an active-low write enable. Defaults to False.
+    """
+    # Pin 21 is GND and pin 42 is +5V, they are skipped
+    address: list[int] = list(range(1, 1 + address_bits))
+    data: list[int] = list(range(22, 22 + data_bits))
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'name = "SIM{address_bits}x{data_bits}"\n')
+        f.write(f'type = "{"SRAM" if writable else "ROM"}"\n\n')
+        f.write('[pinout]\n')
+        f.write(f'address = {address}\n')
+        f.write(f'data = {data}\n')
+        f.write('H_enable = [41]\n')
+        f.write('L_enable = [40]\n')
+        f.write('H_write = []\n')
+        f.write(f'L_write = {[39] if writable else []}\n\n')
+        f.write('[adapter]\n')
+        f.write('hi_pins = []\n\n')
+        f.write('[requirements]\n')
+        f.write('hardware = 3\n')
@@ -0,0 +1,46 @@
+"""Tests for the handling of address ranges"""
+
+import pytest
+
+from dpdumper.address_ranges import parse_range, merge_ranges, intersect_ranges, ranges_size, diff_ranges, aligned_blocks
+
+def test_parse_range() -> None:
+    assert parse_range('16:32') == (16, 32)
+    assert parse_range('0x100:0x200') == (0x100, 0x200)
+
+@pytest.mark.parametrize('text', ['100', '32:16', '16:16', '-1:4', 'a:b'])
+def test_parse_range_invalid(text: str) -> None:
+    with pytest.raises(ValueError):
+        parse_range(text)
+
+def test_merge_ranges() -> None:
+    assert merge_ranges([(20, 30), (0, 10), (10, 15), (25, 40)]) == [(0, 15), (20, 40)]
+    assert merge_ranges([]) == []
+
+def test_intersect_ranges() -> None:
+    assert intersect_ranges([(0, 10), (20, 30)], [(5, 25)]) == [(5, 10), (20, 25)]
+    assert intersect_ranges([(0, 10)], [(10, 20)]) == []
+
+def test_ranges_size() -> None:
+    assert ranges_size([(0, 10), (20, 25)]) == 15
+
+def test_diff_ranges() -> None:
+    plane_a: bytes = bytes(64)
+    plane_b: bytearray = bytearray(plane_a)
+    plane_b[2 * 2] = 1  # Entry 2
+    plane_b[3 * 2 + 1] = 1  # Entry 3
+    plane_b[30 * 2] = 1  # Entry 30
+
+    # Small chunks, so both the chunk comparison and the single entries are exercised
+    assert diff_ranges(plane_a, bytes(plane_b), 2, chunk_entries=4) == [(2, 4), (30, 31)]
+    assert diff_ranges(plane_a, plane_a, 2) == []
+
+    with pytest.raises(ValueError):
+        diff_ranges(plane_a, plane_a[:-2], 2)
+
+def test_aligned_blocks() -> None:
+    assert aligned_blocks(0, 16, 8) == [(0, 4)]
+    assert aligned_blocks(3, 12, 8) == [(3, 0), (4, 2), (8, 2)]
+    assert aligned_blocks(0, 1024, 8) == [(0, 8), (256, 8), (512, 8), (768, 8)]
+    # The range is extended to the minimum block size
+    assert aligned_blocks(3, 12, 8, 2) == [(0, 3), (8, 2)]
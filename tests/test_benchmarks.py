@@ -0,0 +1,206 @@
+"""Benchmarks of reads, writes and output generation against the simulated board"""
+
+# pylint: disable=wrong-import-position
+
+import random
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+pytest.importorskip('serial')
+pytest.importorskip('dupicolib')
+pytest.importorskip('dpdumperlib')
+
+from dpdumper.hl_board_utilities import HLBoardUtilities
+from dpdumper.ic_dump import ICDump
+import dpdumper.outfile_utilities as OutFileUtilities
+import dpdumper.frontend as Frontend
+import dpdumper.rom_index as RomIndex
+import dpdumper.output_workers as OutputWorkers
+
+READ_SIZES: list[int] = [10, 14, 16]
+WRITE_SIZES: list[int] = [8, 10, 12]
+OUTPUT_SIZES: list[int] = [10, 14, 16]
+
+def _expected_planes(ser, hiz_high: bool = False) -> tuple[bytes, bytes]:
+    width: int = -(len(ser.board.ic.data) // -8)
+    data: bytes = b''.join(((mem | z) if hiz_high else (mem & ~z)).to_bytes(width) for mem, z in zip(ser.board.memory, ser.board.z_mask))
+    z_plane: bytes = b''.join(z.to_bytes(width) for z in ser.board.z_mask)
+    return (data, z_plane)
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits)
+
+    dump: ICDump | None = benchmark(HLBoardUtilities.read_ic, ser, cmd_class, ic)
+
+    assert dump is not None
+    assert dump.data == _expected_planes(ser)[0]
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic_hiz(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, hiz_fraction=0.1)
+
+    dump: ICDump | None = benchmark(HLBoardUtilities.read_ic, ser, cmd_class, ic, True)
+
+    assert dump is not None
+    data, z_plane = _expected_planes(ser)
+    assert dump.data == data
+    assert dump.z_plane == z_plane
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic_adaptive_hiz(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits)
+
+    dump: ICDump | None = benchmark(HLBoardUtilities.read_ic, ser, cmd_class, ic, True, hiz_stride=16)
+
+    assert dump is not None
+    data, z_plane = _expected_planes(ser)
+    assert dump.data == data
+    assert dump.z_plane == z_plane
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic_blocks(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, data_bits=16)
+
+    def read_all() -> bytes:
+        return b''.join(dump.data for _, dump in HLBoardUtilities.read_ic_blocks(ser, cmd_class, ic, block_bits=min(address_bits, 12)))
+
+    assert benchmark(read_all) == _expected_planes(ser)[0]
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic_consensus(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits)
+    ser.board.flaky = {3: 0x01, (1 << address_bits) - 1: 0x80}
+
+    dump, unstable = benchmark.pedantic(HLBoardUtilities.read_ic_consensus, args=(ser, cmd_class, ic, 5), rounds=3)
+
+    stable: set[int] = set(range(1 << address_bits)) - set(ser.board.flaky)
+    assert all(dump.entry(address)[0] == ser.board.memory[address] for address in stable)
+    assert {start for start, _, _ in unstable} <= set(ser.board.flaky)
+
+@pytest.mark.parametrize('address_bits', [12, 14, 16])
+def test_read_ic_probed(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits)
+    # A chip with a quarter of the addresses, whose second half is erased
+    decoded: int = (1 << address_bits) // 4
+    unique: list[int] = ser.board.memory[:decoded // 2] + [0xFF] * (decoded // 2)
+    ser.board.memory[:] = unique * 4
+
+    dump, result = benchmark.pedantic(HLBoardUtilities.read_ic_probed, args=(ser, cmd_class, ic), rounds=3)
+
+    assert result.decoded_bits == address_bits - 2
+    assert dump.data == bytes(ser.board.memory)
+    assert result.blank_ranges[0] == (decoded // 2, decoded)
+
+@pytest.mark.parametrize('address_bits', READ_SIZES)
+def test_read_ic_ranges(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, hiz_fraction=0.1)
+    size: int = 1 << address_bits
+    ranges: list[tuple[int, int]] = [(0, 0x100), (size // 2 + 3, size // 2 + 0x183), (size - 0x10, size)]
+
+    dumps = benchmark.pedantic(HLBoardUtilities.read_ic_ranges, args=(ser, cmd_class, ic, ranges, True), rounds=3)
+
+    data, z_plane = _expected_planes(ser)
+    assert [(start, start + len(dump)) for start, dump in dumps] == ranges
+    assert all(dump.data == data[start:start + len(dump)] and dump.z_plane == z_plane[start:start + len(dump)] for start, dump in dumps)
+
+@pytest.mark.parametrize('address_bits', WRITE_SIZES)
+def test_write_ic(benchmark, sim_board, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, writable=True)
+    content: list[int] = [(idx * 7) & 0xFF for idx in range(1 << address_bits)]
+
+    benchmark.pedantic(HLBoardUtilities.write_ic, args=(ser, cmd_class, ic, content), rounds=3)
+
+    assert ser.board.memory == content
+
+@pytest.mark.parametrize('pipelined', [True, False])
+def test_write_ic_latency(benchmark, sim_board, pipelined: bool) -> None:
+    # With a realistic round trip, sending commands back to back is where the time is saved
+    ser, cmd_class, ic = sim_board(8, writable=True, round_trip_latency=0.0002, byte_latency=0.000001)
+    content: list[int] = [(idx * 13) & 0xFF for idx in range(1 << 8)]
+
+    benchmark.pedantic(HLBoardUtilities.write_ic, args=(ser, cmd_class, ic, content), kwargs={'pipelined': pipelined}, rounds=2)
+
+    assert ser.board.memory == content
+
+@pytest.mark.parametrize('address_bits', OUTPUT_SIZES)
+def test_output_table(benchmark, sim_board, tmp_path, address_bits: int) -> None:
+    ser, _, ic = sim_board(address_bits, hiz_fraction=0.1)
+    data, z_plane = _expected_planes(ser)
+    dump: ICDump = ICDump(data, len(ic.data), z_plane)
+
+    benchmark(OutFileUtilities.build_output_table_file, str(tmp_path / 'out.txt'), ic, dump)
+
+    with open(tmp_path / 'out.txt', 'r', encoding='utf-8') as f:
+        # Header lines are followed by an empty line, then one line per address
+        assert sum(1 for _ in f) == 5 + (1 << address_bits)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_output_table_parallel(benchmark, sim_board, tmp_path, workers: int) -> None:
+    ser, _, ic = sim_board(18, hiz_fraction=0.1)
+    data, z_plane = _expected_planes(ser)
+    dump: ICDump = ICDump(data, len(ic.data), z_plane)
+
+    OutputWorkers.set_workers(1)
+    OutFileUtilities.build_output_table_file(str(tmp_path / 'serial.txt'), ic, dump)
+
+    OutputWorkers.set_workers(workers)
+    try:
+        benchmark(OutFileUtilities.build_output_table_file, str(tmp_path / 'out.txt'), ic, dump)
+    finally:
+        OutputWorkers.set_workers(None)
+
+    assert (tmp_path / 'out.txt').read_bytes() == (tmp_path / 'serial.txt').read_bytes()
+
+@pytest.mark.parametrize('address_bits', OUTPUT_SIZES)
+def test_output_binary(benchmark, sim_board, address_bits: int) -> None:
+    ser, _, ic = sim_board(address_bits, data_bits=16, hiz_fraction=0.1)
+    data, z_plane = _expected_planes(ser)
+    dump: ICDump = ICDump(data, len(ic.data), z_plane)
+
+    binary, _, _ = benchmark(OutFileUtilities.build_binary_array, ic, dump, True, True)
+
+    assert len(binary) == len(data)
+
+@pytest.mark.parametrize('address_bits', [14])
+def test_read_command(benchmark, sim_board, tmp_path, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, hiz_fraction=0.1)
+    outfb: str = str(tmp_path / 'out.bin')
+
+    benchmark.pedantic(Frontend.read_command, args=(ser, cmd_class, ic, str(tmp_path / 'out.txt'), outfb, str(tmp_path / 'out_z.bin'), True), kwargs={'skip_note': True}, rounds=3)
+
+    with open(outfb, 'rb') as f:
+        assert f.read() == _expected_planes(ser)[0]
+
+@pytest.mark.parametrize('address_bits', [10])
+def test_write_command(benchmark, sim_board, tmp_path, address_bits: int) -> None:
+    ser, cmd_class, ic = sim_board(address_bits, writable=True)
+    content: bytes = bytes((idx * 3) & 0xFF for idx in range(1 << address_bits))
+    inf: str = str(tmp_path / 'in.bin')
+
+    with open(inf, 'wb') as f:
+        f.write(content)
+
+    benchmark.pedantic(Frontend.write_command, args=(ser, cmd_class, ic, inf), kwargs={'skip_note': True}, rounds=3)
+
+    assert bytes(ser.board.memory) == content
+
+@pytest.mark.parametrize('images', [100, 1000])
+def test_rom_index_lookup(benchmark, tmp_path, images: int) -> None:
+    rnd: random.Random = random.Random(images)
+    image: bytes = rnd.randbytes(RomIndex.BLOCK_SIZE * 16)
+
+    with RomIndex.RomIndex(str(tmp_path / 'roms.db')) as index:
+        for idx in range(images):
+            index.add(f'rom{idx}', None, RomIndex.fingerprint(rnd.randbytes(RomIndex.BLOCK_SIZE * 16))[0])
+
+        # A known image, with 3 blocks changed
+        variant: bytearray = bytearray(image)
+        for block in (2, 7, 11):
+            variant[block * RomIndex.BLOCK_SIZE] ^= 0xFF
+        index.add('variant', None, RomIndex.fingerprint(bytes(variant))[0])
+
+        matches: list[RomIndex.RomMatch] = benchmark(index.lookup, RomIndex.fingerprint(image)[0])
+
+    assert [(match.name, match.differing_blocks) for match in matches] == [('variant', 3)]
@@ -0,0 +1,66 @@
+"""Tests for the container files of dumps"""
+
+# pylint: disable=wrong-import-position
+
+import pytest
+
+pytest.importorskip('dpdumperlib')
+
+from dpdumper.dumper_utilities import BoardInfo
+from dpdumper.dump_container import DumpContainerReader, DumpContainerWriter, write_dump_container
+from dpdumper.ic_dump import ICDump
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(tmp_path, rom_definition, compress: bool) -> None:
+    ic = rom_definition(10, 16)
+    data: bytes = bytes((idx * 13) & 0xFF for idx in range(2048))
+    z_mask: bytes = bytes(2040) + b'\x80\x00' * 4
+    path: str = str(tmp_path / 'dump.dpd')
+
+    sha1: str = write_dump_container(path, ic, ICDump(data, 16, z_mask), BoardInfo(3, '1.0.0'), compress)
+
+    with DumpContainerReader(path) as reader:
+        assert len(reader) == 1024
+        assert reader.sha1 == sha1
+        assert reader.has_hiz
+        assert reader.data_width_bits == 16
+        assert reader.board_info == BoardInfo(3, '1.0.0')
+        assert reader.definition.address == ic.address
+        assert reader.verify() == []
+
+        dump: ICDump = reader.read_range(0, 1024)
+        assert dump.data == data
+        assert dump.z_mask == z_mask
+
+        part: ICDump = reader.read_range(1020, 1024)
+        assert part.data == data[2040:]
+        assert part.z_mask == z_mask[2040:]
+
+def test_blocks(tmp_path, rom_definition) -> None:
+    ic = rom_definition(10)
+    path: str = str(tmp_path / 'dump.dpd')
+
+    with DumpContainerWriter(path, ic, False, block_bits=8) as writer:
+        for base in range(0, 1024, 256):
+            writer.write_block(base, ICDump(bytes([base >> 8]) * 256, 8))
+
+    with DumpContainerReader(path) as reader:
+        assert [(base, block.data[0]) for base, block in reader.blocks(verify=True)] == [(0, 0), (256, 1), (512, 2), (768, 3)]
+        # A range across two blocks
+        assert reader.read_range(250, 260).data == b'\x00' * 6 + b'\x01' * 4
+
+def test_not_a_container(tmp_path) -> None:
+    path = tmp_path / 'dump.dpd'
+    path.write_bytes(bytes(64))
+
+    with pytest.raises(ValueError):
+        DumpContainerReader(str(path))
+
+def test_metadata(tmp_path, rom_definition) -> None:
+    path: str = str(tmp_path / 'dump.dpd')
+
+    write_dump_container(path, rom_definition(8), ICDump(bytes(256), 8), metadata={'probe': {'mirrors': 2}})
+
+    with DumpContainerReader(path) as reader:
+        assert reader.metadata == {'probe': {'mirrors': 2}}
+        assert reader.board_info is None
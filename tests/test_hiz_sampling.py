@@ -0,0 +1,31 @@
+"""Tests for the selection of the blocks read again by the adaptive Hi-Z check"""
+
+from dpdumper.hiz_sampling import find_hiz_candidates
+
+def _block(values: list[int]) -> bytes:
+    return bytes(values)
+
+def test_find_hiz_candidates() -> None:
+    varied: bytes = _block([0x0F, 0xF0, 0x55, 0xAA])
+    data: bytes = (varied  # Sampled, first of the stride
+                   + _block([0x00, 0x00, 0x00, 0x00])  # All 0s
+                   + varied
+                   + _block([0x7F, 0x3C, 0x01, 0x00])  # D7 never high
+                   + _block([0x42, 0x42, 0x42, 0x42])  # Uniform
+                   + varied  # Sampled
+                   + varied
+                   + varied)
+
+    suspicious, sampled = find_hiz_candidates(data, 8, 5, block_bits=2)
+
+    assert suspicious == [(4, 8), (12, 20)]
+    assert sampled == [(0, 4), (20, 24)]
+
+def test_find_hiz_candidates_wide() -> None:
+    # D8 is never high in the second block
+    data: bytes = bytes.fromhex('01FF 0100 00FF 0101') + bytes.fromhex('00FF 0000 00FF 0001')
+
+    suspicious, sampled = find_hiz_candidates(data, 9, 16, block_bits=2)
+
+    assert suspicious == [(4, 8)]
+    assert sampled == [(0, 4)]
@@ -0,0 +1,72 @@
+"""Tests for the compact representation of the data read from an IC"""
+
+from array import array
+
+import pytest
+
+from dpdumper.ic_dump import ICDump, xor_planes, or_planes, swap_entries_byte_order, pack_entries, majority_planes, disagreement_plane, fill_gaps
+
+def test_dump_entries() -> None:
+    dump: ICDump = ICDump(b'\x00\x01\x00\x02', 16, b'\x00\x00\x80\x00')
+
+    assert len(dump) == 2
+    assert dump.has_hiz
+    assert dump.entry(1) == (0x0002, 0x8000)
+    assert list(dump.entries()) == [(0x0001, 0), (0x0002, 0x8000)]
+
+    plain: ICDump = ICDump(b'\x01\x02', 8)
+    assert not plain.has_hiz
+    assert plain.z_plane == b'\x00\x00'
+
+    with pytest.raises(ValueError):
+        ICDump(b'\x00\x01\x02', 16)
+
+def test_plane_operations() -> None:
+    assert xor_planes(b'\x0F\xF0', b'\xFF\xFF') == b'\xF0\x0F'
+    assert or_planes(b'\x0F\x00', b'\x30\x01') == b'\x3F\x01'
+    # Leading zero bytes must be kept
+    assert xor_planes(b'\x00\x01', b'\x00\x01') == b'\x00\x00'
+
+    with pytest.raises(ValueError):
+        xor_planes(b'\x00', b'\x00\x00')
+
+def test_swap_entries_byte_order() -> None:
+    assert swap_entries_byte_order(b'\x01\x02\x03\x04', 2) == b'\x02\x01\x04\x03'
+    assert swap_entries_byte_order(b'\x01\x02\x03\x04\x05\x06', 3) == b'\x03\x02\x01\x06\x05\x04'
+    assert swap_entries_byte_order(b'\x01\x02', 1) == b'\x01\x02'
+
+def test_pack_entries() -> None:
+    assert pack_entries([0x01, 0x02], 1) == b'\x01\x02'
+    assert pack_entries([0x0102, 0x0304], 2) == b'\x01\x02\x03\x04'
+    assert pack_entries([0x010203], 3) == b'\x01\x02\x03'
+
+def test_majority_planes() -> None:
+    assert majority_planes([b'\x0F', b'\x3C', b'\xF0']) == b'\x3C'
+    assert majority_planes([b'\xAA']) == b'\xAA'
+    # A tie is not a majority
+    assert majority_planes([b'\xFF', b'\x00']) == b'\x00'
+    assert majority_planes([b'\x01', b'\x01', b'\x01', b'\x00', b'\x00']) == b'\x01'
+
+def test_majority_planes_matches_bit_count() -> None:
+    planes: list[bytes] = [bytes((value * (idx + 3)) & 0xFF for value in range(256)) for idx in range(7)]
+    expected: bytes = bytes(sum(1 << bit for bit in range(8) if sum((plane[pos] >> bit) & 1 for plane in planes) > len(planes) // 2) for pos in range(256))
+
+    assert majority_planes(planes) == expected
+
+def test_disagreement_plane() -> None:
+    assert disagreement_plane([b'\x0F\x00', b'\x0F\x00', b'\x0E\x80']) == b'\x01\x80'
+
+def test_fill_gaps() -> None:
+    dump: ICDump = fill_gaps([(2, ICDump(b'\x11\x22', 8)), (6, ICDump(b'\x33', 8))], 8, 8, 0x1FF)
+
+    assert dump.data == b'\xFF\xFF\x11\x22\xFF\xFF\x33\xFF'
+    assert not dump.has_hiz
+
+    with_hiz: ICDump = fill_gaps([(1, ICDump(b'\x11', 8, b'\x80'))], 4, 8, 0)
+    assert with_hiz.data == b'\x00\x11\x00\x00'
+    assert with_hiz.z_mask == b'\x00\x80\x00\x00'
+
+def test_pack_typed_entries() -> None:
+    # Typed arrays are copied as a whole, and must give the same result as a list
+    assert pack_entries(array('H', [0x0102, 0x0304]), 2) == b'\x01\x02\x03\x04'
+    assert pack_entries(memoryview(array('H', [0x0102])), 2) == b'\x01\x02'
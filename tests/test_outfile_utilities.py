@@ -0,0 +1,41 @@
+"""Tests for the output files of a read"""
+
+# pylint: disable=wrong-import-position
+
+import pytest
+
+pytest.importorskip('dpdumperlib')
+
+from dpdumper.ic_dump import ICDump
+import dpdumper.outfile_utilities as OutFileUtilities
+
+def _dump() -> ICDump:
+    data: bytes = bytes((idx * 7) & 0xFF for idx in range(512))
+    z_mask: bytes = bytes(500) + b'\x0F' * 12
+    return ICDump(data, 8, z_mask)
+
+def test_stream_matches_whole_dump(tmp_path, rom_definition) -> None:
+    ic = rom_definition(9)
+    dump: ICDump = _dump()
+
+    OutFileUtilities.build_output_table_file(str(tmp_path / 'whole.txt'), ic, dump)
+    data_arr, hiz_arr, sha1 = OutFileUtilities.build_binary_array(ic, dump)
+
+    with OutFileUtilities.DumpStreamWriter(ic, str(tmp_path / 'stream.txt'), str(tmp_path / 'stream.bin'), str(tmp_path / 'stream_z.bin')) as writer:
+        for base in range(0, 512, 128):
+            writer.write_block(base, ICDump(dump.data[base:base + 128], 8, dump.z_plane[base:base + 128]))
+
+        assert writer.hexdigest() == sha1
+
+    assert (tmp_path / 'stream.txt').read_text() == (tmp_path / 'whole.txt').read_text()
+    assert (tmp_path / 'stream.bin').read_bytes() == data_arr
+    assert (tmp_path / 'stream_z.bin').read_bytes() == hiz_arr
+
+def test_stream_out_of_order(tmp_path, rom_definition) -> None:
+    ic = rom_definition(9)
+
+    with OutFileUtilities.DumpStreamWriter(ic, str(tmp_path / 'stream.txt')) as writer:
+        writer.write_block(0, ICDump(bytes(128), 8))
+
+        with pytest.raises(ValueError):
+            writer.write_block(256, ICDump(bytes(128), 8))
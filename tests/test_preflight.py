@@ -0,0 +1,47 @@
+"""Tests for the classification of the samples taken before a read"""
+
+from dpdumper.preflight import BusState, analyze_samples
+
+def _plane(values: list[int], entry_width: int = 1) -> bytes:
+    return b''.join(value.to_bytes(entry_width) for value in values)
+
+def test_plausible_data() -> None:
+    data: bytes = _plane([0x12, 0x34, 0x56, 0x78])
+    result = analyze_samples([(0, data, data)], 8)
+
+    assert result.state == BusState.OK
+    assert not result.failed
+    assert result.hiz_bits == 0
+
+def test_empty_socket() -> None:
+    result = analyze_samples([(0, _plane([0x00] * 4), _plane([0xFF] * 4))], 8)
+
+    assert result.state == BusState.EMPTY
+    assert result.failed
+
+def test_floating_bus() -> None:
+    # Every entry reads back the lower bits of its own address
+    samples = [(base, _plane([address & 0xFF for address in range(base, base + 16)]), _plane([address & 0xFF for address in range(base, base + 16)])) for base in (0, 0x100, 0x250)]
+    result = analyze_samples(samples, 8)
+
+    assert result.state == BusState.FLOATING
+    assert result.failed
+
+def test_blank_and_stuck() -> None:
+    blank = analyze_samples([(0, _plane([0xFF] * 8), _plane([0xFF] * 8))], 8)
+    stuck = analyze_samples([(0, _plane([0x5A] * 8), _plane([0x5A] * 8))], 8)
+
+    assert blank.state == BusState.BLANK
+    assert stuck.state == BusState.STUCK
+    assert stuck.value == 0x5A
+    assert not blank.failed and not stuck.failed
+
+def test_always_hiz_line() -> None:
+    low: bytes = _plane([0x01, 0x02, 0x03, 0x04], 2)
+    # D15 is always in Hi-Z
+    high: bytes = _plane([0x8001, 0x8002, 0x8003, 0x8004], 2)
+    result = analyze_samples([(0, low, high)], 16)
+
+    assert result.state == BusState.OK
+    assert result.always_hiz_bits == 0x8000
+    assert 'D15' in result.describe()
@@ -0,0 +1,49 @@
+"""Tests for the progress reporting of transfers"""
+
+import pytest
+
+import dpdumper.progress as Progress
+
+class _RecordingRenderer(Progress.ProgressRenderer):
+    def __init__(self) -> None:
+        self.updates: list[Progress.ProgressState] = []
+        self.finished: list[Progress.ProgressState] = []
+
+    def update(self, state: Progress.ProgressState) -> None:
+        self.updates.append(state)
+
+    def finish(self, state: Progress.ProgressState) -> None:
+        self.finished.append(state)
+
+def test_state() -> None:
+    state: Progress.ProgressState = Progress.ProgressState(256, 1024, 'B', 2.0)
+
+    assert state.percent == 25.0
+    assert state.rate == 128.0
+    assert state.eta == 6.0
+    assert state.describe() == '25.0% 0.1KB/s ETA 0:06'
+    assert Progress.ProgressState(10, 10, 'entries', 5.0).describe() == '100.0% 2 entries/s in 0:05'
+    assert Progress.ProgressState(0, 10, 'B', 0).rate is None
+
+def test_transfers_are_split() -> None:
+    renderer: _RecordingRenderer = _RecordingRenderer()
+
+    with Progress.reporting(renderer) as reporter:
+        reporter.post(50, 100)
+        # A different total starts a new transfer, closing the previous one
+        reporter.post(10, 20)
+        reporter.post(20, 20)
+
+    assert [(state.done, state.total) for state in renderer.finished] == [(50, 100), (20, 20)]
+
+def test_no_reporting() -> None:
+    assert Progress.current() is None
+    # Closing a transfer when nothing is reported does nothing
+    Progress.end()
+
+def test_build_renderer() -> None:
+    for name in Progress.RENDERERS:
+        assert isinstance(Progress.build_renderer(name), Progress.ProgressRenderer)
+
+    with pytest.raises(ValueError):
+        Progress.build_renderer('unknown')
@@ -0,0 +1,55 @@
+"""Tests for the checkpoints of interrupted reads"""
+
+# pylint: disable=wrong-import-position
+
+import os
+
+import pytest
+
+pytest.importorskip('dpdumperlib')
+
+from dpdumper.dumper_utilities import BoardInfo
+from dpdumper.ic_dump import ICDump
+from dpdumper.read_checkpoint import ReadCheckpoint
+
+BOARD: BoardInfo = BoardInfo(3, '1.0.0')
+
+def test_resume(tmp_path, rom_definition) -> None:
+    ic = rom_definition(10)
+    outf: str = str(tmp_path / 'dump.txt')
+
+    checkpoint: ReadCheckpoint = ReadCheckpoint(outf, ic, BOARD, True, 8)
+    assert checkpoint.missing_blocks() == [0, 256, 512, 768]
+
+    checkpoint.store_block(0, ICDump(b'\x01' * 256, 8, b'\x00' * 256))
+    checkpoint.store_block(512, ICDump(b'\x03' * 256, 8, b'\x80' * 256))
+
+    # The read is interrupted here, a new session picks it up
+    resumed: ReadCheckpoint = ReadCheckpoint(outf, ic, BOARD, True, 4, resume=True)
+    assert resumed.block_bits == 8
+    assert resumed.missing_blocks() == [256, 768]
+
+    with pytest.raises(IOError):
+        resumed.load_dump()
+
+    resumed.store_block(256, ICDump(b'\x02' * 256, 8, b'\x00' * 256))
+    resumed.store_block(768, ICDump(b'\x04' * 256, 8, b'\x00' * 256))
+
+    dump: ICDump = resumed.load_dump()
+    assert dump.data == b'\x01' * 256 + b'\x02' * 256 + b'\x03' * 256 + b'\x04' * 256
+    assert dump.z_mask == b'\x00' * 512 + b'\x80' * 256 + b'\x00' * 256
+
+    resumed.remove()
+    assert not os.path.exists(resumed.sidecar_path)
+
+def test_resume_different_setup(tmp_path, rom_definition) -> None:
+    ic = rom_definition(10)
+    outf: str = str(tmp_path / 'dump.txt')
+
+    ReadCheckpoint(outf, ic, BOARD, False, 8)
+
+    with pytest.raises(ValueError):
+        ReadCheckpoint(outf, ic, BOARD, True, 8, resume=True)
+
+    with pytest.raises(ValueError):
+        ReadCheckpoint(outf, ic, BoardInfo(3, '2.0.0'), False, 8, resume=True)
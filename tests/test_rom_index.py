@@ -0,0 +1,62 @@
+"""Tests for the index of known ROM images"""
+
+from dpdumper.rom_index import BLOCK_SIZE, Fingerprinter, RomIndex, fingerprint
+
+def _image(seed: int, blocks: int = 4) -> bytes:
+    return bytes((seed + idx * 7) & 0xFF for idx in range(blocks * BLOCK_SIZE))
+
+def test_fingerprint_in_pieces() -> None:
+    data: bytes = _image(1) + b'tail'
+    whole, _ = fingerprint(data)
+
+    fingerprinter: Fingerprinter = Fingerprinter()
+    for offset in range(0, len(data), 1000):
+        fingerprinter.update(data[offset:offset + 1000])
+
+    assert fingerprinter.fingerprint() == whole
+    assert len(whole.block_hashes) == 5
+
+def test_add_and_lookup(tmp_path) -> None:
+    image: bytes = _image(1)
+
+    with RomIndex(str(tmp_path / 'roms.db')) as index:
+        assert index.add('first', None, fingerprint(image)[0])
+        assert index.add('other', None, fingerprint(_image(2))[0])
+        # Same image, different name
+        assert not index.add('copy', None, fingerprint(image)[0])
+        assert len(index) == 2
+
+        exact = index.lookup(fingerprint(image)[0])
+        assert [match.name for match in exact] == ['first']
+        assert exact[0].exact
+
+        # One block out of four differs
+        near = index.lookup(fingerprint(image[:BLOCK_SIZE] + bytes(BLOCK_SIZE) + image[2 * BLOCK_SIZE:])[0])
+        assert [match.name for match in near] == ['first']
+        assert near[0].differing_blocks == 1
+
+        assert index.lookup(fingerprint(bytes(4 * BLOCK_SIZE))[0]) == []
+
+def test_add_directory(tmp_path) -> None:
+    dumps = tmp_path / 'dumps'
+    (dumps / 'sub').mkdir(parents=True)
+    (dumps / 'first.bin').write_bytes(_image(1))
+    (dumps / 'sub' / 'second.bin').write_bytes(_image(2, 3))  # 4096 entries of 3 bytes
+    # Not images, even when their size is a power of two
+    (dumps / 'first.txt').write_bytes(b'Name:\tROM\n'.ljust(BLOCK_SIZE, b'0'))
+    (dumps / 'first.txt.dpck').write_bytes(b'{}')
+    (dumps / 'first.txt.dpck.bin').write_bytes(_image(3))
+    (dumps / 'notes.md').write_bytes(b'Dumped from the second board')
+    (dumps / 'empty.bin').write_bytes(b'')
+
+    with RomIndex(str(dumps / 'roms.db')) as index:
+        assert index.add_directory(str(dumps)) == (2, 0)
+        assert index.add_directory(str(dumps)) == (0, 2)
+
+def test_extract(tmp_path) -> None:
+    image: bytes = _image(3) + b'tail'
+    rom, blocks = fingerprint(image, keep_blocks=True)
+
+    with RomIndex(str(tmp_path / 'roms.db')) as index:
+        index.add('stored', None, rom, blocks)
+        assert index.extract(rom.sha1) == image
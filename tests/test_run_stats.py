@@ -0,0 +1,24 @@
+"""Tests for the timing breakdown of the commands"""
+
+import time
+
+import dpdumper.run_stats as RunStats
+
+def test_nested_phases_are_exclusive() -> None:
+    with RunStats.collect() as stats:
+        with RunStats.phase('outer'):
+            time.sleep(0.02)
+            with RunStats.phase('inner'):
+                time.sleep(0.05)
+            RunStats.add_bytes('inner', 100)
+
+    phases = stats.to_dict()['phases']
+    assert phases['inner']['seconds'] >= 0.05
+    assert phases['inner']['bytes'] == 100
+    assert 0.02 <= phases['outer']['seconds'] < 0.05
+    assert phases['outer']['seconds'] + phases['inner']['seconds'] <= stats.to_dict()['total_seconds']
+
+def test_no_collection() -> None:
+    # Outside collect() phases and counters do nothing
+    with RunStats.phase('ignored'):
+        RunStats.count('ignored')
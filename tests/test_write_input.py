@@ -0,0 +1,51 @@
+"""Tests for the loading of the files written into an IC"""
+
+import pytest
+
+from dpdumper.write_input import WriteInput
+
+def test_single_byte_entries(tmp_path) -> None:
+    path = tmp_path / 'input.bin'
+    path.write_bytes(bytes(range(16)))
+
+    with WriteInput(str(path), 1, expected_entries=16) as write_input:
+        assert len(write_input) == 16
+        assert list(write_input.entries) == list(range(16))
+
+@pytest.mark.parametrize('entry_width', [2, 3, 4])
+@pytest.mark.parametrize('reverse_byte_order', [False, True])
+def test_wide_entries(tmp_path, entry_width: int, reverse_byte_order: bool) -> None:
+    values: list[int] = [(idx * 0x01020305) & ((1 << (entry_width * 8)) - 1) for idx in range(32)]
+    path = tmp_path / 'input.bin'
+    path.write_bytes(b''.join(value.to_bytes(entry_width, 'little' if reverse_byte_order else 'big') for value in values))
+
+    with WriteInput(str(path), entry_width, reverse_byte_order) as write_input:
+        assert list(write_input.entries) == values
+
+def test_empty_file(tmp_path) -> None:
+    path = tmp_path / 'input.bin'
+    path.write_bytes(b'')
+
+    with WriteInput(str(path), 2) as write_input:
+        assert len(write_input) == 0
+
+def test_wrong_size(tmp_path) -> None:
+    path = tmp_path / 'input.bin'
+    path.write_bytes(bytes(15))
+
+    with pytest.raises(ValueError):
+        WriteInput(str(path), 2)
+
+    with pytest.raises(ValueError):
+        WriteInput(str(path), 1, expected_entries=16)
+
+def test_close(tmp_path) -> None:
+    path = tmp_path / 'input.bin'
+    path.write_bytes(bytes(16))
+
+    write_input: WriteInput = WriteInput(str(path), 2)
+    write_input.close()
+
+    assert len(write_input) == 0
+    # Closing twice is harmless
+    write_input.close()